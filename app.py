@@ -12,7 +12,7 @@ from dotenv import load_dotenv
 load_dotenv()
 
 # Importa os roteadores
-from app.api import users, chats, messages, auth, files, auth_telegram
+from app.api import users, chats, messages, auth, files, auth_telegram, batch
 
 # Cria a aplicação FastAPI
 app = FastAPI(
@@ -29,6 +29,7 @@ app = FastAPI(
     * **Chats**: Gerenciamento de conversas individuais e grupos
     * **Usuários**: Busca, informações de perfil e contatos
     * **Arquivos**: Upload e download de mídias
+    * **Lote**: Várias consultas à TDLib em uma única requisição
     
     ## Como usar
     
@@ -58,6 +59,7 @@ app.include_router(users.router, prefix="/users", tags=["Usuários"])
 app.include_router(chats.router, prefix="/chats", tags=["Chats"])
 app.include_router(messages.router, prefix="/messages", tags=["Mensagens"])
 app.include_router(files.router, prefix="/files", tags=["Arquivos"])
+app.include_router(batch.router, prefix="/batch", tags=["Lote"])
 
 # Rota personalizada para documentação Swagger
 @app.get("/docs", include_in_schema=False)
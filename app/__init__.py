@@ -3,7 +3,7 @@
 
 from flask import Flask, jsonify, Blueprint
 from flask_cors import CORS
-import asyncio
+from functools import wraps
 import os
 from threading import Thread
 
@@ -14,6 +14,7 @@ try:
     from app.api.chats_routes import chats_bp
     from app.api.messages_routes import messages_bp
     from app.api.media_routes import media_bp
+    from app.api.batch_routes import batch_bp
     from app.api.webhooks_routes import webhooks_bp
     from app.api.bots_routes import bots_bp
     from app.api.files_routes import files_bp
@@ -43,6 +44,9 @@ except ImportError as e:
     if 'bots_bp' not in locals():
         bots_bp = Blueprint('bots', __name__)
         missing_bp_names.append('bots_bp')
+    if 'batch_bp' not in locals():
+        batch_bp = Blueprint('batch', __name__)
+        missing_bp_names.append('batch_bp')
     if 'files_bp' not in locals():
         files_bp = Blueprint('files', __name__)
         missing_bp_names.append('files_bp')
@@ -50,10 +54,29 @@ except ImportError as e:
     if missing_bp_names:
         print(f"Blueprints vazios foram criados para: {', '.join(missing_bp_names)}")
 
+from app.core.uploads import MAX_UPLOAD_SIZE
 from app.services.tdlib_service import tdlib_service
 
+class TDLibFlask(Flask):
+    """
+    Aplicação Flask que executa as views assíncronas no loop compartilhado do serviço TDLib
+    """
+    
+    def async_to_sync(self, func):
+        """
+        Converte uma view assíncrona em síncrona para o modo WSGI
+        
+        Em vez de criar um loop de eventos por requisição, a corrotina é agendada
+        no loop do serviço TDLib e a thread do servidor aguarda o resultado.
+        """
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            return tdlib_service.run(func(*args, **kwargs))
+        
+        return wrapper
+
 # Criar a aplicação Flask
-app = Flask(__name__)
+app = TDLibFlask(__name__)
 
 # Configurar CORS
 CORS(app, resources={r"/api/*": {"origins": "*"}})
@@ -63,6 +86,13 @@ app.config['JSON_SORT_KEYS'] = False
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'secreto-por-padrao')
 app.config['API_KEY'] = os.environ.get('API_KEY', 'chave-api-padrao')
 app.config['UPLOAD_FOLDER'] = os.environ.get('UPLOAD_FOLDER', '/tmp/uploads')
+# Tamanho máximo do corpo das requisições (arquivo de upload mais a margem do multipart);
+# também limita cada parte enviada às sessões de upload
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_CONTENT_LENGTH', str(MAX_UPLOAD_SIZE + 1024 * 1024)))
+
+# Envio de arquivos delegado ao proxy reverso (sendfile sem cópias pelo Python)
+app.config['USE_X_SENDFILE'] = os.environ.get('USE_X_SENDFILE', 'false').lower() == 'true'
+app.config['X_ACCEL_REDIRECT_PREFIX'] = os.environ.get('X_ACCEL_REDIRECT_PREFIX', '')
 
 # Certificar-se de que a pasta de uploads existe
 upload_folder = app.config['UPLOAD_FOLDER']
@@ -76,6 +106,7 @@ app.register_blueprint(messages_bp, url_prefix='/api/v1/messages')
 app.register_blueprint(media_bp, url_prefix='/api/v1/media')
 app.register_blueprint(webhooks_bp, url_prefix='/api/v1/webhooks')
 app.register_blueprint(bots_bp, url_prefix='/api/v1/bots')
+app.register_blueprint(batch_bp, url_prefix='/api/v1/batch')
 app.register_blueprint(files_bp, url_prefix='/api/v1/files')
 
 # Rota para verificar o status da API
@@ -86,7 +117,7 @@ def health_check():
 # Função para inicializar o cliente TDLib
 def initialize_tdlib():
     try:
-        asyncio.run(tdlib_service.initialize())
+        tdlib_service.run(tdlib_service.initialize())
         print("Cliente TDLib inicializado com sucesso!")
     except Exception as e:
         print(f"Erro ao inicializar o cliente TDLib: {str(e)}")
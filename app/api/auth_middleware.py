@@ -3,6 +3,7 @@
 
 from functools import wraps
 from flask import request, jsonify, current_app
+import inspect
 import os
 import logging
 
@@ -12,8 +13,13 @@ def api_key_required(f):
     """
     Middleware para validar API key
     """
-    @wraps(f)
-    def decorated(*args, **kwargs):
+    def check_api_key():
+        """
+        Valida a API key da requisição atual
+        
+        Returns:
+            None se a API key for válida, ou a resposta de erro a ser retornada
+        """
         try:
             # Obter a API key configurada
             api_key = current_app.config.get('API_KEY')
@@ -47,7 +53,7 @@ def api_key_required(f):
                 }), 401
             
             # API Key válida, continuar
-            return f(*args, **kwargs)
+            return None
         except Exception as e:
             logger.error(f"Erro ao validar API Key: {str(e)}")
             return jsonify({
@@ -55,4 +61,23 @@ def api_key_required(f):
                 'message': 'Erro interno ao validar autenticação.'
             }), 500
     
+    # Views assíncronas precisam de um wrapper assíncrono para continuarem
+    # sendo reconhecidas como corrotinas pelo Flask e pelo modo ASGI
+    if inspect.iscoroutinefunction(f):
+        @wraps(f)
+        async def async_decorated(*args, **kwargs):
+            error = check_api_key()
+            if error is not None:
+                return error
+            return await f(*args, **kwargs)
+        
+        return async_decorated
+    
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        error = check_api_key()
+        if error is not None:
+            return error
+        return f(*args, **kwargs)
+    
     return decorated 
\ No newline at end of file
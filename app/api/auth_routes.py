@@ -4,14 +4,13 @@
 from flask import Blueprint, request, jsonify, current_app
 from app.api.auth_middleware import api_key_required
 from app.services.tdlib_service import tdlib_service
-import asyncio
 
 # Criar o blueprint para autenticação
 auth_bp = Blueprint('auth', __name__)
 
 @auth_bp.route('/config', methods=['POST'])
 @api_key_required
-def configure_tdlib():
+async def configure_tdlib():
     """
     Configura os parâmetros da TDLib
     ---
@@ -69,16 +68,11 @@ def configure_tdlib():
             }), 400
             
         # Inicializar cliente TDLib de forma assíncrona
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            loop.run_until_complete(tdlib_service.initialize(config))
-            return jsonify({
-                'status': 'success',
-                'message': 'Cliente TDLib configurado com sucesso'
-            })
-        finally:
-            loop.close()
+        await tdlib_service.initialize(config)
+        return jsonify({
+            'status': 'success',
+            'message': 'Cliente TDLib configurado com sucesso'
+        })
             
     except Exception as e:
         return jsonify({
@@ -88,7 +82,7 @@ def configure_tdlib():
 
 @auth_bp.route('/phone', methods=['POST'])
 @api_key_required
-def set_phone_number():
+async def set_phone_number():
     """
     Define o número de telefone para autenticação
     ---
@@ -123,22 +117,17 @@ def set_phone_number():
             
         phone_number = data['phone_number']
         
-        # Executar método de forma assíncrona
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            result = loop.run_until_complete(tdlib_service.execute(
-                'setAuthenticationPhoneNumber',
-                {'phone_number': phone_number}
-            ))
+        # Executar método no loop compartilhado do serviço TDLib
+        result = await tdlib_service.execute(
+            'setAuthenticationPhoneNumber',
+            {'phone_number': phone_number}
+        )
             
-            return jsonify({
-                'status': 'success',
-                'message': 'Número de telefone enviado com sucesso',
-                'auth_state': tdlib_service.auth_state
-            })
-        finally:
-            loop.close()
+        return jsonify({
+            'status': 'success',
+            'message': 'Número de telefone enviado com sucesso',
+            'auth_state': tdlib_service.auth_state
+        })
             
     except Exception as e:
         return jsonify({
@@ -148,7 +137,7 @@ def set_phone_number():
 
 @auth_bp.route('/code', methods=['POST'])
 @api_key_required
-def check_authentication_code():
+async def check_authentication_code():
     """
     Verifica o código de autenticação enviado pelo Telegram
     ---
@@ -183,22 +172,17 @@ def check_authentication_code():
             
         code = data['code']
         
-        # Executar método de forma assíncrona
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            result = loop.run_until_complete(tdlib_service.execute(
-                'checkAuthenticationCode',
-                {'code': code}
-            ))
+        # Executar método no loop compartilhado do serviço TDLib
+        result = await tdlib_service.execute(
+            'checkAuthenticationCode',
+            {'code': code}
+        )
             
-            return jsonify({
-                'status': 'success',
-                'message': 'Código verificado com sucesso',
-                'auth_state': tdlib_service.auth_state
-            })
-        finally:
-            loop.close()
+        return jsonify({
+            'status': 'success',
+            'message': 'Código verificado com sucesso',
+            'auth_state': tdlib_service.auth_state
+        })
             
     except Exception as e:
         return jsonify({
@@ -208,7 +192,7 @@ def check_authentication_code():
 
 @auth_bp.route('/password', methods=['POST'])
 @api_key_required
-def check_authentication_password():
+async def check_authentication_password():
     """
     Verifica a senha de autenticação de duas etapas
     ---
@@ -243,22 +227,17 @@ def check_authentication_password():
             
         password = data['password']
         
-        # Executar método de forma assíncrona
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            result = loop.run_until_complete(tdlib_service.execute(
-                'checkAuthenticationPassword',
-                {'password': password}
-            ))
+        # Executar método no loop compartilhado do serviço TDLib
+        result = await tdlib_service.execute(
+            'checkAuthenticationPassword',
+            {'password': password}
+        )
             
-            return jsonify({
-                'status': 'success',
-                'message': 'Senha verificada com sucesso',
-                'auth_state': tdlib_service.auth_state
-            })
-        finally:
-            loop.close()
+        return jsonify({
+            'status': 'success',
+            'message': 'Senha verificada com sucesso',
+            'auth_state': tdlib_service.auth_state
+        })
             
     except Exception as e:
         return jsonify({
@@ -268,7 +247,7 @@ def check_authentication_password():
 
 @auth_bp.route('/logout', methods=['POST'])
 @api_key_required
-def logout():
+async def logout():
     """
     Encerra a sessão atual no Telegram
     ---
@@ -281,18 +260,13 @@ def logout():
         description: Erro interno
     """
     try:
-        # Executar método de forma assíncrona
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            result = loop.run_until_complete(tdlib_service.execute('logOut'))
+        # Executar método no loop compartilhado do serviço TDLib
+        result = await tdlib_service.execute('logOut')
             
-            return jsonify({
-                'status': 'success',
-                'message': 'Logout realizado com sucesso'
-            })
-        finally:
-            loop.close()
+        return jsonify({
+            'status': 'success',
+            'message': 'Logout realizado com sucesso'
+        })
             
     except Exception as e:
         return jsonify({
@@ -302,7 +276,7 @@ def logout():
 
 @auth_bp.route('/state', methods=['GET'])
 @api_key_required
-def get_auth_state():
+async def get_auth_state():
     """
     Obtém o estado atual da autenticação
     ---
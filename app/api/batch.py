@@ -0,0 +1,53 @@
+from fastapi import APIRouter, HTTPException, Depends, status
+from typing import Any, Dict
+
+from app.models.schemas import BatchRequest
+from app.core.batch import BATCH_MAX_SIZE, run_batch
+from app.core.tdlib_wrapper import tg, TDLibError
+from app.api.auth import verify_token
+
+router = APIRouter()
+
+async def execute_call(method: str, params: Dict[str, Any]):
+    """Executa um método do lote, servindo chats e usuários dos caches quando possível."""
+    if method == 'getChat' and 'chat_id' in params:
+        return await tg.get_chat(params['chat_id'])
+    if method == 'getUser' and 'user_id' in params:
+        return await tg.get_user(params['user_id'])
+    return await tg.call_method(method_name=method, params=params)
+
+@router.post("", response_model=Dict)
+async def execute_batch(
+    batch: BatchRequest,
+    user_data: Dict = Depends(verify_token)
+):
+    """Executa várias chamadas à TDLib em paralelo e retorna os resultados na mesma ordem."""
+    if len(batch.calls) > BATCH_MAX_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"O lote pode conter no máximo {BATCH_MAX_SIZE} chamadas"
+        )
+    
+    try:
+        results = await run_batch([call.dict() for call in batch.calls], execute_call)
+        
+        items = []
+        for result in results:
+            if isinstance(result, BaseException):
+                item = {"success": False, "error": str(result)}
+                if isinstance(result, TDLibError):
+                    item["code"] = result.code
+                items.append(item)
+            else:
+                items.append({"success": True, "result": result})
+        
+        return {
+            "success": True,
+            "total_count": len(items),
+            "results": items
+        }
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erro ao executar lote: {str(e)}"
+        )
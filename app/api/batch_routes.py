@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from flask import Blueprint, request, jsonify
+from app.api.auth_middleware import api_key_required
+from app.core.batch import BATCH_MAX_SIZE, run_batch
+from app.services.tdlib_service import tdlib_service
+
+# Criar o blueprint para execução em lote
+batch_bp = Blueprint('batch', __name__)
+
+async def execute_call(method, params):
+    """
+    Executa um método do lote, servindo chats e usuários dos caches quando possível
+    
+    Args:
+        method (str): Nome do método da TDLib
+        params (dict): Parâmetros do método
+        
+    Returns:
+        dict: Resultado da execução do método
+    """
+    if method == 'getChat' and 'chat_id' in params:
+        return await tdlib_service.get_chat(params['chat_id'])
+    if method == 'getUser' and 'user_id' in params:
+        return await tdlib_service.get_user(params['user_id'])
+    return await tdlib_service.execute(method, params)
+
+@batch_bp.route('', methods=['POST'])
+@api_key_required
+async def execute_batch():
+    """
+    Executa várias chamadas à TDLib em paralelo e retorna os resultados na mesma ordem
+    ---
+    tags:
+      - Lote
+    parameters:
+      - name: body
+        in: body
+        required: true
+        schema:
+          type: object
+          properties:
+            calls:
+              type: array
+              description: Chamadas a executar (apenas métodos de consulta, como getChat, getUser e getMessage)
+              items:
+                type: object
+                properties:
+                  method:
+                    type: string
+                    description: Nome do método da TDLib
+                  params:
+                    type: object
+                    description: Parâmetros do método
+    responses:
+      200:
+        description: Resultados das chamadas, com erros individuais por item
+      400:
+        description: Parâmetros inválidos
+      500:
+        description: Erro interno
+    """
+    try:
+        data = request.get_json(silent=True)
+        
+        if not data or not isinstance(data.get('calls'), list):
+            return jsonify({
+                'status': 'error',
+                'message': 'A lista de chamadas (calls) é obrigatória'
+            }), 400
+        
+        calls = data['calls']
+        if len(calls) > BATCH_MAX_SIZE:
+            return jsonify({
+                'status': 'error',
+                'message': f'O lote pode conter no máximo {BATCH_MAX_SIZE} chamadas'
+            }), 400
+        
+        if not all(isinstance(call, dict) for call in calls):
+            return jsonify({
+                'status': 'error',
+                'message': 'Cada chamada deve ser um objeto com method e params'
+            }), 400
+        
+        results = await run_batch(calls, execute_call)
+        
+        items = []
+        for result in results:
+            if isinstance(result, BaseException):
+                items.append({'status': 'error', 'message': str(result)})
+            else:
+                items.append({'status': 'success', 'result': result})
+        
+        return jsonify({
+            'status': 'success',
+            'total_count': len(items),
+            'results': items
+        })
+            
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': f'Erro ao executar lote: {str(e)}'
+        }), 500
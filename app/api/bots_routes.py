@@ -4,7 +4,6 @@
 from flask import Blueprint, request, jsonify, current_app
 from app.api.auth_middleware import api_key_required
 from app.services.tdlib_service import tdlib_service
-import asyncio
 import os
 import json
 
@@ -13,7 +12,7 @@ bots_bp = Blueprint('bots', __name__)
 
 @bots_bp.route('/token', methods=['POST'])
 @api_key_required
-def check_bot_token():
+async def check_bot_token():
     """
     Verifica um token de bot e retorna informações sobre ele
     ---
@@ -48,25 +47,20 @@ def check_bot_token():
             
         bot_token = data['bot_token']
         
-        # Executar método de forma assíncrona
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            result = loop.run_until_complete(tdlib_service.execute(
-                'checkAuthenticationBotToken',
-                {
-                    'token': bot_token
-                }
-            ))
+        # Executar método no loop compartilhado do serviço TDLib
+        result = await tdlib_service.execute(
+            'checkAuthenticationBotToken',
+            {
+                'token': bot_token
+            }
+        )
             
-            # Se não houver erros, a verificação foi bem-sucedida
-            return jsonify({
-                'status': 'success',
-                'message': 'Token verificado com sucesso',
-                'bot_info': result
-            })
-        finally:
-            loop.close()
+        # Se não houver erros, a verificação foi bem-sucedida
+        return jsonify({
+            'status': 'success',
+            'message': 'Token verificado com sucesso',
+            'bot_info': result
+        })
             
     except Exception as e:
         return jsonify({
@@ -76,7 +70,7 @@ def check_bot_token():
 
 @bots_bp.route('/commands', methods=['GET'])
 @api_key_required
-def get_commands():
+async def get_commands():
     """
     Obtém a lista de comandos do bot atual
     ---
@@ -111,26 +105,21 @@ def get_commands():
             'all_chat_administrators': 'botCommandScopeAllChatAdministrators'
         }.get(scope, 'botCommandScopeDefault')
         
-        # Executar método de forma assíncrona
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            result = loop.run_until_complete(tdlib_service.execute(
-                'getMyCommands',
-                {
-                    'scope': {
-                        '@type': scope_type
-                    },
-                    'language_code': language_code
-                }
-            ))
+        # Executar método no loop compartilhado do serviço TDLib
+        result = await tdlib_service.execute(
+            'getMyCommands',
+            {
+                'scope': {
+                    '@type': scope_type
+                },
+                'language_code': language_code
+            }
+        )
             
-            return jsonify({
-                'status': 'success',
-                'commands': result.get('commands', [])
-            })
-        finally:
-            loop.close()
+        return jsonify({
+            'status': 'success',
+            'commands': result.get('commands', [])
+        })
             
     except Exception as e:
         return jsonify({
@@ -140,7 +129,7 @@ def get_commands():
 
 @bots_bp.route('/commands', methods=['POST'])
 @api_key_required
-def set_commands():
+async def set_commands():
     """
     Define os comandos do bot atual
     ---
@@ -223,27 +212,22 @@ def set_commands():
             for cmd in commands
         ]
         
-        # Executar método de forma assíncrona
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            result = loop.run_until_complete(tdlib_service.execute(
-                'setMyCommands',
-                {
-                    'commands': formatted_commands,
-                    'scope': {
-                        '@type': scope_type
-                    },
-                    'language_code': language_code
-                }
-            ))
+        # Executar método no loop compartilhado do serviço TDLib
+        result = await tdlib_service.execute(
+            'setMyCommands',
+            {
+                'commands': formatted_commands,
+                'scope': {
+                    '@type': scope_type
+                },
+                'language_code': language_code
+            }
+        )
             
-            return jsonify({
-                'status': 'success',
-                'message': 'Comandos definidos com sucesso'
-            })
-        finally:
-            loop.close()
+        return jsonify({
+            'status': 'success',
+            'message': 'Comandos definidos com sucesso'
+        })
             
     except Exception as e:
         return jsonify({
@@ -253,7 +237,7 @@ def set_commands():
 
 @bots_bp.route('/description', methods=['POST'])
 @api_key_required
-def set_description():
+async def set_description():
     """
     Define a descrição do bot atual
     ---
@@ -292,24 +276,19 @@ def set_description():
         description = data['description']
         language_code = data.get('language_code', 'pt-br')
         
-        # Executar método de forma assíncrona
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            result = loop.run_until_complete(tdlib_service.execute(
-                'setMyDescription',
-                {
-                    'description': description,
-                    'language_code': language_code
-                }
-            ))
+        # Executar método no loop compartilhado do serviço TDLib
+        result = await tdlib_service.execute(
+            'setMyDescription',
+            {
+                'description': description,
+                'language_code': language_code
+            }
+        )
             
-            return jsonify({
-                'status': 'success',
-                'message': 'Descrição definida com sucesso'
-            })
-        finally:
-            loop.close()
+        return jsonify({
+            'status': 'success',
+            'message': 'Descrição definida com sucesso'
+        })
             
     except Exception as e:
         return jsonify({
@@ -319,7 +298,7 @@ def set_description():
 
 @bots_bp.route('/description', methods=['GET'])
 @api_key_required
-def get_description():
+async def get_description():
     """
     Obtém a descrição do bot atual
     ---
@@ -340,23 +319,18 @@ def get_description():
     try:
         language_code = request.args.get('language_code', 'pt-br')
         
-        # Executar método de forma assíncrona
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            result = loop.run_until_complete(tdlib_service.execute(
-                'getMyDescription',
-                {
-                    'language_code': language_code
-                }
-            ))
+        # Executar método no loop compartilhado do serviço TDLib
+        result = await tdlib_service.execute(
+            'getMyDescription',
+            {
+                'language_code': language_code
+            }
+        )
             
-            return jsonify({
-                'status': 'success',
-                'description': result.get('description', '')
-            })
-        finally:
-            loop.close()
+        return jsonify({
+            'status': 'success',
+            'description': result.get('description', '')
+        })
             
     except Exception as e:
         return jsonify({
@@ -366,7 +340,7 @@ def get_description():
 
 @bots_bp.route('/short-description', methods=['POST'])
 @api_key_required
-def set_short_description():
+async def set_short_description():
     """
     Define a descrição curta do bot atual
     ---
@@ -405,24 +379,19 @@ def set_short_description():
         short_description = data['short_description']
         language_code = data.get('language_code', 'pt-br')
         
-        # Executar método de forma assíncrona
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            result = loop.run_until_complete(tdlib_service.execute(
-                'setMyShortDescription',
-                {
-                    'short_description': short_description,
-                    'language_code': language_code
-                }
-            ))
+        # Executar método no loop compartilhado do serviço TDLib
+        result = await tdlib_service.execute(
+            'setMyShortDescription',
+            {
+                'short_description': short_description,
+                'language_code': language_code
+            }
+        )
             
-            return jsonify({
-                'status': 'success',
-                'message': 'Descrição curta definida com sucesso'
-            })
-        finally:
-            loop.close()
+        return jsonify({
+            'status': 'success',
+            'message': 'Descrição curta definida com sucesso'
+        })
             
     except Exception as e:
         return jsonify({
@@ -432,7 +401,7 @@ def set_short_description():
 
 @bots_bp.route('/short-description', methods=['GET'])
 @api_key_required
-def get_short_description():
+async def get_short_description():
     """
     Obtém a descrição curta do bot atual
     ---
@@ -453,23 +422,18 @@ def get_short_description():
     try:
         language_code = request.args.get('language_code', 'pt-br')
         
-        # Executar método de forma assíncrona
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            result = loop.run_until_complete(tdlib_service.execute(
-                'getMyShortDescription',
-                {
-                    'language_code': language_code
-                }
-            ))
+        # Executar método no loop compartilhado do serviço TDLib
+        result = await tdlib_service.execute(
+            'getMyShortDescription',
+            {
+                'language_code': language_code
+            }
+        )
             
-            return jsonify({
-                'status': 'success',
-                'short_description': result.get('short_description', '')
-            })
-        finally:
-            loop.close()
+        return jsonify({
+            'status': 'success',
+            'short_description': result.get('short_description', '')
+        })
             
     except Exception as e:
         return jsonify({
@@ -479,7 +443,7 @@ def get_short_description():
 
 @bots_bp.route('/answer-callback-query', methods=['POST'])
 @api_key_required
-def answer_callback_query():
+async def answer_callback_query():
     """
     Responde a uma consulta de callback de um botão inline
     ---
@@ -530,27 +494,22 @@ def answer_callback_query():
         url = data.get('url', '')
         cache_time = data.get('cache_time', 0)
         
-        # Executar método de forma assíncrona
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            result = loop.run_until_complete(tdlib_service.execute(
-                'answerCallbackQuery',
-                {
-                    'callback_query_id': callback_query_id,
-                    'text': text,
-                    'show_alert': show_alert,
-                    'url': url,
-                    'cache_time': cache_time
-                }
-            ))
+        # Executar método no loop compartilhado do serviço TDLib
+        result = await tdlib_service.execute(
+            'answerCallbackQuery',
+            {
+                'callback_query_id': callback_query_id,
+                'text': text,
+                'show_alert': show_alert,
+                'url': url,
+                'cache_time': cache_time
+            }
+        )
             
-            return jsonify({
-                'status': 'success',
-                'message': 'Consulta de callback respondida com sucesso'
-            })
-        finally:
-            loop.close()
+        return jsonify({
+            'status': 'success',
+            'message': 'Consulta de callback respondida com sucesso'
+        })
             
     except Exception as e:
         return jsonify({
@@ -560,7 +519,7 @@ def answer_callback_query():
 
 @bots_bp.route('/answer-inline-query', methods=['POST'])
 @api_key_required
-def answer_inline_query():
+async def answer_inline_query():
     """
     Responde a uma consulta inline
     ---
@@ -626,29 +585,24 @@ def answer_inline_query():
         switch_pm_text = data.get('switch_pm_text', '')
         switch_pm_parameter = data.get('switch_pm_parameter', '')
         
-        # Executar método de forma assíncrona
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            result = loop.run_until_complete(tdlib_service.execute(
-                'answerInlineQuery',
-                {
-                    'inline_query_id': inline_query_id,
-                    'results': results,
-                    'cache_time': cache_time,
-                    'is_personal': is_personal,
-                    'next_offset': next_offset,
-                    'switch_pm_text': switch_pm_text,
-                    'switch_pm_parameter': switch_pm_parameter
-                }
-            ))
+        # Executar método no loop compartilhado do serviço TDLib
+        result = await tdlib_service.execute(
+            'answerInlineQuery',
+            {
+                'inline_query_id': inline_query_id,
+                'results': results,
+                'cache_time': cache_time,
+                'is_personal': is_personal,
+                'next_offset': next_offset,
+                'switch_pm_text': switch_pm_text,
+                'switch_pm_parameter': switch_pm_parameter
+            }
+        )
             
-            return jsonify({
-                'status': 'success',
-                'message': 'Consulta inline respondida com sucesso'
-            })
-        finally:
-            loop.close()
+        return jsonify({
+            'status': 'success',
+            'message': 'Consulta inline respondida com sucesso'
+        })
             
     except Exception as e:
         return jsonify({
@@ -36,16 +36,12 @@ async def list_chats(
 @router.get("/{chat_id}", response_model=Dict)
 async def get_chat_info(
     chat_id: int,
+    max_age: Optional[float] = Query(None, ge=0, description="Idade máxima em segundos do chat em cache (0 consulta a TDLib)"),
     user_data: Dict = Depends(verify_token)
 ):
     """Obtém informações detalhadas de um chat."""
     try:
-        result = await tg.call_method(
-            method_name='getChat',
-            params={
-                'chat_id': chat_id
-            }
-        )
+        result = await tg.get_chat(chat_id, max_age=max_age)
         
         return {
             "success": True,
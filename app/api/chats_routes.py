@@ -3,15 +3,15 @@
 
 from flask import Blueprint, request, jsonify, current_app
 from app.api.auth_middleware import api_key_required
+from app.core.uploads import PRELIMINARY_UPLOAD_METHOD
 from app.services.tdlib_service import tdlib_service
-import asyncio
 
 # Criar o blueprint para chats
 chats_bp = Blueprint('chats', __name__)
 
 @chats_bp.route('/list', methods=['GET'])
 @api_key_required
-def get_chats():
+async def get_chats():
     """
     Obtém a lista de chats
     ---
@@ -38,22 +38,17 @@ def get_chats():
         limit = min(int(request.args.get('limit', 100)), 100)
         offset_order = request.args.get('offset', '9223372036854775807')  # max int64
         
-        # Executar método de forma assíncrona
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            result = loop.run_until_complete(tdlib_service.execute(
-                'getChats',
-                {'chat_list': None, 'limit': limit, 'offset_order': offset_order}
-            ))
+        # Executar método no loop compartilhado do serviço TDLib
+        result = await tdlib_service.execute(
+            'getChats',
+            {'chat_list': None, 'limit': limit, 'offset_order': offset_order}
+        )
             
-            return jsonify({
-                'status': 'success',
-                'chat_ids': result.get('chat_ids', []),
-                'total_count': len(result.get('chat_ids', []))
-            })
-        finally:
-            loop.close()
+        return jsonify({
+            'status': 'success',
+            'chat_ids': result.get('chat_ids', []),
+            'total_count': len(result.get('chat_ids', []))
+        })
             
     except Exception as e:
         return jsonify({
@@ -63,7 +58,7 @@ def get_chats():
 
 @chats_bp.route('/<int:chat_id>', methods=['GET'])
 @api_key_required
-def get_chat(chat_id):
+async def get_chat(chat_id):
     """
     Obtém informações de um chat pelo ID
     ---
@@ -75,6 +70,11 @@ def get_chat(chat_id):
         type: integer
         required: true
         description: ID do chat
+      - name: max_age
+        in: query
+        type: number
+        required: false
+        description: Idade máxima em segundos do chat em cache (0 consulta a TDLib)
     responses:
       200:
         description: Informações do chat
@@ -90,21 +90,15 @@ def get_chat(chat_id):
                 'message': 'ID do chat é obrigatório'
             }), 400
             
-        # Executar método de forma assíncrona
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            result = loop.run_until_complete(tdlib_service.execute(
-                'getChat',
-                {'chat_id': chat_id}
-            ))
+        max_age = request.args.get('max_age', type=float)
+        
+        # Servir do cache de chats quando o valor estiver dentro da validade
+        result = await tdlib_service.get_chat(chat_id, max_age=max_age)
             
-            return jsonify({
-                'status': 'success',
-                'chat': result
-            })
-        finally:
-            loop.close()
+        return jsonify({
+            'status': 'success',
+            'chat': result
+        })
             
     except Exception as e:
         return jsonify({
@@ -114,7 +108,7 @@ def get_chat(chat_id):
 
 @chats_bp.route('/create_group', methods=['POST'])
 @api_key_required
-def create_basic_group():
+async def create_basic_group():
     """
     Cria um novo grupo
     ---
@@ -161,22 +155,17 @@ def create_basic_group():
                 'message': 'A lista de usuários deve conter pelo menos um usuário'
             }), 400
             
-        # Executar método de forma assíncrona
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            result = loop.run_until_complete(tdlib_service.execute(
-                'createNewBasicGroupChat',
-                {'user_ids': user_ids, 'title': title}
-            ))
+        # Executar método no loop compartilhado do serviço TDLib
+        result = await tdlib_service.execute(
+            'createNewBasicGroupChat',
+            {'user_ids': user_ids, 'title': title}
+        )
             
-            return jsonify({
-                'status': 'success',
-                'message': 'Grupo criado com sucesso',
-                'chat': result
-            })
-        finally:
-            loop.close()
+        return jsonify({
+            'status': 'success',
+            'message': 'Grupo criado com sucesso',
+            'chat': result
+        })
             
     except Exception as e:
         return jsonify({
@@ -186,7 +175,7 @@ def create_basic_group():
 
 @chats_bp.route('/create_supergroup', methods=['POST'])
 @api_key_required
-def create_supergroup():
+async def create_supergroup():
     """
     Cria um novo supergrupo ou canal
     ---
@@ -229,22 +218,17 @@ def create_supergroup():
         is_channel = data.get('is_channel', False)
         description = data.get('description', '')
         
-        # Executar método de forma assíncrona
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            result = loop.run_until_complete(tdlib_service.execute(
-                'createNewSupergroupChat',
-                {'title': title, 'is_channel': is_channel, 'description': description}
-            ))
+        # Executar método no loop compartilhado do serviço TDLib
+        result = await tdlib_service.execute(
+            'createNewSupergroupChat',
+            {'title': title, 'is_channel': is_channel, 'description': description}
+        )
             
-            return jsonify({
-                'status': 'success',
-                'message': 'Supergrupo/canal criado com sucesso',
-                'chat': result
-            })
-        finally:
-            loop.close()
+        return jsonify({
+            'status': 'success',
+            'message': 'Supergrupo/canal criado com sucesso',
+            'chat': result
+        })
             
     except Exception as e:
         return jsonify({
@@ -254,7 +238,7 @@ def create_supergroup():
 
 @chats_bp.route('/<int:chat_id>/title', methods=['PUT'])
 @api_key_required
-def set_chat_title(chat_id):
+async def set_chat_title(chat_id):
     """
     Atualiza o título de um chat
     ---
@@ -300,21 +284,16 @@ def set_chat_title(chat_id):
             
         title = data['title']
         
-        # Executar método de forma assíncrona
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            result = loop.run_until_complete(tdlib_service.execute(
-                'setChatTitle',
-                {'chat_id': chat_id, 'title': title}
-            ))
+        # Executar método no loop compartilhado do serviço TDLib
+        result = await tdlib_service.execute(
+            'setChatTitle',
+            {'chat_id': chat_id, 'title': title}
+        )
             
-            return jsonify({
-                'status': 'success',
-                'message': 'Título atualizado com sucesso'
-            })
-        finally:
-            loop.close()
+        return jsonify({
+            'status': 'success',
+            'message': 'Título atualizado com sucesso'
+        })
             
     except Exception as e:
         return jsonify({
@@ -324,7 +303,7 @@ def set_chat_title(chat_id):
 
 @chats_bp.route('/<int:chat_id>/description', methods=['PUT'])
 @api_key_required
-def set_chat_description(chat_id):
+async def set_chat_description(chat_id):
     """
     Atualiza a descrição de um supergrupo ou canal
     ---
@@ -370,36 +349,31 @@ def set_chat_description(chat_id):
             
         description = data['description']
         
-        # Executar método de forma assíncrona
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            # Primeiro, precisamos obter o ID do supergrupo
-            chat = loop.run_until_complete(tdlib_service.execute(
-                'getChat',
-                {'chat_id': chat_id}
-            ))
+        # Executar método no loop compartilhado do serviço TDLib
+        # Primeiro, precisamos obter o ID do supergrupo
+        chat = await tdlib_service.execute(
+            'getChat',
+            {'chat_id': chat_id}
+        )
             
-            if chat.get('type', {}).get('@type') != 'chatTypeSupergroup':
-                return jsonify({
-                    'status': 'error',
-                    'message': 'O chat não é um supergrupo ou canal'
-                }), 400
+        if chat.get('type', {}).get('@type') != 'chatTypeSupergroup':
+            return jsonify({
+                'status': 'error',
+                'message': 'O chat não é um supergrupo ou canal'
+            }), 400
                 
-            supergroup_id = chat.get('type', {}).get('supergroup_id')
+        supergroup_id = chat.get('type', {}).get('supergroup_id')
             
-            # Agora podemos atualizar a descrição
-            result = loop.run_until_complete(tdlib_service.execute(
-                'setSupergroupDescription',
-                {'supergroup_id': supergroup_id, 'description': description}
-            ))
+        # Agora podemos atualizar a descrição
+        result = await tdlib_service.execute(
+            'setSupergroupDescription',
+            {'supergroup_id': supergroup_id, 'description': description}
+        )
             
-            return jsonify({
-                'status': 'success',
-                'message': 'Descrição atualizada com sucesso'
-            })
-        finally:
-            loop.close()
+        return jsonify({
+            'status': 'success',
+            'message': 'Descrição atualizada com sucesso'
+        })
             
     except Exception as e:
         return jsonify({
@@ -409,7 +383,7 @@ def set_chat_description(chat_id):
 
 @chats_bp.route('/<int:chat_id>/photo', methods=['PUT'])
 @api_key_required
-def set_chat_photo(chat_id):
+async def set_chat_photo(chat_id):
     """
     Atualiza a foto de um chat
     ---
@@ -456,55 +430,50 @@ def set_chat_photo(chat_id):
                 'message': 'photo_path ou photo_id é obrigatório'
             }), 400
             
-        # Executar método de forma assíncrona
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            if 'photo_path' in data:
-                # Primeiro, precisamos carregar o arquivo
-                file_result = loop.run_until_complete(tdlib_service.execute(
-                    'uploadFile',
-                    {
-                        'file': {
-                            '@type': 'inputFileLocal',
-                            'path': data['photo_path']
-                        },
-                        'file_type': {
-                            '@type': 'fileTypePhoto'
-                        },
-                        'priority': 1
-                    }
-                ))
+        # Executar método no loop compartilhado do serviço TDLib
+        if 'photo_path' in data:
+            # Primeiro, precisamos carregar o arquivo
+            file_result = await tdlib_service.execute(
+                PRELIMINARY_UPLOAD_METHOD,
+                {
+                    'file': {
+                        '@type': 'inputFileLocal',
+                        'path': data['photo_path']
+                    },
+                    'file_type': {
+                        '@type': 'fileTypePhoto'
+                    },
+                    'priority': 1
+                }
+            )
                 
-                # Agora podemos definir a foto do chat
-                photo = {
-                    '@type': 'inputChatPhotoStatic',
-                    'photo': {
-                        '@type': 'inputFileId',
-                        'id': file_result.get('id')
-                    }
+            # Agora podemos definir a foto do chat
+            photo = {
+                '@type': 'inputChatPhotoStatic',
+                'photo': {
+                    '@type': 'inputFileId',
+                    'id': file_result.get('id')
                 }
-            else:  # 'photo_id' in data
-                photo = {
-                    '@type': 'inputChatPhotoStatic',
-                    'photo': {
-                        '@type': 'inputFileId',
-                        'id': data['photo_id']
-                    }
+            }
+        else:  # 'photo_id' in data
+            photo = {
+                '@type': 'inputChatPhotoStatic',
+                'photo': {
+                    '@type': 'inputFileId',
+                    'id': data['photo_id']
                 }
+            }
                 
-            # Definir a foto do chat
-            result = loop.run_until_complete(tdlib_service.execute(
-                'setChatPhoto',
-                {'chat_id': chat_id, 'photo': photo}
-            ))
+        # Definir a foto do chat
+        result = await tdlib_service.execute(
+            'setChatPhoto',
+            {'chat_id': chat_id, 'photo': photo}
+        )
             
-            return jsonify({
-                'status': 'success',
-                'message': 'Foto atualizada com sucesso'
-            })
-        finally:
-            loop.close()
+        return jsonify({
+            'status': 'success',
+            'message': 'Foto atualizada com sucesso'
+        })
             
     except Exception as e:
         return jsonify({
@@ -514,7 +483,7 @@ def set_chat_photo(chat_id):
 
 @chats_bp.route('/<int:chat_id>/members', methods=['GET'])
 @api_key_required
-def get_chat_members(chat_id):
+async def get_chat_members(chat_id):
     """
     Obtém a lista de membros de um supergrupo ou canal
     ---
@@ -554,42 +523,37 @@ def get_chat_members(chat_id):
         limit = min(int(request.args.get('limit', 200)), 200)
         offset = int(request.args.get('offset', 0))
         
-        # Executar método de forma assíncrona
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            # Primeiro, precisamos obter o ID do supergrupo
-            chat = loop.run_until_complete(tdlib_service.execute(
-                'getChat',
-                {'chat_id': chat_id}
-            ))
+        # Executar método no loop compartilhado do serviço TDLib
+        # Primeiro, precisamos obter o ID do supergrupo
+        chat = await tdlib_service.execute(
+            'getChat',
+            {'chat_id': chat_id}
+        )
             
-            if chat.get('type', {}).get('@type') != 'chatTypeSupergroup':
-                return jsonify({
-                    'status': 'error',
-                    'message': 'O chat não é um supergrupo ou canal'
-                }), 400
+        if chat.get('type', {}).get('@type') != 'chatTypeSupergroup':
+            return jsonify({
+                'status': 'error',
+                'message': 'O chat não é um supergrupo ou canal'
+            }), 400
                 
-            supergroup_id = chat.get('type', {}).get('supergroup_id')
+        supergroup_id = chat.get('type', {}).get('supergroup_id')
             
-            # Agora podemos obter os membros
-            result = loop.run_until_complete(tdlib_service.execute(
-                'getSupergroupMembers',
-                {
-                    'supergroup_id': supergroup_id,
-                    'offset': offset,
-                    'limit': limit,
-                    'filter': {'@type': 'supergroupMembersFilterRecent'}
-                }
-            ))
+        # Agora podemos obter os membros
+        result = await tdlib_service.execute(
+            'getSupergroupMembers',
+            {
+                'supergroup_id': supergroup_id,
+                'offset': offset,
+                'limit': limit,
+                'filter': {'@type': 'supergroupMembersFilterRecent'}
+            }
+        )
             
-            return jsonify({
-                'status': 'success',
-                'members': result.get('members', []),
-                'total_count': result.get('total_count', 0)
-            })
-        finally:
-            loop.close()
+        return jsonify({
+            'status': 'success',
+            'members': result.get('members', []),
+            'total_count': result.get('total_count', 0)
+        })
             
     except Exception as e:
         return jsonify({
@@ -1,12 +1,23 @@
-from fastapi import APIRouter, HTTPException, Depends, status, Query, File, UploadFile, Response
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, HTTPException, Depends, status, Query, File, UploadFile, Response, Request
+from fastapi.responses import FileResponse, StreamingResponse
 from typing import Dict, List, Optional
 import os
-import aiofiles
 import uuid
 from pathlib import Path
 
 from app.core.tdlib_wrapper import tg
+from app.core.uploads import UPLOAD_FILE_TYPES, UploadTooLarge, save_upload, temp_directory
+from app.core.upload_sessions import InvalidChunk, UploadIncomplete, UploadSessionNotFound, write_chunks
+from app.core.downloads import (
+    RangeNotSatisfiable,
+    etag_matches,
+    file_etag,
+    http_date,
+    not_modified_since,
+    parse_range,
+    read_range,
+)
+from app.models.schemas import UploadSessionCreate
 from app.api.auth import verify_token
 
 router = APIRouter()
@@ -14,51 +25,188 @@ router = APIRouter()
 @router.post("/upload", response_model=Dict)
 async def upload_file(
     file: UploadFile = File(...),
+    file_type: str = Query("fileTypeDocument", description="Tipo do arquivo na TDLib, de acordo com a mensagem em que será usado"),
+    priority: int = Query(1, ge=1, le=32, description="Prioridade do upload (1-32)"),
     user_data: Dict = Depends(verify_token)
 ):
-    """Upload de um arquivo para uso posterior no Telegram."""
+    """
+    Upload de um arquivo para uso posterior no Telegram.
+    
+    O envio antecipado começa assim que o arquivo é recebido e a resposta não
+    aguarda o fim do upload: o file_id retornado pode ser usado em seguida nas
+    rotas de envio de mensagens, que reaproveitam o upload em andamento.
+    """
+    if file_type not in UPLOAD_FILE_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Tipo de arquivo inválido: {file_type}. Use um de: {', '.join(sorted(UPLOAD_FILE_TYPES))}"
+        )
     try:
-        # Cria diretório para arquivos temporários se não existir
-        temp_dir = os.path.join(os.environ.get("TD_FILES_DIRECTORY", "./td_files"), "temp")
-        os.makedirs(temp_dir, exist_ok=True)
-        
         # Gera um nome único para o arquivo
         file_ext = file.filename.split('.')[-1] if '.' in file.filename else ''
         unique_filename = f"{uuid.uuid4()}.{file_ext}" if file_ext else f"{uuid.uuid4()}"
-        file_path = os.path.join(temp_dir, unique_filename)
+        file_path = os.path.join(temp_directory(), unique_filename)
         
-        # Salva o arquivo
-        async with aiofiles.open(file_path, 'wb') as out_file:
-            content = await file.read()
-            await out_file.write(content)
+        # Salva o arquivo em blocos, sem carregá-lo inteiro na memória
+        saved = await save_upload(file, file_path)
         
-        # Registra o arquivo no TDLib
-        result = await tg.call_method(
-            method_name='uploadFile',
-            params={
-                'file': {
-                    '@type': 'inputFileLocal',
-                    'path': file_path
-                },
-                'file_type': {
-                    '@type': 'fileTypeDocument'
-                },
-                'priority': 1
-            }
-        )
+        # Registra o arquivo no TDLib, reutilizando o arquivo remoto se o conteúdo já foi enviado;
+        # o arquivo temporário é removido quando a TDLib concluir o upload
+        try:
+            result, deduplicated = await tg.upload_file(
+                file_path, saved.sha256, saved.size, file_type, priority, cleanup_path=file_path
+            )
+        except Exception:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            raise
+        if deduplicated:
+            os.remove(file_path)
         
         return {
             "success": True,
             "file_id": result.get("id", 0),
-            "temp_path": file_path,
-            "original_name": file.filename
+            "remote_id": result.get("remote", {}).get("id") or None,
+            "temp_path": None if deduplicated else file_path,
+            "original_name": file.filename,
+            "size": saved.size,
+            "sha256": saved.sha256,
+            "deduplicated": deduplicated
         }
+    except UploadTooLarge as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(e)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Erro ao fazer upload do arquivo: {str(e)}"
         )
 
+@router.delete("/upload/{file_id}", response_model=Dict)
+async def cancel_upload(
+    file_id: int,
+    user_data: Dict = Depends(verify_token)
+):
+    """Cancela o envio antecipado de um arquivo que não será usado em nenhuma mensagem."""
+    try:
+        await tg.cancel_upload(file_id)
+        return {"success": True}
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erro ao cancelar upload: {str(e)}"
+        )
+
+@router.post("/uploads", response_model=Dict, status_code=status.HTTP_201_CREATED)
+async def create_upload_session(
+    body: UploadSessionCreate,
+    user_data: Dict = Depends(verify_token)
+):
+    """
+    Cria uma sessão de upload em partes, com retomada, para arquivos grandes.
+    
+    As partes são enviadas com PUT /uploads/{session_id}?offset=N (em qualquer
+    ordem, inclusive em paralelo) e o arquivo é enviado ao Telegram no commit.
+    """
+    if body.file_type not in UPLOAD_FILE_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Tipo de arquivo inválido: {body.file_type}. Use um de: {', '.join(sorted(UPLOAD_FILE_TYPES))}"
+        )
+    try:
+        session = tg.upload_sessions.create(body.filename, body.size, body.file_type)
+        return {
+            "success": True,
+            "session": session.to_dict()
+        }
+    except UploadTooLarge as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(e)
+        )
+    except InvalidChunk as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+@router.put("/uploads/{session_id}", response_model=Dict)
+async def upload_session_chunk(
+    session_id: str,
+    request: Request,
+    offset: int = Query(..., ge=0, description="Deslocamento da parte no arquivo, em bytes"),
+    user_data: Dict = Depends(verify_token)
+):
+    """Grava uma parte do arquivo (corpo da requisição) a partir de offset."""
+    try:
+        session = tg.upload_sessions.get(session_id)
+        written = await write_chunks(session, offset, request.stream())
+        return {
+            "success": True,
+            "written": written,
+            "session": session.to_dict()
+        }
+    except UploadSessionNotFound as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except InvalidChunk as e:
+        raise HTTPException(status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE, detail=str(e))
+
+@router.get("/uploads/{session_id}", response_model=Dict)
+async def get_upload_session(
+    session_id: str,
+    user_data: Dict = Depends(verify_token)
+):
+    """Estado da sessão: intervalos pendentes para retomada e progresso do envio ao Telegram."""
+    try:
+        return {
+            "success": True,
+            "session": tg.upload_sessions.get(session_id).to_dict()
+        }
+    except UploadSessionNotFound as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+
+@router.post("/uploads/{session_id}/commit", response_model=Dict)
+async def commit_upload_session(
+    session_id: str,
+    priority: int = Query(1, ge=1, le=32, description="Prioridade do upload (1-32)"),
+    user_data: Dict = Depends(verify_token)
+):
+    """Conclui a sessão e envia o arquivo montado ao Telegram com uma única chamada de envio antecipado (preliminaryUploadFile)."""
+    try:
+        session, file = await tg.commit_upload_session(session_id, priority)
+        return {
+            "success": True,
+            "file_id": session.file_id,
+            "remote_id": (file or {}).get("remote", {}).get("id") or None,
+            "session": session.to_dict()
+        }
+    except UploadSessionNotFound as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except UploadIncomplete as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={"message": str(e), "missing": [list(interval) for interval in e.missing]}
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erro ao enviar o arquivo: {str(e)}"
+        )
+
+@router.delete("/uploads/{session_id}", response_model=Dict)
+async def delete_upload_session(
+    session_id: str,
+    user_data: Dict = Depends(verify_token)
+):
+    """Cancela a sessão e remove as partes recebidas."""
+    try:
+        tg.upload_sessions.remove(session_id)
+        return {"success": True}
+    except UploadSessionNotFound as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+
 @router.get("/{file_id}", response_model=Dict)
 async def get_file_info(
     file_id: int,
@@ -83,12 +231,66 @@ async def get_file_info(
             detail=f"Erro ao obter informações do arquivo: {str(e)}"
         )
 
+def file_response(request: Request, file_path: str, etag: Optional[str]):
+    """
+    Monta a resposta de download de um arquivo local, respeitando os cabeçalhos
+    If-None-Match, If-Modified-Since, Range e If-Range.
+    """
+    stat_result = os.stat(file_path)
+    size = stat_result.st_size
+    etag = etag or f"{size:x}-{int(stat_result.st_mtime):x}"
+    filename = os.path.basename(file_path)
+    headers = {
+        "ETag": f'"{etag}"',
+        "Last-Modified": http_date(stat_result.st_mtime),
+        "Accept-Ranges": "bytes"
+    }
+    
+    # Requisições condicionais: o cliente já possui esta versão do arquivo
+    if_none_match = request.headers.get("if-none-match")
+    if etag_matches(if_none_match, etag) or (
+        if_none_match is None and not_modified_since(request.headers.get("if-modified-since"), stat_result.st_mtime)
+    ):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    # If-Range: o intervalo só é atendido se o arquivo não mudou
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if if_range and not etag_matches(if_range, etag):
+        range_header = None
+    
+    try:
+        byte_range = parse_range(range_header, size)
+    except RangeNotSatisfiable:
+        return Response(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            headers={**headers, "Content-Range": f"bytes */{size}"}
+        )
+    
+    if byte_range is None:
+        return FileResponse(path=file_path, filename=filename, headers=headers)
+    
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+    headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return StreamingResponse(
+        read_range(file_path, start, end),
+        status_code=status.HTTP_206_PARTIAL_CONTENT,
+        headers=headers,
+        media_type="application/octet-stream"
+    )
+
 @router.get("/download/{file_id}")
 async def download_file(
     file_id: int,
+    request: Request,
+    stream: bool = Query(False, description="Envia os bytes à medida que a TDLib baixa o arquivo, sem aguardar o fim do download"),
+    priority: int = Query(1, ge=1, le=32, description="Prioridade do download na fila (1-32, maior primeiro)"),
+    chat_id: Optional[int] = Query(None, description="Chat de origem do arquivo, usado no limite de downloads por chat"),
     user_data: Dict = Depends(verify_token)
 ):
-    """Baixa um arquivo do Telegram pelo seu ID."""
+    """Baixa um arquivo do Telegram pelo seu ID, com suporte a Range e requisições condicionais."""
     try:
         # Obtém informações do arquivo
         file_info = await tg.call_method(
@@ -98,27 +300,28 @@ async def download_file(
             }
         )
         
+        # Se o cliente já possui esta versão, evita inclusive o download pela TDLib
+        etag = file_etag(file_info)
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": f'"{etag}"'})
+        
+        # Modo progressivo: o prefixo já baixado é enviado enquanto o download continua
+        if stream and not file_info.get("local", {}).get("is_downloading_completed", False):
+            headers = {"Content-Disposition": f'attachment; filename="file_{file_id}"'}
+            if etag:
+                headers["ETag"] = f'"{etag}"'
+            if file_info.get("size"):
+                headers["Content-Length"] = str(file_info["size"])
+            return StreamingResponse(
+                tg.stream_file(file_id, priority),
+                headers=headers,
+                media_type="application/octet-stream"
+            )
+        
         # Verifica se o arquivo está disponível localmente
         if not file_info.get("local", {}).get("is_downloading_completed", False):
-            # Solicita o download
-            await tg.call_method(
-                method_name='downloadFile',
-                params={
-                    'file_id': file_id,
-                    'priority': 1,
-                    'offset': 0,
-                    'limit': 0,
-                    'synchronous': True
-                }
-            )
-            
-            # Obtém as informações atualizadas após o download
-            file_info = await tg.call_method(
-                method_name='getFile',
-                params={
-                    'file_id': file_id
-                }
-            )
+            # Solicita o download pelo agendador, compartilhando-o com pedidos simultâneos do mesmo arquivo
+            file_info = await tg.download_file(file_id, priority=priority, chat_id=chat_id)
         
         # Verifica se o download foi concluído
         if not file_info.get("local", {}).get("is_downloading_completed", False):
@@ -136,13 +339,10 @@ async def download_file(
                 detail="Arquivo não encontrado no sistema"
             )
         
-        # Determina o tipo de conteúdo com base na extensão do arquivo
-        filename = os.path.basename(file_path)
-        return FileResponse(
-            path=file_path,
-            filename=filename,
-            media_type=None  # Autodeteção do tipo de conteúdo
-        )
+        # Registra o acesso para o controle de espaço em disco (LRU)
+        tg.file_cache.record_access(file_info)
+        
+        return file_response(request, file_path, file_etag(file_info))
     except HTTPException:
         raise
     except Exception as e:
@@ -151,6 +351,32 @@ async def download_file(
             detail=f"Erro ao baixar arquivo: {str(e)}"
         )
 
+@router.post("/{file_id}/pin", response_model=Dict)
+async def pin_file(
+    file_id: int,
+    user_data: Dict = Depends(verify_token)
+):
+    """Fixa um arquivo baixado para que ele não seja removido pelo limite de espaço em disco."""
+    tg.file_cache.pin(file_id)
+    return {
+        "success": True,
+        "file_id": file_id,
+        "pinned": True
+    }
+
+@router.delete("/{file_id}/pin", response_model=Dict)
+async def unpin_file(
+    file_id: int,
+    user_data: Dict = Depends(verify_token)
+):
+    """Libera um arquivo fixado para ser removido quando o limite de espaço em disco for excedido."""
+    tg.file_cache.unpin(file_id)
+    return {
+        "success": True,
+        "file_id": file_id,
+        "pinned": False
+    }
+
 @router.delete("/{file_id}", response_model=Dict)
 async def delete_file(
     file_id: int,
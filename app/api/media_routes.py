@@ -1,19 +1,103 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-from flask import Blueprint, request, jsonify, send_file, current_app
+from flask import Blueprint, Response, request, jsonify, send_file, current_app
 from app.api.auth_middleware import api_key_required
+from app.core.downloads import file_etag
+from app.core.thumbnails import ThumbnailUnavailable, ThumbnailVariants
+from app.core.upload_sessions import InvalidChunk, UploadIncomplete, UploadSessionNotFound
+from app.core.uploads import UPLOAD_FILE_TYPES, UploadTooLarge, save_stream, unique_filename
 from app.services.tdlib_service import tdlib_service
 import asyncio
 import os
 import tempfile
+from urllib.parse import quote
 
 # Criar o blueprint para mídia
 media_bp = Blueprint('media', __name__)
 
+# Variantes redimensionadas das miniaturas (?w=), geradas uma vez e mantidas em disco,
+# dentro do orçamento de espaço dos arquivos baixados (o FileCache só é criado no primeiro uso)
+thumbnail_variants = ThumbnailVariants(record=lambda path: tdlib_service.file_cache.record_path(path))
+
+def send_download(local_path, etag, as_attachment=True, mimetype=None):
+    """
+    Envia um arquivo baixado com ETag derivado do estado do arquivo na TDLib
+    
+    Com X_ACCEL_REDIRECT_PREFIX configurado, o envio é delegado ao proxy
+    (nginx), que serve o arquivo com sendfile. Com USE_X_SENDFILE, o Flask
+    delega da mesma forma com o cabeçalho X-Sendfile. Caso contrário, o
+    send_file condicional responde a Range, If-Range, If-None-Match e
+    If-Modified-Since (206, 304 e 416) usando o wsgi.file_wrapper do servidor.
+    
+    Args:
+        local_path (str): Caminho do arquivo local
+        etag (str): ETag do arquivo, ou None para usar o padrão do Flask
+        as_attachment (bool): Se True, envia como anexo (download)
+        mimetype (str): Tipo de conteúdo, ou None para deduzir pelo nome
+        
+    Returns:
+        Response: Resposta com o arquivo ou o intervalo solicitado
+    """
+    download_name = os.path.basename(local_path)
+    accel_prefix = current_app.config.get('X_ACCEL_REDIRECT_PREFIX')
+    if accel_prefix:
+        files_directory = os.path.abspath(tdlib_service.files_directory)
+        relative_path = os.path.relpath(os.path.abspath(local_path), files_directory)
+        if not relative_path.startswith('..'):
+            response = Response()
+            response.headers['X-Accel-Redirect'] = f"{accel_prefix.rstrip('/')}/{quote(relative_path)}"
+            if as_attachment:
+                response.headers['Content-Disposition'] = f'attachment; filename="{download_name}"'
+            if mimetype:
+                response.headers['Content-Type'] = mimetype
+            else:
+                # O tipo de conteúdo é definido pelo proxy
+                del response.headers['Content-Type']
+            if etag:
+                response.set_etag(etag)
+            return response
+    
+    return send_file(
+        local_path,
+        mimetype=mimetype,
+        as_attachment=as_attachment,
+        download_name=download_name,
+        conditional=True,
+        etag=etag if etag else True
+    )
+
+async def send_thumbnail(local_path, file, width=None):
+    """
+    Envia uma miniatura pelo mesmo caminho dos downloads (X-Accel-Redirect,
+    X-Sendfile ou o wsgi.file_wrapper do servidor), sem copiá-la em Python
+    
+    Com width, envia a variante redimensionada para essa largura, gerando-a
+    no pool de threads na primeira requisição e reutilizando-a do disco depois.
+    
+    Args:
+        local_path (str): Caminho da miniatura
+        file (dict): Objeto file da miniatura na TDLib
+        width (int): Largura da variante, ou None para o tamanho original
+        
+    Returns:
+        Response: Resposta com a miniatura (ou 304 se o cliente já a possuir)
+    """
+    etag = file_etag(file)
+    if width:
+        if etag:
+            etag = f"{etag}-w{width}"
+            # A variante não precisa ser gerada se o cliente já a possuir
+            if request.if_none_match.contains_weak(etag):
+                return Response(status=304, headers={'ETag': f'"{etag}"'})
+        unique_id = file.get('remote', {}).get('unique_id') or str(file.get('id', 0))
+        size = file.get('size') or os.path.getsize(local_path)
+        local_path = await thumbnail_variants.get(local_path, unique_id, size, width)
+    return send_download(local_path, etag, as_attachment=False, mimetype='image/jpeg')
+
 @media_bp.route('/download/<int:file_id>', methods=['GET'])
 @api_key_required
-def download_file(file_id):
+async def download_file(file_id):
     """
     Faz o download de um arquivo do Telegram
     ---
@@ -29,10 +113,24 @@ def download_file(file_id):
         in: query
         type: integer
         required: false
-        description: Prioridade do download (1-32, padrão 1)
+        description: Prioridade do download na fila (1-32, padrão 1, maior primeiro)
+      - name: chat_id
+        in: query
+        type: integer
+        required: false
+        description: Chat de origem do arquivo, usado no limite de downloads simultâneos por chat
+      - name: stream
+        in: query
+        type: boolean
+        required: false
+        description: Envia os bytes à medida que a TDLib baixa o arquivo, sem aguardar o fim do download
     responses:
       200:
         description: Arquivo baixado com sucesso
+      206:
+        description: Intervalo de bytes solicitado no cabeçalho Range
+      304:
+        description: Arquivo não modificado (If-None-Match / If-Modified-Since)
       400:
         description: Parâmetros inválidos
       404:
@@ -49,67 +147,70 @@ def download_file(file_id):
             
         priority = min(max(int(request.args.get('priority', 1)), 1), 32)
         
-        # Executar método de forma assíncrona
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            # Obter informações do arquivo
-            file_info = loop.run_until_complete(tdlib_service.execute(
-                'getFile',
-                {
-                    'file_id': file_id
-                }
-            ))
+        # Executar método no loop compartilhado do serviço TDLib
+        # Obter informações do arquivo
+        file_info = await tdlib_service.execute(
+            'getFile',
+            {
+                'file_id': file_id
+            }
+        )
             
-            if not file_info:
-                return jsonify({
-                    'status': 'error',
-                    'message': 'Arquivo não encontrado'
-                }), 404
+        if not file_info:
+            return jsonify({
+                'status': 'error',
+                'message': 'Arquivo não encontrado'
+            }), 404
+        
+        # Se o cliente já possui esta versão, evita inclusive o download pela TDLib
+        etag = file_etag(file_info)
+        if etag and request.if_none_match.contains(etag):
+            response = Response(status=304)
+            response.set_etag(etag)
+            return response
                 
-            # Verificar se o arquivo já foi baixado
-            if file_info.get('local', {}).get('is_downloading_completed', False):
-                local_path = file_info.get('local', {}).get('path', '')
-                if os.path.isfile(local_path):
-                    return send_file(
-                        local_path,
-                        as_attachment=True,
-                        attachment_filename=os.path.basename(local_path)
-                    )
+        # Verificar se o arquivo já foi baixado
+        if file_info.get('local', {}).get('is_downloading_completed', False):
+            local_path = file_info.get('local', {}).get('path', '')
+            if os.path.isfile(local_path):
+                tdlib_service.file_cache.record_access(file_info)
+                return send_download(local_path, etag)
+        
+        # Modo progressivo: o prefixo já baixado é enviado enquanto o download continua
+        if request.args.get('stream', 'false').lower() in ('1', 'true'):
+            response = Response(
+                tdlib_service.iterate(tdlib_service.stream_file(file_id, priority)),
+                mimetype='application/octet-stream'
+            )
+            response.headers['Content-Disposition'] = f'attachment; filename="file_{file_id}"'
+            if etag:
+                response.set_etag(etag)
+            if file_info.get('size'):
+                response.headers['Content-Length'] = str(file_info['size'])
+            return response
             
-            # Iniciar o download do arquivo
-            result = loop.run_until_complete(tdlib_service.execute(
-                'downloadFile',
-                {
-                    'file_id': file_id,
-                    'priority': priority,
-                    'offset': 0,
-                    'limit': 0,
-                    'synchronous': True
-                }
-            ))
+        # Baixar o arquivo pelo agendador, compartilhando o download com pedidos simultâneos do mesmo arquivo
+        result = await tdlib_service.download_file(
+            file_id,
+            priority=priority,
+            chat_id=request.args.get('chat_id', type=int)
+        )
             
-            if result and result.get('local', {}).get('is_downloading_completed', False):
-                local_path = result.get('local', {}).get('path', '')
-                if os.path.isfile(local_path):
-                    return send_file(
-                        local_path,
-                        as_attachment=True,
-                        attachment_filename=os.path.basename(local_path)
-                    )
-                else:
-                    return jsonify({
-                        'status': 'error',
-                        'message': 'Arquivo não encontrado no disco'
-                    }), 404
+        if result and result.get('local', {}).get('is_downloading_completed', False):
+            local_path = result.get('local', {}).get('path', '')
+            if os.path.isfile(local_path):
+                return send_download(local_path, file_etag(result) or etag)
             else:
                 return jsonify({
                     'status': 'error',
-                    'message': 'Não foi possível baixar o arquivo',
-                    'download_info': result.get('local', {})
-                }), 500
-        finally:
-            loop.close()
+                    'message': 'Arquivo não encontrado no disco'
+                }), 404
+        else:
+            return jsonify({
+                'status': 'error',
+                'message': 'Não foi possível baixar o arquivo',
+                'download_info': result.get('local', {})
+            }), 500
             
     except Exception as e:
         return jsonify({
@@ -117,9 +218,39 @@ def download_file(file_id):
             'message': f'Erro ao baixar arquivo: {str(e)}'
         }), 500
 
+@media_bp.route('/pin/<int:file_id>', methods=['POST', 'DELETE'])
+@api_key_required
+def pin_file(file_id):
+    """
+    Fixa (POST) ou libera (DELETE) um arquivo baixado no controle de espaço em disco
+    ---
+    tags:
+      - Mídia
+    parameters:
+      - name: file_id
+        in: path
+        type: integer
+        required: true
+        description: ID do arquivo
+    responses:
+      200:
+        description: Arquivo fixado ou liberado com sucesso
+    """
+    pinned = request.method == 'POST'
+    if pinned:
+        tdlib_service.file_cache.pin(file_id)
+    else:
+        tdlib_service.file_cache.unpin(file_id)
+        
+    return jsonify({
+        'status': 'success',
+        'file_id': file_id,
+        'pinned': pinned
+    })
+
 @media_bp.route('/status/<int:file_id>', methods=['GET'])
 @api_key_required
-def get_file_status(file_id):
+async def get_file_status(file_id):
     """
     Obtém o status de um arquivo
     ---
@@ -148,30 +279,25 @@ def get_file_status(file_id):
                 'message': 'ID do arquivo é obrigatório'
             }), 400
             
-        # Executar método de forma assíncrona
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            # Obter informações do arquivo
-            file_info = loop.run_until_complete(tdlib_service.execute(
-                'getFile',
-                {
-                    'file_id': file_id
-                }
-            ))
+        # Executar método no loop compartilhado do serviço TDLib
+        # Obter informações do arquivo
+        file_info = await tdlib_service.execute(
+            'getFile',
+            {
+                'file_id': file_id
+            }
+        )
             
-            if not file_info:
-                return jsonify({
-                    'status': 'error',
-                    'message': 'Arquivo não encontrado'
-                }), 404
-                
+        if not file_info:
             return jsonify({
-                'status': 'success',
-                'file_info': file_info
-            })
-        finally:
-            loop.close()
+                'status': 'error',
+                'message': 'Arquivo não encontrado'
+            }), 404
+                
+        return jsonify({
+            'status': 'success',
+            'file_info': file_info
+        })
             
     except Exception as e:
         return jsonify({
@@ -181,7 +307,7 @@ def get_file_status(file_id):
 
 @media_bp.route('/cancel/<int:file_id>', methods=['POST'])
 @api_key_required
-def cancel_file_download(file_id):
+async def cancel_file_download(file_id):
     """
     Cancela o download de um arquivo
     ---
@@ -217,46 +343,41 @@ def cancel_file_download(file_id):
             
         only_if_pending = request.args.get('only_if_pending', 'false').lower() == 'true'
         
-        # Executar método de forma assíncrona
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            # Verificar se o arquivo existe
-            file_info = loop.run_until_complete(tdlib_service.execute(
-                'getFile',
-                {
-                    'file_id': file_id
-                }
-            ))
+        # Executar método no loop compartilhado do serviço TDLib
+        # Verificar se o arquivo existe
+        file_info = await tdlib_service.execute(
+            'getFile',
+            {
+                'file_id': file_id
+            }
+        )
             
-            if not file_info:
-                return jsonify({
-                    'status': 'error',
-                    'message': 'Arquivo não encontrado'
-                }), 404
-                
-            # Verificar se o arquivo está sendo baixado
-            if only_if_pending and not file_info.get('local', {}).get('is_downloading_active', False):
-                return jsonify({
-                    'status': 'success',
-                    'message': 'Arquivo não está sendo baixado'
-                })
+        if not file_info:
+            return jsonify({
+                'status': 'error',
+                'message': 'Arquivo não encontrado'
+            }), 404
                 
-            # Cancelar o download
-            result = loop.run_until_complete(tdlib_service.execute(
-                'cancelDownloadFile',
-                {
-                    'file_id': file_id,
-                    'only_if_pending': only_if_pending
-                }
-            ))
-            
+        # Verificar se o arquivo está sendo baixado
+        if only_if_pending and not file_info.get('local', {}).get('is_downloading_active', False):
             return jsonify({
                 'status': 'success',
-                'message': 'Download cancelado com sucesso'
+                'message': 'Arquivo não está sendo baixado'
             })
-        finally:
-            loop.close()
+                
+        # Cancelar o download
+        result = await tdlib_service.execute(
+            'cancelDownloadFile',
+            {
+                'file_id': file_id,
+                'only_if_pending': only_if_pending
+            }
+        )
+            
+        return jsonify({
+            'status': 'success',
+            'message': 'Download cancelado com sucesso'
+        })
             
     except Exception as e:
         return jsonify({
@@ -266,9 +387,14 @@ def cancel_file_download(file_id):
 
 @media_bp.route('/upload', methods=['POST'])
 @api_key_required
-def upload_file():
+async def upload_file():
     """
     Faz o upload de um arquivo para o Telegram
+    
+    O envio antecipado (preliminaryUploadFile) começa assim que o arquivo é
+    recebido e a resposta retorna sem aguardar o fim do upload. O file_id
+    retornado pode ser usado nas rotas de envio de mensagens (photo_id,
+    file_id, video_id), que reaproveitam o upload em andamento.
     ---
     tags:
       - Mídia
@@ -283,11 +409,18 @@ def upload_file():
         type: integer
         required: false
         description: Prioridade do upload (1-32, padrão 1)
+      - name: file_type
+        in: formData
+        type: string
+        required: false
+        description: Tipo do arquivo na TDLib (fileTypeDocument, fileTypePhoto, fileTypeVideo...), de acordo com a mensagem em que será usado
     responses:
       200:
-        description: Arquivo enviado com sucesso
+        description: Upload iniciado; acompanhe o progresso em /status/{file_id}
       400:
         description: Parâmetros inválidos
+      413:
+        description: Arquivo excede o tamanho máximo permitido
       500:
         description: Erro interno
     """
@@ -307,56 +440,288 @@ def upload_file():
             }), 400
             
         priority = min(max(int(request.form.get('priority', 1)), 1), 32)
+        file_type = request.form.get('file_type', 'fileTypeDocument')
+        if file_type not in UPLOAD_FILE_TYPES:
+            return jsonify({
+                'status': 'error',
+                'message': f"Tipo de arquivo inválido: {file_type}. Use um de: {', '.join(sorted(UPLOAD_FILE_TYPES))}"
+            }), 400
         
-        # Salvar o arquivo temporariamente
+        # Salvar o arquivo temporariamente, calculando o hash do conteúdo durante a gravação
         temp_dir = current_app.config.get('UPLOAD_FOLDER', tempfile.gettempdir())
         os.makedirs(temp_dir, exist_ok=True)
         
-        temp_file_path = os.path.join(temp_dir, file.filename)
-        file.save(temp_file_path)
+        temp_file_path = os.path.join(temp_dir, unique_filename(file.filename))
+        try:
+            saved = await asyncio.get_running_loop().run_in_executor(
+                None, save_stream, file.stream, temp_file_path
+            )
+        except UploadTooLarge as e:
+            return jsonify({
+                'status': 'error',
+                'message': str(e)
+            }), 413
         
-        # Executar método de forma assíncrona
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
+        # Executar método no loop compartilhado do serviço TDLib
         try:
-            # Iniciar o upload do arquivo
-            result = loop.run_until_complete(tdlib_service.execute(
-                'uploadFile',
-                {
-                    'file': {
-                        '@type': 'inputFileLocal',
-                        'path': temp_file_path
-                    },
-                    'file_type': {
-                        '@type': 'fileTypeDocument'
-                    },
-                    'priority': priority
-                }
-            ))
+            # Iniciar o upload do arquivo, ou reutilizar o arquivo remoto se o conteúdo já foi enviado.
+            # O arquivo temporário é removido quando a TDLib concluir o upload.
+            result, deduplicated = await tdlib_service.upload_file(
+                temp_file_path,
+                saved.sha256,
+                saved.size,
+                file_type=file_type,
+                priority=priority,
+                cleanup_path=temp_file_path
+            )
+        except Exception:
+            os.remove(temp_file_path)
+            raise
+        
+        if deduplicated:
+            os.remove(temp_file_path)
+        
+        return jsonify({
+            'status': 'success',
+            'message': 'Arquivo enviado com sucesso',
+            'file_id': result.get('id', 0),
+            'remote_id': result.get('remote', {}).get('id') or None,
+            'sha256': saved.sha256,
+            'deduplicated': deduplicated,
+            'file_info': result
+        })
             
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': f'Erro ao fazer upload do arquivo: {str(e)}'
+        }), 500
+
+@media_bp.route('/upload/<int:file_id>', methods=['DELETE'])
+@api_key_required
+async def cancel_upload(file_id):
+    """
+    Cancela o envio antecipado de um arquivo que não será usado em nenhuma mensagem
+    ---
+    tags:
+      - Mídia
+    parameters:
+      - name: file_id
+        in: path
+        type: integer
+        required: true
+        description: ID do arquivo retornado por /upload
+    responses:
+      200:
+        description: Upload cancelado com sucesso
+      500:
+        description: Erro interno
+    """
+    try:
+        await tdlib_service.cancel_upload(file_id)
+        return jsonify({
+            'status': 'success',
+            'message': 'Upload cancelado com sucesso'
+        })
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': f'Erro ao cancelar upload: {str(e)}'
+        }), 500
+
+@media_bp.route('/uploads', methods=['POST'])
+@api_key_required
+def create_upload_session():
+    """
+    Cria uma sessão de upload em partes, com retomada, para arquivos grandes
+    ---
+    tags:
+      - Mídia
+    parameters:
+      - name: body
+        in: body
+        required: true
+        schema:
+          type: object
+          required:
+            - filename
+            - size
+          properties:
+            filename:
+              type: string
+              description: Nome original do arquivo
+            size:
+              type: integer
+              description: Tamanho total do arquivo em bytes
+            file_type:
+              type: string
+              description: Tipo do arquivo na TDLib (padrão fileTypeDocument)
+    responses:
+      201:
+        description: Sessão criada; envie as partes com PUT /uploads/{session_id}?offset=N
+      400:
+        description: Parâmetros inválidos
+      413:
+        description: Arquivo excede o tamanho máximo permitido
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        size = int(data.get('size', 0))
+    except (TypeError, ValueError):
+        size = 0
+    if not data.get('filename') or size <= 0:
+        return jsonify({
+            'status': 'error',
+            'message': 'filename e size (maior que zero) são obrigatórios'
+        }), 400
+    file_type = data.get('file_type', 'fileTypeDocument')
+    if file_type not in UPLOAD_FILE_TYPES:
+        return jsonify({
+            'status': 'error',
+            'message': f"Tipo de arquivo inválido: {file_type}. Use um de: {', '.join(sorted(UPLOAD_FILE_TYPES))}"
+        }), 400
+    
+    try:
+        session = tdlib_service.upload_sessions.create(data['filename'], size, file_type)
+    except UploadTooLarge as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 413
+    
+    return jsonify({
+        'status': 'success',
+        'session': session.to_dict()
+    }), 201
+
+@media_bp.route('/uploads/<session_id>', methods=['GET', 'PUT', 'DELETE'])
+@api_key_required
+async def upload_session(session_id):
+    """
+    Envia uma parte (PUT), consulta o estado (GET) ou cancela (DELETE) uma sessão de upload
+    ---
+    tags:
+      - Mídia
+    consumes:
+      - application/octet-stream
+    parameters:
+      - name: session_id
+        in: path
+        type: string
+        required: true
+        description: ID da sessão de upload
+      - name: offset
+        in: query
+        type: integer
+        required: false
+        description: Deslocamento da parte no arquivo, em bytes (obrigatório no PUT)
+    responses:
+      200:
+        description: Estado da sessão, com os intervalos pendentes e o progresso do envio ao Telegram
+      400:
+        description: Parâmetros inválidos
+      404:
+        description: Sessão não encontrada
+      416:
+        description: A parte excede o tamanho declarado ou a sessão já foi enviada
+    """
+    try:
+        if request.method == 'DELETE':
+            tdlib_service.upload_sessions.remove(session_id)
+            return jsonify({'status': 'success'})
+        
+        session = tdlib_service.upload_sessions.get(session_id)
+        if request.method == 'GET':
             return jsonify({
                 'status': 'success',
-                'message': 'Arquivo enviado com sucesso',
-                'file_id': result.get('id', 0),
-                'file_info': result
+                'session': session.to_dict()
             })
-        finally:
-            loop.close()
-            # Remover o arquivo temporário após o upload
-            try:
-                os.remove(temp_file_path)
-            except:
-                pass
-            
+        
+        offset = request.args.get('offset', type=int)
+        if offset is None or offset < 0:
+            return jsonify({
+                'status': 'error',
+                'message': 'offset é obrigatório e não pode ser negativo'
+            }), 400
+        
+        # Gravação bloqueante no disco fora do loop de eventos
+        written = await asyncio.get_running_loop().run_in_executor(
+            None, session.write_stream, request.stream, offset
+        )
+        return jsonify({
+            'status': 'success',
+            'written': written,
+            'session': session.to_dict()
+        })
+    except UploadSessionNotFound as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 404
+    except InvalidChunk as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 416
+
+@media_bp.route('/uploads/<session_id>/commit', methods=['POST'])
+@api_key_required
+async def commit_upload_session(session_id):
+    """
+    Conclui uma sessão de upload e envia o arquivo montado ao Telegram com uma única chamada de envio antecipado (preliminaryUploadFile)
+    ---
+    tags:
+      - Mídia
+    parameters:
+      - name: session_id
+        in: path
+        type: string
+        required: true
+        description: ID da sessão de upload
+      - name: priority
+        in: query
+        type: integer
+        required: false
+        description: Prioridade do upload (1-32, padrão 1)
+    responses:
+      200:
+        description: Envio iniciado (ou já concluído); acompanhe o progresso com GET /uploads/{session_id}
+      404:
+        description: Sessão não encontrada
+      409:
+        description: A sessão ainda não recebeu todos os bytes
+      500:
+        description: Erro interno
+    """
+    try:
+        priority = min(max(request.args.get('priority', 1, type=int), 1), 32)
+        session, file = await tdlib_service.commit_upload_session(session_id, priority)
+        return jsonify({
+            'status': 'success',
+            'file_id': session.file_id,
+            'remote_id': (file or {}).get('remote', {}).get('id') or None,
+            'session': session.to_dict()
+        })
+    except UploadSessionNotFound as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 404
+    except UploadIncomplete as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e),
+            'missing': [list(interval) for interval in e.missing]
+        }), 409
     except Exception as e:
         return jsonify({
             'status': 'error',
-            'message': f'Erro ao fazer upload do arquivo: {str(e)}'
+            'message': f'Erro ao enviar o arquivo: {str(e)}'
         }), 500
 
 @media_bp.route('/profile-photos/<int:user_id>', methods=['GET'])
 @api_key_required
-def get_user_profile_photos(user_id):
+async def get_user_profile_photos(user_id):
     """
     Obtém as fotos de perfil de um usuário
     ---
@@ -396,27 +761,22 @@ def get_user_profile_photos(user_id):
         offset = max(int(request.args.get('offset', 0)), 0)
         limit = min(max(int(request.args.get('limit', 100)), 1), 100)
         
-        # Executar método de forma assíncrona
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            # Obter as fotos de perfil
-            result = loop.run_until_complete(tdlib_service.execute(
-                'getUserProfilePhotos',
-                {
-                    'user_id': user_id,
-                    'offset': offset,
-                    'limit': limit
-                }
-            ))
+        # Executar método no loop compartilhado do serviço TDLib
+        # Obter as fotos de perfil
+        result = await tdlib_service.execute(
+            'getUserProfilePhotos',
+            {
+                'user_id': user_id,
+                'offset': offset,
+                'limit': limit
+            }
+        )
             
-            return jsonify({
-                'status': 'success',
-                'photos': result.get('photos', []),
-                'total_count': result.get('total_count', 0)
-            })
-        finally:
-            loop.close()
+        return jsonify({
+            'status': 'success',
+            'photos': result.get('photos', []),
+            'total_count': result.get('total_count', 0)
+        })
             
     except Exception as e:
         return jsonify({
@@ -426,7 +786,7 @@ def get_user_profile_photos(user_id):
 
 @media_bp.route('/thumbnail/<int:file_id>', methods=['GET'])
 @api_key_required
-def get_file_thumbnail(file_id):
+async def get_file_thumbnail(file_id):
     """
     Obtém a miniatura de um arquivo
     ---
@@ -443,15 +803,24 @@ def get_file_thumbnail(file_id):
         type: string
         required: false
         description: Tipo de miniatura (pequena, média, grande)
+      - name: w
+        in: query
+        type: integer
+        required: false
+        description: Largura da variante redimensionada (uma de THUMBNAIL_VARIANT_WIDTHS, padrão 64, 128 ou 320)
     responses:
       200:
         description: Miniatura obtida com sucesso
+      304:
+        description: Miniatura não modificada (If-None-Match)
       400:
         description: Parâmetros inválidos
       404:
         description: Miniatura não encontrada
       500:
         description: Erro interno
+      501:
+        description: Redimensionamento indisponível no servidor
     """
     try:
         if not file_id:
@@ -461,6 +830,17 @@ def get_file_thumbnail(file_id):
             }), 400
             
         thumbnail_type = request.args.get('thumbnail_type', 's')
+        width = request.args.get('w', type=int)
+        if width is not None and width not in thumbnail_variants.widths:
+            return jsonify({
+                'status': 'error',
+                'message': f"Largura inválida. Use uma de: {', '.join(map(str, thumbnail_variants.widths))}"
+            }), 400
+        if width is not None and not thumbnail_variants.available:
+            return jsonify({
+                'status': 'error',
+                'message': 'Redimensionamento de miniaturas indisponível (Pillow não instalado)'
+            }), 501
         
         # Mapear tipos de miniatura
         thumbnail_format = 'thumbnailFormatJpeg'
@@ -473,86 +853,71 @@ def get_file_thumbnail(file_id):
         else:
             thumbnail_size = 'thumbnailSizeSmall'
         
-        # Executar método de forma assíncrona
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            # Obter informações do arquivo
-            file_info = loop.run_until_complete(tdlib_service.execute(
-                'getFile',
-                {
-                    'file_id': file_id
-                }
-            ))
+        # Executar método no loop compartilhado do serviço TDLib
+        # Obter informações do arquivo
+        file_info = await tdlib_service.execute(
+            'getFile',
+            {
+                'file_id': file_id
+            }
+        )
             
-            if not file_info:
-                return jsonify({
-                    'status': 'error',
-                    'message': 'Arquivo não encontrado'
-                }), 404
+        if not file_info:
+            return jsonify({
+                'status': 'error',
+                'message': 'Arquivo não encontrado'
+            }), 404
                 
-            # Obter miniatura
-            result = loop.run_until_complete(tdlib_service.execute(
-                'getFileThumbnail',
-                {
-                    'file_id': file_id,
-                    'thumbnail_format': {
-                        '@type': thumbnail_format
-                    },
-                    'thumbnail_size': {
-                        '@type': thumbnail_size
-                    }
+        # Obter miniatura
+        result = await tdlib_service.execute(
+            'getFileThumbnail',
+            {
+                'file_id': file_id,
+                'thumbnail_format': {
+                    '@type': thumbnail_format
+                },
+                'thumbnail_size': {
+                    '@type': thumbnail_size
                 }
-            ))
+            }
+        )
             
-            if not result or not result.get('local', {}).get('path', ''):
-                return jsonify({
-                    'status': 'error',
-                    'message': 'Miniatura não disponível'
-                }), 404
+        if not result or not result.get('local', {}).get('path', ''):
+            return jsonify({
+                'status': 'error',
+                'message': 'Miniatura não disponível'
+            }), 404
                 
-            # Verificar se a miniatura foi baixada
-            if result.get('local', {}).get('is_downloading_completed', False):
-                local_path = result.get('local', {}).get('path', '')
-                if os.path.isfile(local_path):
-                    return send_file(
-                        local_path,
-                        mimetype='image/jpeg'
-                    )
+        # Verificar se a miniatura foi baixada
+        if result.get('local', {}).get('is_downloading_completed', False):
+            local_path = result.get('local', {}).get('path', '')
+            if os.path.isfile(local_path):
+                return await send_thumbnail(local_path, result, width)
                 
-            # Baixar a miniatura se não estiver disponível localmente
-            download_result = loop.run_until_complete(tdlib_service.execute(
-                'downloadFile',
-                {
-                    'file_id': result.get('id', 0),
-                    'priority': 1,
-                    'offset': 0,
-                    'limit': 0,
-                    'synchronous': True
-                }
-            ))
+        # Baixar a miniatura se não estiver disponível localmente
+        download_result = await tdlib_service.download_file(result.get('id', 0))
             
-            if download_result and download_result.get('local', {}).get('is_downloading_completed', False):
-                local_path = download_result.get('local', {}).get('path', '')
-                if os.path.isfile(local_path):
-                    return send_file(
-                        local_path,
-                        mimetype='image/jpeg'
-                    )
-                else:
-                    return jsonify({
-                        'status': 'error',
-                        'message': 'Miniatura não encontrada no disco'
-                    }), 404
+        if download_result and download_result.get('local', {}).get('is_downloading_completed', False):
+            local_path = download_result.get('local', {}).get('path', '')
+            if os.path.isfile(local_path):
+                return await send_thumbnail(local_path, download_result, width)
             else:
                 return jsonify({
                     'status': 'error',
-                    'message': 'Não foi possível baixar a miniatura',
-                    'download_info': download_result.get('local', {})
-                }), 500
-        finally:
-            loop.close()
+                    'message': 'Miniatura não encontrada no disco'
+                }), 404
+        else:
+            return jsonify({
+                'status': 'error',
+                'message': 'Não foi possível baixar a miniatura',
+                'download_info': download_result.get('local', {})
+            }), 500
             
+    except ThumbnailUnavailable as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 501
     except Exception as e:
         return jsonify({
             'status': 'error',
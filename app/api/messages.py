@@ -1,11 +1,16 @@
-from fastapi import APIRouter, HTTPException, Depends, status, Query, File, UploadFile, Form, Body, Path
+from fastapi import APIRouter, HTTPException, Depends, status, Query, File, UploadFile, Form, Body, Path, Header, Response
+from fastapi.responses import StreamingResponse
 from typing import Dict, List, Optional, Any
 from pydantic import BaseModel
+import asyncio
 import os
-import aiofiles
-import uuid
 
 from app.core.tdlib_wrapper import tg
+from app.core.bulk import BulkError
+from app.core.history import HISTORY_PAGE_SIZE, ndjson_chat_history
+from app.core.outbox import OutboxConflict, OutboxError
+from app.models.schemas import BulkSendRequest
+from app.core.uploads import UploadTooLarge, input_file, save_upload, temp_directory, unique_filename
 from app.api.auth import verify_token
 
 router = APIRouter()
@@ -18,28 +23,208 @@ class MessageOptions(BaseModel):
     from_background: Optional[bool] = False
     scheduling_state: Optional[Dict[str, Any]] = None
 
+async def preliminary_upload(upload: UploadFile, file_type: str) -> int:
+    """
+    Grava o arquivo recebido em blocos e inicia o envio antecipado na TDLib,
+    retornando o id do arquivo para ser usado com inputFileId.
+    """
+    file_path = os.path.join(temp_directory(), unique_filename(upload.filename))
+    saved = await save_upload(upload, file_path)
+    
+    # O arquivo temporário é removido quando a TDLib concluir o upload
+    file, deduplicated = await tg.upload_file(
+        file_path, saved.sha256, saved.size, file_type, cleanup_path=file_path
+    )
+    if deduplicated:
+        os.remove(file_path)
+    return file.get('id')
+
+async def enqueue_message(params: Dict[str, Any], idempotency_key: Optional[str], response: Response) -> Dict:
+    """
+    Grava a mensagem na fila persistente e responde 202 com o envio, ou 200
+    com o envio já existente quando a chave de idempotência se repete (409 se
+    ela já foi usada com outros dados).
+    """
+    try:
+        job, created = await tg.outbox.submit(params, idempotency_key)
+    except OutboxConflict as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        )
+    except OutboxError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    response.status_code = status.HTTP_202_ACCEPTED if created else status.HTTP_200_OK
+    return {
+        "success": True,
+        "job": job
+    }
+
+def message_store():
+    """Retorna o armazenamento local de mensagens, ou 503 se estiver desativado."""
+    if tg.message_store is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Armazenamento local de mensagens desativado (MESSAGE_STORE_ENABLED)"
+        )
+    return tg.message_store
+
+@router.get("/search", response_model=Dict)
+async def search_messages(
+    q: str = Query(..., min_length=1, description="Texto a buscar (todos os termos são obrigatórios; o último também casa prefixos)"),
+    chat_id: Optional[int] = Query(None, description="Restringe a busca a um chat"),
+    limit: int = Query(50, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    user_data: Dict = Depends(verify_token)
+):
+    """
+    Busca mensagens pelo texto em todos os chats, no índice local (SQLite FTS5),
+    ordenadas por relevância e sem chamadas à TDLib.
+    """
+    store = message_store()
+    try:
+        results = await asyncio.get_running_loop().run_in_executor(None, store.search, q, chat_id, limit, offset)
+        return {
+            "success": True,
+            "results": results,
+            "total_count": len(results)
+        }
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erro ao buscar mensagens: {str(e)}"
+        )
+
+@router.post("/{chat_id}/index", response_model=Dict, status_code=status.HTTP_202_ACCEPTED)
+async def index_chat_history(
+    chat_id: int,
+    limit: int = Query(0, ge=0, description="Número máximo de mensagens a importar (0 para todo o histórico)"),
+    user_data: Dict = Depends(verify_token)
+):
+    """Importa em segundo plano o histórico de um chat para o índice local de busca."""
+    store = message_store()
+    
+    async def fetch(params):
+        return await tg.call_method(method_name='getChatHistory', params=params)
+    
+    return {
+        "success": True,
+        "backfill": store.start_backfill(fetch, chat_id, limit)
+    }
+
+@router.get("/{chat_id}/index", response_model=Dict)
+async def get_index_status(
+    chat_id: int,
+    user_data: Dict = Depends(verify_token)
+):
+    """Andamento da importação do histórico de um chat."""
+    backfill = message_store().backfill_status(chat_id)
+    if backfill is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Nenhuma importação iniciada para este chat"
+        )
+    return {
+        "success": True,
+        "backfill": backfill
+    }
+
+@router.post("/bulk", response_model=Dict, status_code=status.HTTP_202_ACCEPTED)
+async def send_bulk_messages(
+    body: BulkSendRequest,
+    user_data: Dict = Depends(verify_token)
+):
+    """
+    Enfileira o envio de várias mensagens. A ordem é preservada dentro de cada
+    chat, chats diferentes são atendidos em paralelo e os limites de taxa por
+    chat e global são respeitados. O resultado é consultado em /bulk/{job_id}.
+    """
+    try:
+        job = tg.bulk_sender.submit([message.dict(exclude_none=True) for message in body.messages])
+    except BulkError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    return {
+        "success": True,
+        "job": job.to_dict(include_items=False)
+    }
+
+@router.get("/bulk/{job_id}", response_model=Dict)
+async def get_bulk_messages(
+    job_id: str,
+    user_data: Dict = Depends(verify_token)
+):
+    """Andamento de um envio em massa, com o status, message_id ou erro de cada mensagem."""
+    job = tg.bulk_sender.get(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Envio em massa não encontrado"
+        )
+    return {
+        "success": True,
+        "job": job.to_dict()
+    }
+
+@router.get("/outbox/{job_id}", response_model=Dict)
+async def get_outbox_job(
+    job_id: str,
+    user_data: Dict = Depends(verify_token)
+):
+    """Estado de um envio da fila persistente (queued, sending, sent, delivered ou failed)."""
+    if tg.outbox is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Fila persistente de envios desativada (OUTBOX_ENABLED)"
+        )
+    job = await asyncio.get_running_loop().run_in_executor(None, tg.outbox.get, job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Envio não encontrado"
+        )
+    return {
+        "success": True,
+        "job": job
+    }
+
 @router.post("/{chat_id}/send", response_model=Dict)
 async def send_message(
+    response: Response,
     chat_id: int,
     text: str = Form(...),
     reply_to_message_id: Optional[int] = Form(0),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
     user_data: Dict = Depends(verify_token)
 ):
-    """Envia uma mensagem de texto para um chat."""
+    """
+    Envia uma mensagem de texto para um chat. Com a fila persistente ativada
+    (OUTBOX_ENABLED), a mensagem é enfileirada e a resposta traz o job_id,
+    consultado em /outbox/{job_id}.
+    """
+    params = {
+        'chat_id': chat_id,
+        'reply_to_message_id': reply_to_message_id,
+        'input_message_content': {
+            '@type': 'inputMessageText',
+            'text': {
+                '@type': 'formattedText',
+                'text': text
+            }
+        }
+    }
+    if tg.outbox is not None:
+        return await enqueue_message(params, idempotency_key, response)
+    
     try:
         result = await tg.call_method(
             method_name='sendMessage',
-            params={
-                'chat_id': chat_id,
-                'reply_to_message_id': reply_to_message_id,
-                'input_message_content': {
-                    '@type': 'inputMessageText',
-                    'text': {
-                        '@type': 'formattedText',
-                        'text': text
-                    }
-                }
-            }
+            params=params
         )
         
         return {
@@ -54,13 +239,15 @@ async def send_message(
 
 @router.post("/{chat_id}/send_json", response_model=Dict)
 async def send_message_json(
+    response: Response,
     chat_id: int = Path(..., description="ID do chat para enviar a mensagem"),
     content: MessageContent = Body(..., description="Conteúdo da mensagem"),
     options: Optional[MessageOptions] = Body(None, description="Opções de envio"),
     reply_to_message_id: Optional[int] = Body(0, description="ID da mensagem para responder"),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
     user_data: Dict = Depends(verify_token)
 ):
-    """Envia uma mensagem de texto para um chat usando JSON."""
+    """Envia uma mensagem de texto para um chat usando JSON (pela fila persistente, se ativada)."""
     try:
         params = {
             'chat_id': chat_id,
@@ -82,6 +269,9 @@ async def send_message_json(
                 params['from_background'] = options.from_background
             if options.scheduling_state:
                 params['scheduling_state'] = options.scheduling_state
+        
+        if tg.outbox is not None:
+            return await enqueue_message(params, idempotency_key, response)
                 
         result = await tg.call_method(
             method_name='sendMessage',
@@ -92,6 +282,8 @@ async def send_message_json(
             "success": True,
             "message": result
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -101,24 +293,23 @@ async def send_message_json(
 @router.post("/{chat_id}/send_photo", response_model=Dict)
 async def send_photo(
     chat_id: int,
-    photo: UploadFile = File(...),
+    photo: Optional[UploadFile] = File(None),
+    photo_id: Optional[int] = Form(None, description="ID de um arquivo enviado antes por /files/upload, usado no lugar de photo"),
     caption: Optional[str] = Form(""),
     reply_to_message_id: Optional[int] = Form(0),
     user_data: Dict = Depends(verify_token)
 ):
     """Envia uma foto para um chat."""
+    if photo is None and not photo_id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="photo ou photo_id é obrigatório"
+        )
     try:
-        # Salva o arquivo temporariamente
-        temp_dir = os.path.join(os.environ.get("TD_FILES_DIRECTORY", "./td_files"), "temp")
-        os.makedirs(temp_dir, exist_ok=True)
+        if photo is not None:
+            # Inicia o envio antecipado; a mensagem reaproveita o upload em andamento
+            photo_id = await preliminary_upload(photo, 'fileTypePhoto')
         
-        file_path = os.path.join(temp_dir, f"{uuid.uuid4()}_{photo.filename}")
-        
-        async with aiofiles.open(file_path, 'wb') as out_file:
-            content = await photo.read()
-            await out_file.write(content)
-        
-        # Envia a foto
         result = await tg.call_method(
             method_name='sendMessage',
             params={
@@ -126,10 +317,7 @@ async def send_photo(
                 'reply_to_message_id': reply_to_message_id,
                 'input_message_content': {
                     '@type': 'inputMessagePhoto',
-                    'photo': {
-                        '@type': 'inputFileLocal',
-                        'path': file_path
-                    },
+                    'photo': input_file(photo_id),
                     'caption': {
                         '@type': 'formattedText',
                         'text': caption
@@ -138,13 +326,15 @@ async def send_photo(
             }
         )
         
-        # Remove o arquivo temporário
-        os.remove(file_path)
-        
         return {
             "success": True,
             "message": result
         }
+    except UploadTooLarge as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(e)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -154,24 +344,23 @@ async def send_photo(
 @router.post("/{chat_id}/send_video", response_model=Dict)
 async def send_video(
     chat_id: int,
-    video: UploadFile = File(...),
+    video: Optional[UploadFile] = File(None),
+    video_id: Optional[int] = Form(None, description="ID de um arquivo enviado antes por /files/upload, usado no lugar de video"),
     caption: Optional[str] = Form(""),
     reply_to_message_id: Optional[int] = Form(0),
     user_data: Dict = Depends(verify_token)
 ):
     """Envia um vídeo para um chat."""
+    if video is None and not video_id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="video ou video_id é obrigatório"
+        )
     try:
-        # Salva o arquivo temporariamente
-        temp_dir = os.path.join(os.environ.get("TD_FILES_DIRECTORY", "./td_files"), "temp")
-        os.makedirs(temp_dir, exist_ok=True)
+        if video is not None:
+            # Inicia o envio antecipado; a mensagem reaproveita o upload em andamento
+            video_id = await preliminary_upload(video, 'fileTypeVideo')
         
-        file_path = os.path.join(temp_dir, f"{uuid.uuid4()}_{video.filename}")
-        
-        async with aiofiles.open(file_path, 'wb') as out_file:
-            content = await video.read()
-            await out_file.write(content)
-        
-        # Envia o vídeo
         result = await tg.call_method(
             method_name='sendMessage',
             params={
@@ -179,10 +368,7 @@ async def send_video(
                 'reply_to_message_id': reply_to_message_id,
                 'input_message_content': {
                     '@type': 'inputMessageVideo',
-                    'video': {
-                        '@type': 'inputFileLocal',
-                        'path': file_path
-                    },
+                    'video': input_file(video_id),
                     'caption': {
                         '@type': 'formattedText',
                         'text': caption
@@ -191,13 +377,15 @@ async def send_video(
             }
         )
         
-        # Remove o arquivo temporário
-        os.remove(file_path)
-        
         return {
             "success": True,
             "message": result
         }
+    except UploadTooLarge as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(e)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -235,6 +423,34 @@ async def get_chat_history(
             detail=f"Erro ao obter histórico de mensagens: {str(e)}"
         )
 
+@router.get("/{chat_id}/history/stream")
+async def stream_chat_history(
+    chat_id: int,
+    from_message_id: int = Query(0, description="Mensagem a partir da qual exportar (0 para a mais recente)"),
+    limit: int = Query(0, ge=0, description="Número máximo de mensagens (0 para todo o histórico)"),
+    page_size: int = Query(HISTORY_PAGE_SIZE, ge=1, le=100, description="Mensagens por chamada a getChatHistory"),
+    only_local: bool = Query(False, description="Exporta apenas as mensagens já armazenadas localmente"),
+    user_data: Dict = Depends(verify_token)
+):
+    """
+    Exporta o histórico de um chat em NDJSON (uma mensagem por linha), sem o
+    limite de 100 mensagens, enviando cada página assim que ela chega da TDLib.
+    """
+    async def fetch(params):
+        return await tg.call_method(method_name='getChatHistory', params=params)
+    
+    return StreamingResponse(
+        ndjson_chat_history(
+            fetch,
+            chat_id,
+            from_message_id=from_message_id,
+            limit=limit,
+            page_size=page_size,
+            only_local=only_local
+        ),
+        media_type="application/x-ndjson"
+    )
+
 @router.get("/{chat_id}/message/{message_id}", response_model=Dict)
 async def get_message(
     chat_id: int,
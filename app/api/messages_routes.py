@@ -1,8 +1,12 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, Response, request, jsonify, current_app
 from app.api.auth_middleware import api_key_required
+from app.core.bulk import BulkError
+from app.core.history import HISTORY_PAGE_SIZE, ndjson_chat_history
+from app.core.outbox import OutboxConflict, OutboxError
+from app.core.uploads import input_file
 from app.services.tdlib_service import tdlib_service
 import asyncio
 import os
@@ -12,9 +16,14 @@ messages_bp = Blueprint('messages', __name__)
 
 @messages_bp.route('/<int:chat_id>/send', methods=['POST'])
 @api_key_required
-def send_message(chat_id):
+async def send_message(chat_id):
     """
     Envia uma mensagem de texto para um chat
+    
+    Com a fila persistente ativada (OUTBOX_ENABLED), a mensagem é gravada na
+    fila e a resposta (202) retorna o job_id, cujo andamento é consultado em
+    /outbox/<job_id>. O cabeçalho Idempotency-Key evita envios duplicados
+    quando o cliente repete a requisição.
     ---
     tags:
       - Mensagens
@@ -24,6 +33,11 @@ def send_message(chat_id):
         type: integer
         required: true
         description: ID do chat
+      - name: Idempotency-Key
+        in: header
+        type: string
+        required: false
+        description: Chave que identifica o envio na fila persistente; repetida com os mesmos dados, retorna o envio já existente
       - name: body
         in: body
         required: true
@@ -41,7 +55,11 @@ def send_message(chat_id):
               description: Se true, envia a mensagem silenciosamente
     responses:
       200:
-        description: Mensagem enviada com sucesso
+        description: Mensagem enviada com sucesso (ou envio já existente na fila persistente)
+      202:
+        description: Mensagem gravada na fila persistente
+      409:
+        description: Idempotency-Key já usada por um envio com outros dados
       400:
         description: Parâmetros inválidos
       500:
@@ -75,27 +93,40 @@ def send_message(chat_id):
             }
         }
         
-        # Executar método de forma assíncrona
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            result = loop.run_until_complete(tdlib_service.execute(
-                'sendMessage',
-                {
-                    'chat_id': chat_id,
-                    'reply_to_message_id': reply_to_message_id,
-                    'disable_notification': disable_notification,
-                    'input_message_content': input_message_content
-                }
-            ))
-            
+        params = {
+            'chat_id': chat_id,
+            'reply_to_message_id': reply_to_message_id,
+            'disable_notification': disable_notification,
+            'input_message_content': input_message_content
+        }
+        
+        if tdlib_service.outbox is not None:
+            try:
+                job, created = await tdlib_service.outbox.submit(params, request.headers.get('Idempotency-Key'))
+            except OutboxConflict as e:
+                return jsonify({
+                    'status': 'error',
+                    'message': str(e)
+                }), 409
+            except OutboxError as e:
+                return jsonify({
+                    'status': 'error',
+                    'message': str(e)
+                }), 400
             return jsonify({
                 'status': 'success',
-                'message': 'Mensagem enviada com sucesso',
-                'message_id': result.get('id', 0)
-            })
-        finally:
-            loop.close()
+                'message': 'Mensagem enfileirada para envio',
+                'job': job
+            }), 202 if created else 200
+        
+        # Executar método no loop compartilhado do serviço TDLib
+        result = await tdlib_service.execute('sendMessage', params)
+            
+        return jsonify({
+            'status': 'success',
+            'message': 'Mensagem enviada com sucesso',
+            'message_id': result.get('id', 0)
+        })
             
     except Exception as e:
         return jsonify({
@@ -103,9 +134,152 @@ def send_message(chat_id):
             'message': f'Erro ao enviar mensagem: {str(e)}'
         }), 500
 
+@messages_bp.route('/bulk', methods=['POST'])
+@api_key_required
+async def send_bulk_messages():
+    """
+    Enfileira o envio de várias mensagens, para um ou mais chats
+    
+    A resposta retorna imediatamente com o job_id; o resultado de cada mensagem
+    é consultado em /bulk/<job_id>. As mensagens de um mesmo chat são enviadas
+    na ordem recebida e chats diferentes em paralelo, respeitando os limites de
+    taxa por chat (BULK_CHAT_RATE) e global (BULK_GLOBAL_RATE). Um FLOOD_WAIT
+    pausa apenas o chat afetado, e a mensagem é reenviada após a espera.
+    ---
+    tags:
+      - Mensagens
+    parameters:
+      - name: body
+        in: body
+        required: true
+        schema:
+          type: object
+          required:
+            - messages
+          properties:
+            messages:
+              type: array
+              description: Mensagens a enviar (máximo BULK_MAX_ITEMS)
+              items:
+                type: object
+                properties:
+                  chat_id:
+                    type: integer
+                    description: ID do chat de destino
+                  text:
+                    type: string
+                    description: Texto da mensagem
+                  input_message_content:
+                    type: object
+                    description: Conteúdo completo da TDLib, usado no lugar de text
+                  reply_to_message_id:
+                    type: integer
+                    description: ID da mensagem a responder
+                  disable_notification:
+                    type: boolean
+                    description: Se true, envia a mensagem silenciosamente
+    responses:
+      202:
+        description: Mensagens enfileiradas
+      400:
+        description: Parâmetros inválidos
+    """
+    data = request.get_json(silent=True) or {}
+    messages = data.get('messages')
+    if not isinstance(messages, list):
+        return jsonify({
+            'status': 'error',
+            'message': 'O campo messages deve ser uma lista'
+        }), 400
+        
+    try:
+        job = tdlib_service.bulk_sender.submit(messages)
+    except BulkError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 400
+        
+    return jsonify({
+        'status': 'success',
+        'job': job.to_dict(include_items=False)
+    }), 202
+
+@messages_bp.route('/bulk/<job_id>', methods=['GET'])
+@api_key_required
+def get_bulk_messages(job_id):
+    """
+    Consulta o andamento de um envio em massa e o resultado de cada mensagem
+    ---
+    tags:
+      - Mensagens
+    parameters:
+      - name: job_id
+        in: path
+        type: string
+        required: true
+        description: ID retornado por /bulk
+    responses:
+      200:
+        description: Andamento do envio, com status (queued, delivered, sent sem confirmação do servidor ou failed), message_id ou erro de cada mensagem
+      404:
+        description: Envio não encontrado ou expirado
+    """
+    job = tdlib_service.bulk_sender.get(job_id)
+    if job is None:
+        return jsonify({
+            'status': 'error',
+            'message': 'Envio em massa não encontrado'
+        }), 404
+        
+    return jsonify({
+        'status': 'success',
+        'job': job.to_dict()
+    })
+
+@messages_bp.route('/outbox/<job_id>', methods=['GET'])
+@api_key_required
+def get_outbox_job(job_id):
+    """
+    Consulta um envio da fila persistente
+    ---
+    tags:
+      - Mensagens
+    parameters:
+      - name: job_id
+        in: path
+        type: string
+        required: true
+        description: ID retornado por /<chat_id>/send
+    responses:
+      200:
+        description: Estado do envio (queued, sending, sent, delivered ou failed), message_id e erro
+      404:
+        description: Envio não encontrado ou expirado
+      503:
+        description: Fila persistente desativada
+    """
+    if tdlib_service.outbox is None:
+        return jsonify({
+            'status': 'error',
+            'message': 'Fila persistente de envios desativada (OUTBOX_ENABLED)'
+        }), 503
+        
+    job = tdlib_service.outbox.get(job_id)
+    if job is None:
+        return jsonify({
+            'status': 'error',
+            'message': 'Envio não encontrado'
+        }), 404
+        
+    return jsonify({
+        'status': 'success',
+        'job': job
+    })
+
 @messages_bp.route('/<int:chat_id>/photo', methods=['POST'])
 @api_key_required
-def send_photo(chat_id):
+async def send_photo(chat_id):
     """
     Envia uma foto para um chat
     ---
@@ -126,6 +300,9 @@ def send_photo(chat_id):
             photo_path:
               type: string
               description: Caminho do arquivo de foto no servidor
+            photo_id:
+              type: integer
+              description: ID de um arquivo já enviado ou com envio antecipado em andamento (POST /api/v1/media/upload), usado no lugar de photo_path
             caption:
               type: string
               description: Legenda da foto
@@ -152,58 +329,51 @@ def send_photo(chat_id):
             
         data = request.json
         
-        if not data or 'photo_path' not in data:
+        if not data or not (data.get('photo_path') or data.get('photo_id')):
             return jsonify({
                 'status': 'error',
-                'message': 'Caminho da foto é obrigatório'
+                'message': 'photo_path ou photo_id é obrigatório'
             }), 400
             
-        photo_path = data['photo_path']
+        photo_path = data.get('photo_path')
+        photo_id = data.get('photo_id')
         caption = data.get('caption', '')
         reply_to_message_id = data.get('reply_to_message_id', 0)
         disable_notification = data.get('disable_notification', False)
         
         # Verificar se o arquivo existe
-        if not os.path.isfile(photo_path):
+        if not photo_id and not os.path.isfile(photo_path):
             return jsonify({
                 'status': 'error',
                 'message': f'Arquivo não encontrado: {photo_path}'
             }), 400
             
-        # Executar método de forma assíncrona
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            # Criar o conteúdo de entrada da mensagem
-            input_message_content = {
-                '@type': 'inputMessagePhoto',
-                'photo': {
-                    '@type': 'inputFileLocal',
-                    'path': photo_path
-                },
-                'caption': {
-                    '@type': 'formattedText',
-                    'text': caption
-                }
+        # Executar método no loop compartilhado do serviço TDLib
+        # Criar o conteúdo de entrada da mensagem
+        input_message_content = {
+            '@type': 'inputMessagePhoto',
+            'photo': input_file(photo_id, photo_path),
+            'caption': {
+                '@type': 'formattedText',
+                'text': caption
             }
+        }
             
-            result = loop.run_until_complete(tdlib_service.execute(
-                'sendMessage',
-                {
-                    'chat_id': chat_id,
-                    'reply_to_message_id': reply_to_message_id,
-                    'disable_notification': disable_notification,
-                    'input_message_content': input_message_content
-                }
-            ))
+        result = await tdlib_service.execute(
+            'sendMessage',
+            {
+                'chat_id': chat_id,
+                'reply_to_message_id': reply_to_message_id,
+                'disable_notification': disable_notification,
+                'input_message_content': input_message_content
+            }
+        )
             
-            return jsonify({
-                'status': 'success',
-                'message': 'Foto enviada com sucesso',
-                'message_id': result.get('id', 0)
-            })
-        finally:
-            loop.close()
+        return jsonify({
+            'status': 'success',
+            'message': 'Foto enviada com sucesso',
+            'message_id': result.get('id', 0)
+        })
             
     except Exception as e:
         return jsonify({
@@ -213,7 +383,7 @@ def send_photo(chat_id):
 
 @messages_bp.route('/<int:chat_id>/file', methods=['POST'])
 @api_key_required
-def send_file(chat_id):
+async def send_file(chat_id):
     """
     Envia um arquivo para um chat
     ---
@@ -234,6 +404,9 @@ def send_file(chat_id):
             file_path:
               type: string
               description: Caminho do arquivo no servidor
+            file_id:
+              type: integer
+              description: ID de um arquivo já enviado ou com envio antecipado em andamento (POST /api/v1/media/upload), usado no lugar de file_path
             caption:
               type: string
               description: Legenda do arquivo
@@ -260,58 +433,51 @@ def send_file(chat_id):
             
         data = request.json
         
-        if not data or 'file_path' not in data:
+        if not data or not (data.get('file_path') or data.get('file_id')):
             return jsonify({
                 'status': 'error',
-                'message': 'Caminho do arquivo é obrigatório'
+                'message': 'file_path ou file_id é obrigatório'
             }), 400
             
-        file_path = data['file_path']
+        file_path = data.get('file_path')
+        file_id = data.get('file_id')
         caption = data.get('caption', '')
         reply_to_message_id = data.get('reply_to_message_id', 0)
         disable_notification = data.get('disable_notification', False)
         
         # Verificar se o arquivo existe
-        if not os.path.isfile(file_path):
+        if not file_id and not os.path.isfile(file_path):
             return jsonify({
                 'status': 'error',
                 'message': f'Arquivo não encontrado: {file_path}'
             }), 400
             
-        # Executar método de forma assíncrona
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            # Criar o conteúdo de entrada da mensagem
-            input_message_content = {
-                '@type': 'inputMessageDocument',
-                'document': {
-                    '@type': 'inputFileLocal',
-                    'path': file_path
-                },
-                'caption': {
-                    '@type': 'formattedText',
-                    'text': caption
-                }
+        # Executar método no loop compartilhado do serviço TDLib
+        # Criar o conteúdo de entrada da mensagem
+        input_message_content = {
+            '@type': 'inputMessageDocument',
+            'document': input_file(file_id, file_path),
+            'caption': {
+                '@type': 'formattedText',
+                'text': caption
             }
+        }
             
-            result = loop.run_until_complete(tdlib_service.execute(
-                'sendMessage',
-                {
-                    'chat_id': chat_id,
-                    'reply_to_message_id': reply_to_message_id,
-                    'disable_notification': disable_notification,
-                    'input_message_content': input_message_content
-                }
-            ))
+        result = await tdlib_service.execute(
+            'sendMessage',
+            {
+                'chat_id': chat_id,
+                'reply_to_message_id': reply_to_message_id,
+                'disable_notification': disable_notification,
+                'input_message_content': input_message_content
+            }
+        )
             
-            return jsonify({
-                'status': 'success',
-                'message': 'Arquivo enviado com sucesso',
-                'message_id': result.get('id', 0)
-            })
-        finally:
-            loop.close()
+        return jsonify({
+            'status': 'success',
+            'message': 'Arquivo enviado com sucesso',
+            'message_id': result.get('id', 0)
+        })
             
     except Exception as e:
         return jsonify({
@@ -321,7 +487,7 @@ def send_file(chat_id):
 
 @messages_bp.route('/<int:chat_id>/video', methods=['POST'])
 @api_key_required
-def send_video(chat_id):
+async def send_video(chat_id):
     """
     Envia um vídeo para um chat
     ---
@@ -342,6 +508,9 @@ def send_video(chat_id):
             video_path:
               type: string
               description: Caminho do arquivo de vídeo no servidor
+            video_id:
+              type: integer
+              description: ID de um arquivo já enviado ou com envio antecipado em andamento (POST /api/v1/media/upload), usado no lugar de video_path
             caption:
               type: string
               description: Legenda do vídeo
@@ -368,58 +537,51 @@ def send_video(chat_id):
             
         data = request.json
         
-        if not data or 'video_path' not in data:
+        if not data or not (data.get('video_path') or data.get('video_id')):
             return jsonify({
                 'status': 'error',
-                'message': 'Caminho do vídeo é obrigatório'
+                'message': 'video_path ou video_id é obrigatório'
             }), 400
             
-        video_path = data['video_path']
+        video_path = data.get('video_path')
+        video_id = data.get('video_id')
         caption = data.get('caption', '')
         reply_to_message_id = data.get('reply_to_message_id', 0)
         disable_notification = data.get('disable_notification', False)
         
         # Verificar se o arquivo existe
-        if not os.path.isfile(video_path):
+        if not video_id and not os.path.isfile(video_path):
             return jsonify({
                 'status': 'error',
                 'message': f'Arquivo não encontrado: {video_path}'
             }), 400
             
-        # Executar método de forma assíncrona
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            # Criar o conteúdo de entrada da mensagem
-            input_message_content = {
-                '@type': 'inputMessageVideo',
-                'video': {
-                    '@type': 'inputFileLocal',
-                    'path': video_path
-                },
-                'caption': {
-                    '@type': 'formattedText',
-                    'text': caption
-                }
+        # Executar método no loop compartilhado do serviço TDLib
+        # Criar o conteúdo de entrada da mensagem
+        input_message_content = {
+            '@type': 'inputMessageVideo',
+            'video': input_file(video_id, video_path),
+            'caption': {
+                '@type': 'formattedText',
+                'text': caption
             }
+        }
             
-            result = loop.run_until_complete(tdlib_service.execute(
-                'sendMessage',
-                {
-                    'chat_id': chat_id,
-                    'reply_to_message_id': reply_to_message_id,
-                    'disable_notification': disable_notification,
-                    'input_message_content': input_message_content
-                }
-            ))
+        result = await tdlib_service.execute(
+            'sendMessage',
+            {
+                'chat_id': chat_id,
+                'reply_to_message_id': reply_to_message_id,
+                'disable_notification': disable_notification,
+                'input_message_content': input_message_content
+            }
+        )
             
-            return jsonify({
-                'status': 'success',
-                'message': 'Vídeo enviado com sucesso',
-                'message_id': result.get('id', 0)
-            })
-        finally:
-            loop.close()
+        return jsonify({
+            'status': 'success',
+            'message': 'Vídeo enviado com sucesso',
+            'message_id': result.get('id', 0)
+        })
             
     except Exception as e:
         return jsonify({
@@ -429,7 +591,7 @@ def send_video(chat_id):
 
 @messages_bp.route('/<int:chat_id>/history', methods=['GET'])
 @api_key_required
-def get_chat_history(chat_id):
+async def get_chat_history(chat_id):
     """
     Obtém o histórico de mensagens de um chat
     ---
@@ -469,28 +631,23 @@ def get_chat_history(chat_id):
         limit = min(int(request.args.get('limit', 100)), 100)
         from_message_id = int(request.args.get('from_message_id', 0))
         
-        # Executar método de forma assíncrona
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            result = loop.run_until_complete(tdlib_service.execute(
-                'getChatHistory',
-                {
-                    'chat_id': chat_id,
-                    'from_message_id': from_message_id,
-                    'offset': 0,
-                    'limit': limit,
-                    'only_local': False
-                }
-            ))
+        # Executar método no loop compartilhado do serviço TDLib
+        result = await tdlib_service.execute(
+            'getChatHistory',
+            {
+                'chat_id': chat_id,
+                'from_message_id': from_message_id,
+                'offset': 0,
+                'limit': limit,
+                'only_local': False
+            }
+        )
             
-            return jsonify({
-                'status': 'success',
-                'messages': result.get('messages', []),
-                'total_count': len(result.get('messages', []))
-            })
-        finally:
-            loop.close()
+        return jsonify({
+            'status': 'success',
+            'messages': result.get('messages', []),
+            'total_count': len(result.get('messages', []))
+        })
             
     except Exception as e:
         return jsonify({
@@ -498,9 +655,217 @@ def get_chat_history(chat_id):
             'message': f'Erro ao obter histórico de mensagens: {str(e)}'
         }), 500
 
+@messages_bp.route('/<int:chat_id>/history/stream', methods=['GET'])
+@api_key_required
+def stream_chat_history(chat_id):
+    """
+    Exporta o histórico de um chat em NDJSON, sem o limite de 100 mensagens
+    
+    As páginas de getChatHistory são buscadas internamente, com o id da última
+    mensagem como cursor, e cada página é enviada assim que chega da TDLib.
+    Apenas algumas páginas são buscadas à frente do cliente (HISTORY_PREFETCH_PAGES),
+    de modo que o uso de memória não depende do tamanho do chat.
+    ---
+    tags:
+      - Mensagens
+    produces:
+      - application/x-ndjson
+    parameters:
+      - name: chat_id
+        in: path
+        type: integer
+        required: true
+        description: ID do chat
+      - name: from_message_id
+        in: query
+        type: integer
+        required: false
+        description: ID da mensagem a partir da qual exportar (0 para a mais recente)
+      - name: limit
+        in: query
+        type: integer
+        required: false
+        description: Número máximo de mensagens (0 para todo o histórico)
+      - name: page_size
+        in: query
+        type: integer
+        required: false
+        description: Mensagens por chamada a getChatHistory (1-100, padrão 100)
+      - name: only_local
+        in: query
+        type: boolean
+        required: false
+        description: Se true, exporta apenas as mensagens já armazenadas localmente
+    responses:
+      200:
+        description: Uma mensagem JSON por linha; um erro durante a exportação é informado em uma última linha com "@type" igual a "error"
+      400:
+        description: Parâmetros inválidos
+    """
+    try:
+        from_message_id = int(request.args.get('from_message_id', 0))
+        limit = max(int(request.args.get('limit', 0)), 0)
+        page_size = min(max(int(request.args.get('page_size', HISTORY_PAGE_SIZE)), 1), 100)
+    except ValueError:
+        return jsonify({
+            'status': 'error',
+            'message': 'from_message_id, limit e page_size devem ser inteiros'
+        }), 400
+    only_local = request.args.get('only_local', 'false').lower() in ('1', 'true')
+    
+    async def fetch(params):
+        return await tdlib_service.execute('getChatHistory', params)
+    
+    return Response(
+        tdlib_service.iterate(ndjson_chat_history(
+            fetch,
+            chat_id,
+            from_message_id=from_message_id,
+            limit=limit,
+            page_size=page_size,
+            only_local=only_local
+        )),
+        mimetype='application/x-ndjson'
+    )
+
+@messages_bp.route('/search', methods=['GET'])
+@api_key_required
+async def search_messages():
+    """
+    Busca mensagens pelo texto em todos os chats, no armazenamento local
+    
+    A busca usa o índice de texto completo (SQLite FTS5) alimentado pelas
+    atualizações de mensagens e pela importação do histórico (/<chat_id>/index),
+    sem chamadas à TDLib. Os resultados vêm ordenados por relevância.
+    ---
+    tags:
+      - Mensagens
+    parameters:
+      - name: q
+        in: query
+        type: string
+        required: true
+        description: Texto a buscar (todos os termos são obrigatórios; o último também casa prefixos)
+      - name: chat_id
+        in: query
+        type: integer
+        required: false
+        description: Restringe a busca a um chat
+      - name: limit
+        in: query
+        type: integer
+        required: false
+        description: Número máximo de resultados (padrão 50, máximo 100)
+      - name: offset
+        in: query
+        type: integer
+        required: false
+        description: Número de resultados a pular
+    responses:
+      200:
+        description: Mensagens encontradas, com trecho destacado
+      400:
+        description: Parâmetros inválidos
+      503:
+        description: Armazenamento local de mensagens desativado
+      500:
+        description: Erro interno
+    """
+    try:
+        if tdlib_service.message_store is None:
+            return jsonify({
+                'status': 'error',
+                'message': 'Armazenamento local de mensagens desativado (MESSAGE_STORE_ENABLED)'
+            }), 503
+            
+        query = request.args.get('q', '').strip()
+        if not query:
+            return jsonify({
+                'status': 'error',
+                'message': 'O parâmetro q é obrigatório'
+            }), 400
+            
+        chat_id = request.args.get('chat_id', type=int)
+        limit = min(max(request.args.get('limit', 50, type=int), 1), 100)
+        offset = max(request.args.get('offset', 0, type=int), 0)
+        
+        # Consulta ao SQLite fora do loop de eventos
+        results = await asyncio.get_running_loop().run_in_executor(
+            None, tdlib_service.message_store.search, query, chat_id, limit, offset
+        )
+        
+        return jsonify({
+            'status': 'success',
+            'results': results,
+            'total_count': len(results)
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': f'Erro ao buscar mensagens: {str(e)}'
+        }), 500
+
+@messages_bp.route('/<int:chat_id>/index', methods=['GET', 'POST'])
+@api_key_required
+async def index_chat_history(chat_id):
+    """
+    Importa (POST) o histórico de um chat para o armazenamento local de busca, ou consulta (GET) o andamento
+    ---
+    tags:
+      - Mensagens
+    parameters:
+      - name: chat_id
+        in: path
+        type: integer
+        required: true
+        description: ID do chat
+      - name: limit
+        in: query
+        type: integer
+        required: false
+        description: Número máximo de mensagens a importar (0 para todo o histórico)
+    responses:
+      200:
+        description: Andamento da importação
+      202:
+        description: Importação iniciada em segundo plano
+      404:
+        description: Nenhuma importação iniciada para o chat
+      503:
+        description: Armazenamento local de mensagens desativado
+    """
+    store = tdlib_service.message_store
+    if store is None:
+        return jsonify({
+            'status': 'error',
+            'message': 'Armazenamento local de mensagens desativado (MESSAGE_STORE_ENABLED)'
+        }), 503
+        
+    if request.method == 'GET':
+        backfill = store.backfill_status(chat_id)
+        if backfill is None:
+            return jsonify({
+                'status': 'error',
+                'message': 'Nenhuma importação iniciada para este chat'
+            }), 404
+        return jsonify({
+            'status': 'success',
+            'backfill': backfill
+        })
+        
+    async def fetch(params):
+        return await tdlib_service.execute('getChatHistory', params)
+    
+    limit = max(request.args.get('limit', 0, type=int), 0)
+    return jsonify({
+        'status': 'success',
+        'backfill': store.start_backfill(fetch, chat_id, limit)
+    }), 202
+
 @messages_bp.route('/<int:chat_id>/forward', methods=['POST'])
 @api_key_required
-def forward_messages(chat_id):
+async def forward_messages(chat_id):
     """
     Encaminha mensagens para um chat
     ---
@@ -562,29 +927,24 @@ def forward_messages(chat_id):
                 'message': 'IDs das mensagens devem ser uma lista não vazia'
             }), 400
             
-        # Executar método de forma assíncrona
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            result = loop.run_until_complete(tdlib_service.execute(
-                'forwardMessages',
-                {
-                    'chat_id': chat_id,
-                    'from_chat_id': from_chat_id,
-                    'message_ids': message_ids,
-                    'disable_notification': disable_notification,
-                    'send_copy': False,
-                    'remove_caption': False
-                }
-            ))
+        # Executar método no loop compartilhado do serviço TDLib
+        result = await tdlib_service.execute(
+            'forwardMessages',
+            {
+                'chat_id': chat_id,
+                'from_chat_id': from_chat_id,
+                'message_ids': message_ids,
+                'disable_notification': disable_notification,
+                'send_copy': False,
+                'remove_caption': False
+            }
+        )
             
-            return jsonify({
-                'status': 'success',
-                'message': 'Mensagens encaminhadas com sucesso',
-                'message_ids': result.get('message_ids', [])
-            })
-        finally:
-            loop.close()
+        return jsonify({
+            'status': 'success',
+            'message': 'Mensagens encaminhadas com sucesso',
+            'message_ids': result.get('message_ids', [])
+        })
             
     except Exception as e:
         return jsonify({
@@ -594,7 +954,7 @@ def forward_messages(chat_id):
 
 @messages_bp.route('/<int:chat_id>/<int:message_id>', methods=['DELETE'])
 @api_key_required
-def delete_message(chat_id, message_id):
+async def delete_message(chat_id, message_id):
     """
     Exclui uma mensagem
     ---
@@ -633,25 +993,20 @@ def delete_message(chat_id, message_id):
             
         revoke = request.args.get('revoke', 'false').lower() == 'true'
         
-        # Executar método de forma assíncrona
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            result = loop.run_until_complete(tdlib_service.execute(
-                'deleteMessages',
-                {
-                    'chat_id': chat_id,
-                    'message_ids': [message_id],
-                    'revoke': revoke
-                }
-            ))
+        # Executar método no loop compartilhado do serviço TDLib
+        result = await tdlib_service.execute(
+            'deleteMessages',
+            {
+                'chat_id': chat_id,
+                'message_ids': [message_id],
+                'revoke': revoke
+            }
+        )
             
-            return jsonify({
-                'status': 'success',
-                'message': 'Mensagem excluída com sucesso'
-            })
-        finally:
-            loop.close()
+        return jsonify({
+            'status': 'success',
+            'message': 'Mensagem excluída com sucesso'
+        })
             
     except Exception as e:
         return jsonify({
@@ -661,7 +1016,7 @@ def delete_message(chat_id, message_id):
 
 @messages_bp.route('/<int:chat_id>/<int:message_id>/edit', methods=['PUT'])
 @api_key_required
-def edit_message_text(chat_id, message_id):
+async def edit_message_text(chat_id, message_id):
     """
     Edita o texto de uma mensagem
     ---
@@ -712,31 +1067,26 @@ def edit_message_text(chat_id, message_id):
             
         text = data['text']
         
-        # Executar método de forma assíncrona
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            result = loop.run_until_complete(tdlib_service.execute(
-                'editMessageText',
-                {
-                    'chat_id': chat_id,
-                    'message_id': message_id,
-                    'input_message_content': {
-                        '@type': 'inputMessageText',
-                        'text': {
-                            '@type': 'formattedText',
-                            'text': text
-                        }
+        # Executar método no loop compartilhado do serviço TDLib
+        result = await tdlib_service.execute(
+            'editMessageText',
+            {
+                'chat_id': chat_id,
+                'message_id': message_id,
+                'input_message_content': {
+                    '@type': 'inputMessageText',
+                    'text': {
+                        '@type': 'formattedText',
+                        'text': text
                     }
                 }
-            ))
+            }
+        )
             
-            return jsonify({
-                'status': 'success',
-                'message': 'Mensagem editada com sucesso'
-            })
-        finally:
-            loop.close()
+        return jsonify({
+            'status': 'success',
+            'message': 'Mensagem editada com sucesso'
+        })
             
     except Exception as e:
         return jsonify({
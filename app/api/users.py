@@ -28,51 +28,51 @@ async def get_current_user(
             detail=f"Erro ao obter informações do usuário: {str(e)}"
         )
 
-@router.get("/{user_id}", response_model=Dict)
-async def get_user_info(
-    user_id: int,
+@router.get("/search", response_model=Dict)
+async def search_users(
+    query: str = Query(...),
+    limit: int = Query(50, ge=1, le=100),
+    expand: Optional[str] = Query(None, description="Use 'users' para retornar os objetos completos dos usuários"),
     user_data: Dict = Depends(verify_token)
 ):
-    """Obtém informações de um usuário pelo ID."""
+    """Pesquisa usuários pelo nome ou número de telefone."""
     try:
-        result = await tg.call_method(
-            method_name='getUser',
-            params={
-                'user_id': user_id
-            }
+        result = await search_contacts(
+            query=query,
+            limit=limit
         )
         
+        users = result.get("user_ids", [])
+        if expand == "users":
+            users = await tg.get_users(users)
+        
         return {
             "success": True,
-            "user": result
+            "users": users
         }
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Erro ao obter informações do usuário: {str(e)}"
+            detail=f"Erro ao pesquisar usuários: {str(e)}"
         )
 
-@router.get("/search", response_model=Dict)
-async def search_users(
-    query: str = Query(...),
-    limit: int = Query(50, ge=1, le=100),
+@router.get("/{user_id}", response_model=Dict)
+async def get_user_info(
+    user_id: int,
     user_data: Dict = Depends(verify_token)
 ):
-    """Pesquisa usuários pelo nome ou número de telefone."""
+    """Obtém informações de um usuário pelo ID."""
     try:
-        result = await search_contacts(
-            query=query,
-            limit=limit
-        )
+        result = await tg.get_user(user_id)
         
         return {
             "success": True,
-            "users": result.get("user_ids", [])
+            "user": result
         }
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Erro ao pesquisar usuários: {str(e)}"
+            detail=f"Erro ao obter informações do usuário: {str(e)}"
         )
 
 @router.post("/contacts/add", response_model=Dict)
@@ -134,6 +134,7 @@ async def remove_contact(
 
 @router.get("/contacts/list", response_model=Dict)
 async def get_contacts(
+    expand: Optional[str] = Query(None, description="Use 'users' para retornar os objetos completos dos contatos"),
     user_data: Dict = Depends(verify_token)
 ):
     """Obtém a lista de contatos."""
@@ -143,10 +144,14 @@ async def get_contacts(
             params={}
         )
         
+        contacts = result.get("user_ids", [])
+        if expand == "users":
+            contacts = await tg.get_users(contacts)
+        
         return {
             "success": True,
-            "total_count": len(result.get("user_ids", [])),
-            "contacts": result.get("user_ids", [])
+            "total_count": len(contacts),
+            "contacts": contacts
         }
     except Exception as e:
         raise HTTPException(
@@ -4,14 +4,13 @@
 from flask import Blueprint, request, jsonify, current_app
 from app.api.auth_middleware import api_key_required
 from app.services.tdlib_service import tdlib_service
-import asyncio
 
 # Criar o blueprint para usuários
 users_bp = Blueprint('users', __name__)
 
 @users_bp.route('/me', methods=['GET'])
 @api_key_required
-def get_current_user():
+async def get_current_user():
     """
     Obtém informações do usuário atual
     ---
@@ -24,18 +23,13 @@ def get_current_user():
         description: Erro interno
     """
     try:
-        # Executar método de forma assíncrona
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            result = loop.run_until_complete(tdlib_service.execute('getMe'))
+        # Executar método no loop compartilhado do serviço TDLib
+        result = await tdlib_service.execute('getMe')
             
-            return jsonify({
-                'status': 'success',
-                'user': result
-            })
-        finally:
-            loop.close()
+        return jsonify({
+            'status': 'success',
+            'user': result
+        })
             
     except Exception as e:
         return jsonify({
@@ -45,7 +39,7 @@ def get_current_user():
 
 @users_bp.route('/<int:user_id>', methods=['GET'])
 @api_key_required
-def get_user_info(user_id):
+async def get_user_info(user_id):
     """
     Obtém informações de um usuário pelo ID
     ---
@@ -72,21 +66,13 @@ def get_user_info(user_id):
                 'message': 'ID do usuário é obrigatório'
             }), 400
             
-        # Executar método de forma assíncrona
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            result = loop.run_until_complete(tdlib_service.execute(
-                'getUser',
-                {'user_id': user_id}
-            ))
+        # Servir do cache de usuários quando o valor estiver dentro da validade
+        result = await tdlib_service.get_user(user_id)
             
-            return jsonify({
-                'status': 'success',
-                'user': result
-            })
-        finally:
-            loop.close()
+        return jsonify({
+            'status': 'success',
+            'user': result
+        })
             
     except Exception as e:
         return jsonify({
@@ -96,7 +82,7 @@ def get_user_info(user_id):
 
 @users_bp.route('/search', methods=['GET'])
 @api_key_required
-def search_users():
+async def search_users():
     """
     Pesquisa usuários pelo nome ou número de telefone
     ---
@@ -113,6 +99,11 @@ def search_users():
         type: integer
         required: false
         description: Limite de resultados (padrão 50, máximo 100)
+      - name: expand
+        in: query
+        type: string
+        required: false
+        description: Use 'users' para retornar os objetos completos dos usuários em vez dos IDs
     responses:
       200:
         description: Resultados da pesquisa
@@ -131,21 +122,20 @@ def search_users():
                 'message': 'Termo de busca é obrigatório'
             }), 400
             
-        # Executar método de forma assíncrona
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            result = loop.run_until_complete(tdlib_service.execute(
-                'searchContacts',
-                {'query': query, 'limit': limit}
-            ))
+        # Executar método no loop compartilhado do serviço TDLib
+        result = await tdlib_service.execute(
+            'searchContacts',
+            {'query': query, 'limit': limit}
+        )
+        
+        users = result.get('user_ids', [])
+        if request.args.get('expand') == 'users':
+            users = await tdlib_service.get_users(users)
             
-            return jsonify({
-                'status': 'success',
-                'users': result.get('user_ids', [])
-            })
-        finally:
-            loop.close()
+        return jsonify({
+            'status': 'success',
+            'users': users
+        })
             
     except Exception as e:
         return jsonify({
@@ -155,12 +145,18 @@ def search_users():
 
 @users_bp.route('/contacts', methods=['GET'])
 @api_key_required
-def get_contacts():
+async def get_contacts():
     """
     Obtém a lista de contatos salvos
     ---
     tags:
       - Usuários
+    parameters:
+      - name: expand
+        in: query
+        type: string
+        required: false
+        description: Use 'users' para retornar os objetos completos dos contatos em vez dos IDs
     responses:
       200:
         description: Lista de contatos
@@ -168,18 +164,17 @@ def get_contacts():
         description: Erro interno
     """
     try:
-        # Executar método de forma assíncrona
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            result = loop.run_until_complete(tdlib_service.execute('getContacts'))
+        # Executar método no loop compartilhado do serviço TDLib
+        result = await tdlib_service.execute('getContacts')
+        
+        contacts = result.get('user_ids', [])
+        if request.args.get('expand') == 'users':
+            contacts = await tdlib_service.get_users(contacts)
             
-            return jsonify({
-                'status': 'success',
-                'contacts': result.get('user_ids', [])
-            })
-        finally:
-            loop.close()
+        return jsonify({
+            'status': 'success',
+            'contacts': contacts
+        })
             
     except Exception as e:
         return jsonify({
@@ -189,7 +184,7 @@ def get_contacts():
 
 @users_bp.route('/contacts', methods=['POST'])
 @api_key_required
-def add_contact():
+async def add_contact():
     """
     Adiciona um contato
     ---
@@ -232,30 +227,25 @@ def add_contact():
         first_name = data['first_name']
         last_name = data.get('last_name', '')
         
-        # Executar método de forma assíncrona
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            result = loop.run_until_complete(tdlib_service.execute(
-                'importContacts',
-                {
-                    'contacts': [
-                        {
-                            'phone_number': phone_number,
-                            'first_name': first_name,
-                            'last_name': last_name
-                        }
-                    ]
-                }
-            ))
+        # Executar método no loop compartilhado do serviço TDLib
+        result = await tdlib_service.execute(
+            'importContacts',
+            {
+                'contacts': [
+                    {
+                        'phone_number': phone_number,
+                        'first_name': first_name,
+                        'last_name': last_name
+                    }
+                ]
+            }
+        )
             
-            return jsonify({
-                'status': 'success',
-                'message': 'Contato adicionado com sucesso',
-                'user_ids': result.get('user_ids', [])
-            })
-        finally:
-            loop.close()
+        return jsonify({
+            'status': 'success',
+            'message': 'Contato adicionado com sucesso',
+            'user_ids': result.get('user_ids', [])
+        })
             
     except Exception as e:
         return jsonify({
@@ -265,7 +255,7 @@ def add_contact():
 
 @users_bp.route('/contacts/<string:phone_number>', methods=['DELETE'])
 @api_key_required
-def remove_contact(phone_number):
+async def remove_contact(phone_number):
     """
     Remove um contato pelo número de telefone
     ---
@@ -292,37 +282,32 @@ def remove_contact(phone_number):
                 'message': 'Número de telefone é obrigatório'
             }), 400
             
-        # Executar método de forma assíncrona
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            # Primeiro, precisamos encontrar o usuário pelo número de telefone
-            search_result = loop.run_until_complete(tdlib_service.execute(
-                'searchContacts',
-                {'query': phone_number, 'limit': 1}
-            ))
+        # Executar método no loop compartilhado do serviço TDLib
+        # Primeiro, precisamos encontrar o usuário pelo número de telefone
+        search_result = await tdlib_service.execute(
+            'searchContacts',
+            {'query': phone_number, 'limit': 1}
+        )
             
-            user_ids = search_result.get('user_ids', [])
-            if not user_ids:
-                return jsonify({
-                    'status': 'error',
-                    'message': 'Contato não encontrado'
-                }), 404
+        user_ids = search_result.get('user_ids', [])
+        if not user_ids:
+            return jsonify({
+                'status': 'error',
+                'message': 'Contato não encontrado'
+            }), 404
                 
-            user_id = user_ids[0]
+        user_id = user_ids[0]
             
-            # Agora podemos remover o contato
-            result = loop.run_until_complete(tdlib_service.execute(
-                'removeContacts',
-                {'user_ids': [user_id]}
-            ))
+        # Agora podemos remover o contato
+        result = await tdlib_service.execute(
+            'removeContacts',
+            {'user_ids': [user_id]}
+        )
             
-            return jsonify({
-                'status': 'success',
-                'message': 'Contato removido com sucesso'
-            })
-        finally:
-            loop.close()
+        return jsonify({
+            'status': 'success',
+            'message': 'Contato removido com sucesso'
+        })
             
     except Exception as e:
         return jsonify({
@@ -332,7 +317,7 @@ def remove_contact(phone_number):
 
 @users_bp.route('/block/<int:user_id>', methods=['POST'])
 @api_key_required
-def block_user(user_id):
+async def block_user(user_id):
     """
     Bloqueia um usuário
     ---
@@ -359,21 +344,16 @@ def block_user(user_id):
                 'message': 'ID do usuário é obrigatório'
             }), 400
             
-        # Executar método de forma assíncrona
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            result = loop.run_until_complete(tdlib_service.execute(
-                'blockUser',
-                {'user_id': user_id}
-            ))
+        # Executar método no loop compartilhado do serviço TDLib
+        result = await tdlib_service.execute(
+            'blockUser',
+            {'user_id': user_id}
+        )
             
-            return jsonify({
-                'status': 'success',
-                'message': 'Usuário bloqueado com sucesso'
-            })
-        finally:
-            loop.close()
+        return jsonify({
+            'status': 'success',
+            'message': 'Usuário bloqueado com sucesso'
+        })
             
     except Exception as e:
         return jsonify({
@@ -383,7 +363,7 @@ def block_user(user_id):
 
 @users_bp.route('/unblock/<int:user_id>', methods=['POST'])
 @api_key_required
-def unblock_user(user_id):
+async def unblock_user(user_id):
     """
     Desbloqueia um usuário
     ---
@@ -410,21 +390,16 @@ def unblock_user(user_id):
                 'message': 'ID do usuário é obrigatório'
             }), 400
             
-        # Executar método de forma assíncrona
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            result = loop.run_until_complete(tdlib_service.execute(
-                'unblockUser',
-                {'user_id': user_id}
-            ))
+        # Executar método no loop compartilhado do serviço TDLib
+        result = await tdlib_service.execute(
+            'unblockUser',
+            {'user_id': user_id}
+        )
             
-            return jsonify({
-                'status': 'success',
-                'message': 'Usuário desbloqueado com sucesso'
-            })
-        finally:
-            loop.close()
+        return jsonify({
+            'status': 'success',
+            'message': 'Usuário desbloqueado com sucesso'
+        })
             
     except Exception as e:
         return jsonify({
@@ -434,7 +409,7 @@ def unblock_user(user_id):
 
 @users_bp.route('/profile_photos/<int:user_id>', methods=['GET'])
 @api_key_required
-def get_user_profile_photos(user_id):
+async def get_user_profile_photos(user_id):
     """
     Obtém as fotos de perfil de um usuário
     ---
@@ -474,22 +449,17 @@ def get_user_profile_photos(user_id):
         offset = int(request.args.get('offset', 0))
         limit = min(int(request.args.get('limit', 100)), 100)
         
-        # Executar método de forma assíncrona
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            result = loop.run_until_complete(tdlib_service.execute(
-                'getUserProfilePhotos',
-                {'user_id': user_id, 'offset': offset, 'limit': limit}
-            ))
+        # Executar método no loop compartilhado do serviço TDLib
+        result = await tdlib_service.execute(
+            'getUserProfilePhotos',
+            {'user_id': user_id, 'offset': offset, 'limit': limit}
+        )
             
-            return jsonify({
-                'status': 'success',
-                'photos': result.get('photos', []),
-                'total_count': result.get('total_count', 0)
-            })
-        finally:
-            loop.close()
+        return jsonify({
+            'status': 'success',
+            'photos': result.get('photos', []),
+            'total_count': result.get('total_count', 0)
+        })
             
     except Exception as e:
         return jsonify({
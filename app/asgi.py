@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Modo ASGI para a API Flask (/api/v1/*)
+
+As views assíncronas dos blueprints são executadas como corrotinas diretamente
+no loop de eventos do servidor ASGI, que também passa a ser o loop compartilhado
+do serviço TDLib. Assim, milhares de chamadas à TDLib podem ficar pendentes ao
+mesmo tempo sem ocupar uma thread por requisição. Views síncronas continuam
+funcionando e são executadas no executor padrão do loop.
+"""
+
+import asyncio
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import sys
+import tempfile
+
+from flask import request_started
+from flask.globals import request_ctx
+from werkzeug.exceptions import RequestEntityTooLarge
+
+from app import app as flask_app
+from app.services.tdlib_service import tdlib_service
+
+logger = logging.getLogger(__name__)
+
+# Tamanho máximo do corpo da requisição mantido em memória antes de ir para o disco
+MAX_IN_MEMORY_BODY = 1024 * 1024
+
+# Tamanho dos blocos lidos ao enviar arquivos (send_file) sem suporte a zero-copy
+FILE_BLOCK_SIZE = 256 * 1024
+
+class FileWrapper:
+    """
+    wsgi.file_wrapper do adaptador ASGI
+
+    Permite que _send_body reconheça respostas de arquivo e as envie com a
+    extensão http.response.zerocopysend (sendfile) quando o servidor a oferece,
+    ou em blocos grandes lidos fora do loop caso contrário.
+    """
+
+    def __init__(self, file, block_size=FILE_BLOCK_SIZE):
+        self.file = file
+        self.block_size = max(block_size, FILE_BLOCK_SIZE)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        data = self.file.read(self.block_size)
+        if data:
+            return data
+        raise StopIteration()
+
+    def seekable(self):
+        return hasattr(self.file, 'seek') and (not hasattr(self.file, 'seekable') or self.file.seekable())
+
+    def seek(self, *args):
+        return self.file.seek(*args)
+
+    def tell(self):
+        return self.file.tell()
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        if hasattr(self.file, 'close'):
+            self.file.close()
+
+class FlaskASGI:
+    """
+    Adaptador ASGI que despacha as rotas da aplicação Flask no loop de eventos
+    """
+
+    def __init__(self, flask_app):
+        """
+        Inicializa o adaptador
+
+        Args:
+            flask_app (Flask): Aplicação Flask a ser servida
+        """
+        self.flask_app = flask_app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            tdlib_service.attach_loop()
+            await self._handle_http(scope, receive, send)
+        else:
+            raise RuntimeError(f"Tipo de conexão ASGI não suportado: {scope['type']}")
+
+    async def _lifespan(self, receive, send):
+        """Processa os eventos de inicialização e encerramento do servidor."""
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                tdlib_service.attach_loop()
+                asyncio.get_running_loop().create_task(self._initialize_tdlib())
+                # A inicialização feita pelas funções before_first_request (startup_event)
+                # já acontece aqui; executá-las de novo iniciaria um segundo cliente TDLib
+                self.flask_app._got_first_request = True
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                tdlib_service.stop_loop()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _initialize_tdlib(self):
+        """Inicializa o cliente TDLib sem bloquear o início do servidor."""
+        try:
+            await tdlib_service.initialize()
+            logger.info("Cliente TDLib inicializado com sucesso!")
+        except Exception as e:
+            logger.error(f"Erro ao inicializar o cliente TDLib: {e}")
+            logger.warning("A aplicação continuará funcionando, mas as funcionalidades do Telegram não estarão disponíveis.")
+
+    async def _read_body(self, scope, receive):
+        """
+        Lê o corpo da requisição para um arquivo temporário em memória ou disco
+
+        O limite MAX_CONTENT_LENGTH da aplicação é verificado pelo cabeçalho
+        Content-Length antes da leitura e a cada bloco recebido, de modo que
+        um corpo grande demais é recusado sem ser gravado por completo.
+
+        Raises:
+            RequestEntityTooLarge: Se o corpo exceder o limite
+        """
+        max_size = self.flask_app.config.get('MAX_CONTENT_LENGTH')
+        if max_size:
+            for name, value in scope.get('headers', []):
+                if name.lower() == b'content-length' and value.isdigit() and int(value) > max_size:
+                    raise RequestEntityTooLarge()
+
+        body = tempfile.SpooledTemporaryFile(max_size=MAX_IN_MEMORY_BODY)
+        size = 0
+        more_body = True
+        try:
+            while more_body:
+                message = await receive()
+                if message['type'] == 'http.disconnect':
+                    body.close()
+                    return None, 0
+                chunk = message.get('body', b'')
+                if chunk:
+                    size += len(chunk)
+                    if max_size and size > max_size:
+                        raise RequestEntityTooLarge()
+                    body.write(chunk)
+                more_body = message.get('more_body', False)
+        except BaseException:
+            body.close()
+            raise
+        body.seek(0)
+        return body, size
+
+    def _build_environ(self, scope, body, content_length):
+        """Monta o environ WSGI equivalente ao escopo ASGI."""
+        server = scope.get('server') or ('localhost', 80)
+        client = scope.get('client') or ('', 0)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+            'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+            'SERVER_NAME': str(server[0]),
+            'SERVER_PORT': str(server[1]),
+            'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+            'REMOTE_ADDR': client[0],
+            'CONTENT_LENGTH': str(content_length),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': body,
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+            'wsgi.file_wrapper': FileWrapper,
+            'asgi.scope': scope,
+        }
+
+        for raw_name, raw_value in scope.get('headers', []):
+            name = raw_name.decode('latin-1').upper().replace('-', '_')
+            value = raw_value.decode('latin-1')
+            if name == 'CONTENT_LENGTH':
+                continue
+            if name == 'CONTENT_TYPE':
+                environ['CONTENT_TYPE'] = value
+                continue
+            key = f'HTTP_{name}'
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+
+        return environ
+
+    async def _dispatch_request(self):
+        """Equivalente assíncrono de Flask.dispatch_request."""
+        app = self.flask_app
+        req = request_ctx.request
+        if req.routing_exception is not None:
+            app.raise_routing_exception(req)
+
+        rule = req.url_rule
+        if getattr(rule, 'provide_automatic_options', False) and req.method == 'OPTIONS':
+            return app.make_default_options_response()
+
+        view = app.view_functions[rule.endpoint]
+        if inspect.iscoroutinefunction(view):
+            return await view(**req.view_args)
+
+        # Views síncronas rodam no executor para não bloquear o loop
+        ctx = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(
+            None, functools.partial(ctx.run, view, **req.view_args)
+        )
+
+    async def _full_dispatch_request(self):
+        """Equivalente assíncrono de Flask.full_dispatch_request."""
+        app = self.flask_app
+        if not app._got_first_request:
+            # Executado apenas no loop de eventos, por isso dispensa o lock do Flask
+            for func in app.before_first_request_funcs:
+                app.ensure_sync(func)()
+            app._got_first_request = True
+
+        try:
+            request_started.send(app)
+            rv = app.preprocess_request()
+            if rv is None:
+                rv = await self._dispatch_request()
+        except Exception as e:
+            rv = app.handle_user_exception(e)
+        return app.finalize_request(rv)
+
+    async def _handle_http(self, scope, receive, send):
+        """Processa uma requisição HTTP completa (equivalente assíncrono de Flask.wsgi_app)."""
+        app = self.flask_app
+        try:
+            body, content_length = await self._read_body(scope, receive)
+        except RequestEntityTooLarge as e:
+            await self._send_error(send, e.code, 'O corpo da requisição excede o tamanho máximo permitido')
+            return
+        if body is None:
+            return
+
+        environ = self._build_environ(scope, body, content_length)
+        ctx = app.request_context(environ)
+        error = None
+        response_started = False
+        try:
+            try:
+                ctx.push()
+                response = await self._full_dispatch_request()
+            except Exception as e:
+                error = e
+                # Envia got_request_exception e pode relançar a exceção (PROPAGATE_EXCEPTIONS)
+                response = app.handle_exception(e)
+
+            app_iter, status, headers = response.get_wsgi_response(environ)
+            response_started = True
+            await send({
+                'type': 'http.response.start',
+                'status': int(status.split(' ', 1)[0]),
+                'headers': [
+                    (name.lower().encode('latin-1'), value.encode('latin-1'))
+                    for name, value in headers
+                ],
+            })
+            await self._send_body(scope, app_iter, send, receive)
+        except Exception as e:
+            if response_started:
+                raise
+            # Nenhuma resposta foi iniciada: o cliente sempre recebe um 500
+            logger.exception(f"Erro ao processar {scope['method']} {scope['path']}")
+            error = error or e
+            await self._send_error(send, 500, 'Erro interno do servidor')
+        finally:
+            if error is not None and app.should_ignore_error(error):
+                error = None
+            ctx.pop(error)
+            body.close()
+
+    @staticmethod
+    async def _send_error(send, status, message):
+        """Envia uma resposta de erro JSON sem passar pela aplicação Flask."""
+        payload = json.dumps({'status': 'error', 'message': message}).encode('utf-8')
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [
+                (b'content-type', b'application/json'),
+                (b'content-length', str(len(payload)).encode('latin-1')),
+            ],
+        })
+        await send({'type': 'http.response.body', 'body': payload, 'more_body': False})
+
+    async def _send_body(self, scope, app_iter, send, receive):
+        """Envia o corpo da resposta, lendo iteradores de arquivo fora do loop."""
+        loop = asyncio.get_running_loop()
+        disconnected = None
+        try:
+            if isinstance(app_iter, FileWrapper) and self._supports_zerocopy(scope, app_iter):
+                # O servidor envia o arquivo diretamente (sendfile), sem passar pelo Python
+                await send({
+                    'type': 'http.response.zerocopysend',
+                    'file': app_iter.file,
+                    'offset': app_iter.tell(),
+                    'more_body': False
+                })
+                return
+            if isinstance(app_iter, (list, tuple)):
+                for chunk in app_iter:
+                    if chunk:
+                        await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            else:
+                iterator = iter(app_iter)
+                sentinel = object()
+                # Com o corpo da requisição já lido, receive() só retorna quando o cliente
+                # desconecta: a partir daí nenhum bloco é pedido ao iterador (ex.: streaming
+                # de um download em andamento, que é cancelado ao ser fechado)
+                disconnected = asyncio.ensure_future(receive())
+                while True:
+                    next_chunk = loop.run_in_executor(None, next, iterator, sentinel)
+                    await asyncio.wait((next_chunk, disconnected), return_when=asyncio.FIRST_COMPLETED)
+                    # O bloco em andamento é aguardado antes de fechar o iterador
+                    chunk = await next_chunk
+                    if chunk is sentinel or disconnected.done():
+                        break
+                    if chunk:
+                        await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                if disconnected.done():
+                    return
+            await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+        finally:
+            if disconnected is not None:
+                disconnected.cancel()
+            if hasattr(app_iter, 'close'):
+                # Fora do loop: o fechamento pode aguardar o loop (ex.: TDLibService.iterate)
+                await loop.run_in_executor(None, app_iter.close)
+
+    @staticmethod
+    def _supports_zerocopy(scope, file_wrapper):
+        """Verifica se o servidor oferece zerocopysend e se o arquivo possui um descritor."""
+        if 'http.response.zerocopysend' not in (scope.get('extensions') or {}):
+            return False
+        try:
+            file_wrapper.fileno()
+        except (AttributeError, OSError, ValueError):
+            return False
+        return True
+
+# Aplicação ASGI pronta para ser servida (ex.: uvicorn app.asgi:asgi_app)
+asgi_app = FlaskASGI(flask_app)
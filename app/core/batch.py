@@ -0,0 +1,49 @@
+import asyncio
+import os
+from typing import Any, Awaitable, Callable, Dict, List
+
+from app.core.cache import IDEMPOTENT_METHODS
+
+BATCH_MAX_SIZE = int(os.environ.get("BATCH_MAX_SIZE", "200"))
+BATCH_MAX_CONCURRENCY = int(os.environ.get("BATCH_MAX_CONCURRENCY", "20"))
+
+# Métodos aceitos no endpoint de lote: apenas consultas somente leitura
+BATCH_ALLOWED_METHODS = IDEMPOTENT_METHODS
+
+class BatchError(Exception):
+    """Erro de validação de um item do lote."""
+
+async def run_batch(
+    calls: List[Dict[str, Any]],
+    execute: Callable[[str, Dict[str, Any]], Awaitable[Any]],
+    concurrency: int = BATCH_MAX_CONCURRENCY
+) -> List[Any]:
+    """
+    Executa as chamadas do lote em paralelo, com no máximo `concurrency`
+    chamadas simultâneas à TDLib.
+
+    Args:
+        calls: Lista de itens {"method": str, "params": dict}
+        execute: Corrotina que executa um método da TDLib
+        concurrency: Número máximo de chamadas simultâneas
+
+    Returns:
+        Lista na mesma ordem dos itens, contendo o resultado de cada chamada
+        ou a exceção que ela gerou
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run_call(call: Dict[str, Any]):
+        method = call.get("method")
+        params = call.get("params") or {}
+        if not isinstance(method, str) or not method:
+            raise BatchError("O campo 'method' é obrigatório")
+        if not isinstance(params, dict):
+            raise BatchError("O campo 'params' deve ser um objeto")
+        if method not in BATCH_ALLOWED_METHODS:
+            raise BatchError(f"Método não permitido em lote: {method}")
+
+        async with semaphore:
+            return await execute(method, params)
+
+    return await asyncio.gather(*[run_call(call) for call in calls], return_exceptions=True)
@@ -0,0 +1,354 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from app.core.ratelimit import FloodControl, TokenBucket, retry_after
+
+logger = logging.getLogger("tdlib")
+
+BULK_MAX_ITEMS = int(os.environ.get("BULK_MAX_ITEMS", "1000"))
+# Limites de envio: mensagens por segundo (e rajada) no total e em cada chat
+BULK_GLOBAL_RATE = float(os.environ.get("BULK_GLOBAL_RATE", "25"))
+BULK_GLOBAL_BURST = int(os.environ.get("BULK_GLOBAL_BURST", "25"))
+BULK_CHAT_RATE = float(os.environ.get("BULK_CHAT_RATE", "1"))
+BULK_CHAT_BURST = int(os.environ.get("BULK_CHAT_BURST", "3"))
+# Envios simultâneos (em chats diferentes)
+BULK_MAX_CONCURRENCY = int(os.environ.get("BULK_MAX_CONCURRENCY", "20"))
+# Novas tentativas de uma mensagem após FLOOD_WAIT, e espera máxima aceita por tentativa
+BULK_FLOOD_RETRIES = int(os.environ.get("BULK_FLOOD_RETRIES", "5"))
+BULK_MAX_FLOOD_WAIT = int(os.environ.get("BULK_MAX_FLOOD_WAIT", "300"))
+# Segundos em que os resultados de um envio concluído ficam disponíveis
+BULK_JOB_TTL = int(os.environ.get("BULK_JOB_TTL", "3600"))
+# Espera máxima pela confirmação do servidor; depois dela a mensagem fica como "sent" (aceita pela TDLib)
+BULK_DELIVERY_TIMEOUT = float(os.environ.get("BULK_DELIVERY_TIMEOUT", "60"))
+
+class BulkError(Exception):
+    """O pedido de envio em massa é inválido."""
+
+def bulk_message_params(item: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Monta os parâmetros de sendMessage de um item do envio em massa: texto
+    simples (text) ou conteúdo completo da TDLib (input_message_content).
+
+    Raises:
+        BulkError: Se o item não tiver chat_id ou conteúdo
+    """
+    if not isinstance(item, dict) or not isinstance(item.get("chat_id"), int):
+        raise BulkError("Cada mensagem precisa de um chat_id inteiro")
+
+    content = item.get("input_message_content")
+    if content is None:
+        if not item.get("text"):
+            raise BulkError("Cada mensagem precisa de text ou input_message_content")
+        content = {
+            "@type": "inputMessageText",
+            "text": {"@type": "formattedText", "text": item["text"]}
+        }
+    return {
+        "chat_id": item["chat_id"],
+        "reply_to_message_id": item.get("reply_to_message_id", 0),
+        "disable_notification": item.get("disable_notification", False),
+        "input_message_content": content
+    }
+
+def send_error(source: Dict[str, Any]) -> str:
+    """
+    Texto do erro de envio de uma atualização updateMessageSendFailed (ou de um
+    messageSendingStateFailed), no formato "código: mensagem" dos erros da TDLib.
+    """
+    error = source.get("error") or {}
+    code = error.get("code", source.get("error_code"))
+    message = error.get("message", source.get("error_message")) or "Falha no envio"
+    return f"{code}: {message}" if code else message
+
+def is_pending(message: Optional[Dict[str, Any]]) -> bool:
+    """Indica se a mensagem retornada por sendMessage ainda aguarda a confirmação do servidor."""
+    state = (message or {}).get("sending_state") or {}
+    return state.get("@type") == "messageSendingStatePending"
+
+class BulkJob:
+    """Um pedido de envio em massa e o resultado de cada mensagem."""
+
+    def __init__(self, params: List[Dict[str, Any]]):
+        self.id = uuid.uuid4().hex
+        self.params = params
+        self.results = [
+            {"index": index, "chat_id": item["chat_id"], "status": "pending", "message_id": None, "error": None, "attempts": 0}
+            for index, item in enumerate(params)
+        ]
+        self.pending = len(params)
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+
+    def finish_item(
+        self,
+        index: int,
+        message: Optional[Dict[str, Any]] = None,
+        error: Optional[str] = None,
+        status: str = "delivered"
+    ):
+        """
+        Conclui um item: delivered (confirmado pelo servidor, com o message_id
+        definitivo), sent (aceito pela TDLib sem confirmação dentro do prazo,
+        com o id temporário) ou failed.
+        """
+        result = self.results[index]
+        if error is None:
+            result["status"] = status
+            result["message_id"] = (message or {}).get("id")
+        else:
+            result["status"] = "failed"
+            result["error"] = error
+        self.pending -= 1
+        if self.pending == 0:
+            self.finished_at = time.time()
+
+    def to_dict(self, include_items: bool = True) -> Dict[str, Any]:
+        delivered = sum(1 for result in self.results if result["status"] == "delivered")
+        sent = sum(1 for result in self.results if result["status"] == "sent")
+        failed = sum(1 for result in self.results if result["status"] == "failed")
+        job = {
+            "job_id": self.id,
+            "state": "completed" if self.pending == 0 else "running",
+            "total": len(self.results),
+            "delivered": delivered,
+            "sent": sent,
+            "failed": failed,
+            "pending": self.pending,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at
+        }
+        if include_items:
+            job["items"] = self.results
+        return job
+
+class BulkSender:
+    """
+    Fila de envio em massa de mensagens.
+
+    As mensagens de um mesmo chat são enviadas uma de cada vez, na ordem em que
+    foram recebidas (inclusive entre pedidos diferentes); chats diferentes são
+    atendidos em paralelo, até max_concurrency envios simultâneos. Cada envio
+    consome uma ficha do balde do chat e uma do balde global. Um FLOOD_WAIT
+    pausa apenas o chat afetado, e a mesma mensagem é reenviada após a espera,
+    preservando a ordem.
+
+    `send` não deve repetir a chamada por conta própria. Com flood_control, as
+    esperas de FLOOD_WAIT são compartilhadas com as demais requisições e
+    aguardadas antes de ocupar uma vaga de envio.
+
+    sendMessage apenas enfileira a mensagem na TDLib, com um id temporário; o
+    resultado vem depois, em updateMessageSendSucceeded ou
+    updateMessageSendFailed (inclusive FLOOD_WAIT). Cada item aguarda essa
+    confirmação (até delivery_timeout) antes da mensagem seguinte do chat, e
+    uma falha por FLOOD_WAIT é reenviada após a espera, como um erro imediato.
+    """
+
+    UPDATE_TYPES = (
+        'updateMessageSendSucceeded',
+        'updateMessageSendFailed'
+    )
+
+    def __init__(
+        self,
+        send: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]],
+        global_rate: float = BULK_GLOBAL_RATE,
+        global_burst: int = BULK_GLOBAL_BURST,
+        chat_rate: float = BULK_CHAT_RATE,
+        chat_burst: int = BULK_CHAT_BURST,
+        max_concurrency: int = BULK_MAX_CONCURRENCY,
+        flood_retries: int = BULK_FLOOD_RETRIES,
+        job_ttl: int = BULK_JOB_TTL,
+        flood_control: Optional[FloodControl] = None,
+        delivery_timeout: float = BULK_DELIVERY_TIMEOUT
+    ):
+        self._send = send
+        self._flood_control = flood_control
+        self.delivery_timeout = delivery_timeout
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_concurrency = max_concurrency
+        self.flood_retries = flood_retries
+        self.job_ttl = job_ttl
+        self.flood_waits = 0
+        self._global_bucket = TokenBucket(global_rate, global_burst)
+        self._chat_buckets: Dict[int, TokenBucket] = {}
+        self._chat_queues: Dict[int, Deque[Tuple[BulkJob, int]]] = {}
+        self._chat_workers: Dict[int, asyncio.Task] = {}
+        self._semaphore = None
+        self._jobs: Dict[str, BulkJob] = {}
+        self._loop = None
+        # Confirmações aguardadas e recebidas antes da resposta de sendMessage, por (chat_id, id temporário)
+        self._in_flight: Dict[Tuple[int, int], asyncio.Future] = {}
+        self._early_updates: "OrderedDict[Tuple[int, int], Dict[str, Any]]" = OrderedDict()
+        self._updates_lock = threading.Lock()
+
+    def submit(self, items: List[Dict[str, Any]]) -> BulkJob:
+        """
+        Enfileira as mensagens e retorna imediatamente o pedido, cujo andamento
+        é consultado com get(). Deve ser chamado no loop de eventos do envio.
+
+        Raises:
+            BulkError: Se o pedido estiver vazio, for grande demais ou tiver itens inválidos
+        """
+        if not items:
+            raise BulkError("Nenhuma mensagem informada")
+        if len(items) > BULK_MAX_ITEMS:
+            raise BulkError(f"Máximo de {BULK_MAX_ITEMS} mensagens por pedido")
+        params = []
+        for index, item in enumerate(items):
+            try:
+                params.append(bulk_message_params(item))
+            except BulkError as e:
+                raise BulkError(f"Mensagem {index}: {e}")
+
+        self._expire_jobs()
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = asyncio.get_running_loop()
+
+        job = BulkJob(params)
+        self._jobs[job.id] = job
+        for index, item in enumerate(params):
+            chat_id = item["chat_id"]
+            self._chat_queues.setdefault(chat_id, deque()).append((job, index))
+            if chat_id not in self._chat_workers:
+                self._chat_workers[chat_id] = asyncio.ensure_future(self._run_chat(chat_id))
+        return job
+
+    def get(self, job_id: str) -> Optional[BulkJob]:
+        return self._jobs.get(job_id)
+
+    def stats(self) -> Dict[str, Any]:
+        """Retorna os contadores da fila de envio."""
+        return {
+            "jobs": len(self._jobs),
+            "active_chats": len(self._chat_workers),
+            "queued": sum(len(chat_queue) for chat_queue in self._chat_queues.values()),
+            "awaiting_delivery": len(self._in_flight),
+            "flood_waits": self.flood_waits
+        }
+
+    def handle_update(self, update: Dict[str, Any]):
+        """Entrega a confirmação (ou a falha) do servidor ao item que aguarda a mensagem. Pode ser chamado de qualquer thread."""
+        message = update.get("message") or {}
+        old_message_id = update.get("old_message_id")
+        if not message or not old_message_id:
+            return
+        key = (message.get("chat_id"), old_message_id)
+        with self._updates_lock:
+            future = self._in_flight.pop(key, None)
+            if future is None:
+                # A atualização pode chegar antes da resposta de sendMessage; só importa se houver envios em massa
+                if self._chat_workers:
+                    self._early_updates[key] = update
+                    while len(self._early_updates) > 1000:
+                        self._early_updates.popitem(last=False)
+                return
+        self._loop.call_soon_threadsafe(_resolve, future, update)
+
+    async def _confirmation(self, message: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Aguarda a atualização de envio da mensagem; None se ela não chegar dentro de delivery_timeout."""
+        key = (message.get("chat_id"), message.get("id"))
+        with self._updates_lock:
+            update = self._early_updates.pop(key, None)
+            if update is not None:
+                return update
+            future = self._in_flight[key] = self._loop.create_future()
+        try:
+            return await asyncio.wait_for(future, self.delivery_timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            with self._updates_lock:
+                self._in_flight.pop(key, None)
+
+    async def _run_chat(self, chat_id: int):
+        chat_queue = self._chat_queues[chat_id]
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        try:
+            while chat_queue:
+                job, index = chat_queue[0]
+                await self._send_item(bucket, job, index)
+                chat_queue.popleft()
+        finally:
+            del self._chat_workers[chat_id]
+            if not chat_queue:
+                del self._chat_queues[chat_id]
+            self._prune_buckets()
+
+    async def _send_item(self, bucket: TokenBucket, job: BulkJob, index: int):
+        params = job.params[index]
+        result = job.results[index]
+        while True:
+            if self._flood_control is not None:
+                # Aguarda fora do semáforo, sem ocupar a vaga de outros chats
+                delay = self._flood_control.remaining('sendMessage', params)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            await bucket.acquire()
+            async with self._semaphore:
+                await self._global_bucket.acquire()
+                result["attempts"] += 1
+                try:
+                    message = await self._send(params)
+                    error = None
+                except Exception as e:
+                    error = e
+
+            if error is None:
+                if not is_pending(message):
+                    state = (message or {}).get("sending_state") or {}
+                    if state.get("@type") == "messageSendingStateFailed":
+                        error = send_error(state)
+                    else:
+                        job.finish_item(index, message)
+                        return
+                else:
+                    # Aguarda fora do semáforo; a próxima mensagem do chat espera por esta
+                    update = await self._confirmation(message)
+                    if update is None:
+                        job.finish_item(index, message, status="sent")
+                        return
+                    if update.get("@type") == "updateMessageSendSucceeded":
+                        job.finish_item(index, update.get("message"))
+                        return
+                    error = send_error(update)
+
+            wait = retry_after(error)
+            if wait is None or result["attempts"] > self.flood_retries or wait > BULK_MAX_FLOOD_WAIT:
+                job.finish_item(index, error=str(error))
+                return
+
+            # FLOOD_WAIT: pausa apenas este chat e reenvia a mesma mensagem, mantendo a ordem
+            self.flood_waits += 1
+            logger.warning(f"FLOOD_WAIT de {wait}s no envio em massa para o chat {params['chat_id']}")
+            if self._flood_control is not None:
+                self._flood_control.penalize('sendMessage', params, wait)
+            else:
+                await asyncio.sleep(wait)
+
+    def _prune_buckets(self):
+        # Confirmações antecipadas só interessam enquanto houver envios em andamento
+        if not self._chat_workers:
+            with self._updates_lock:
+                self._early_updates.clear()
+        for chat_id in [chat_id for chat_id, bucket in self._chat_buckets.items() if bucket.idle]:
+            if chat_id not in self._chat_workers:
+                del self._chat_buckets[chat_id]
+
+    def _expire_jobs(self):
+        deadline = time.time() - self.job_ttl
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.finished_at and job.finished_at < deadline]:
+            del self._jobs[job_id]
+
+def _resolve(future: asyncio.Future, update: Dict[str, Any]):
+    if not future.done():
+        future.set_result(update)
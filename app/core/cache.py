@@ -0,0 +1,288 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+CHAT_CACHE_SIZE = int(os.environ.get("CHAT_CACHE_SIZE", "10000"))
+CHAT_CACHE_TTL = float(os.environ.get("CHAT_CACHE_TTL", "300"))
+USER_CACHE_SIZE = int(os.environ.get("USER_CACHE_SIZE", "50000"))
+USER_CACHE_TTL = float(os.environ.get("USER_CACHE_TTL", "300"))
+
+# Métodos somente leitura da TDLib cujas chamadas idênticas simultâneas podem
+# compartilhar uma única requisição
+IDEMPOTENT_METHODS = frozenset({
+    "getAuthorizationState",
+    "getMe",
+    "getUser",
+    "getUserFullInfo",
+    "getUserProfilePhotos",
+    "getChat",
+    "getChats",
+    "getChatHistory",
+    "getChatMember",
+    "getChatAdministrators",
+    "getBasicGroup",
+    "getBasicGroupFullInfo",
+    "getSupergroup",
+    "getSupergroupFullInfo",
+    "getSupergroupMembers",
+    "getMessage",
+    "getMessages",
+    "getMessageLink",
+    "getContacts",
+    "searchContacts",
+    "searchPublicChat",
+    "searchPublicChats",
+    "searchChatMessages",
+    "getFile",
+    "getRemoteFile",
+    "getOption",
+})
+
+class LRUCache:
+    """
+    Cache LRU limitado e thread-safe.
+
+    Cada entrada guarda o instante da última atualização, permitindo que as
+    leituras exijam uma idade máxima (max_age) para o valor retornado.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable):
+        return key in self._entries
+
+    def get(self, key: Hashable, max_age: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        Obtém uma cópia do valor se ele tiver sido atualizado há no máximo max_age segundos
+        (por padrão, o TTL do cache). Com max_age=0 o cache é ignorado.
+        """
+        max_age = self.ttl if max_age is None else max_age
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or max_age <= 0 or time.monotonic() - entry[1] > max_age:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(entry[0])
+
+    def put(self, key: Hashable, value: Dict[str, Any]):
+        """Armazena um valor, removendo o menos usado recentemente se o limite for excedido."""
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def update_fields(self, key: Hashable, **fields) -> bool:
+        """Atualiza campos de um valor já em cache, renovando sua validade."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False
+            value = dict(entry[0])
+            value.update(fields)
+            self._entries[key] = (value, time.monotonic())
+            return True
+
+    def invalidate(self, key: Hashable):
+        """Remove um valor do cache."""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """Remove todos os valores do cache."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Retorna os contadores do cache."""
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
+
+class ChatCache(LRUCache):
+    """Cache de objetos chat mantido atualizado pelas atualizações da TDLib."""
+
+    # Atualizações que alteram campos simples do chat e o nome do campo correspondente
+    FIELD_UPDATES = {
+        "updateChatTitle": ("title",),
+        "updateChatPhoto": ("photo",),
+        "updateChatPermissions": ("permissions",),
+        "updateChatReadInbox": ("last_read_inbox_message_id", "unread_count"),
+        "updateChatReadOutbox": ("last_read_outbox_message_id",),
+        "updateChatUnreadMentionCount": ("unread_mention_count",),
+        "updateChatIsMarkedAsUnread": ("is_marked_as_unread",),
+        "updateChatNotificationSettings": ("notification_settings",),
+        "updateChatActionBar": ("action_bar",),
+        "updateChatReplyMarkup": ("reply_markup_message_id",),
+        "updateChatMessageTtl": ("message_ttl",),
+        "updateChatHasScheduledMessages": ("has_scheduled_messages",),
+        "updateChatDefaultDisableNotification": ("default_disable_notification",),
+    }
+
+    UPDATE_TYPES = (
+        "updateNewChat",
+        "updateChatLastMessage",
+        "updateChatPosition",
+        "updateChatDraftMessage",
+    ) + tuple(FIELD_UPDATES)
+
+    def __init__(self, max_size: int = CHAT_CACHE_SIZE, ttl: float = CHAT_CACHE_TTL):
+        super().__init__(max_size, ttl)
+
+    def handle_update(self, update: Dict[str, Any]):
+        """Aplica uma atualização da TDLib ao chat correspondente."""
+        update_type = update.get("@type")
+
+        if update_type == "updateNewChat":
+            chat = update.get("chat", {})
+            if chat.get("id") is not None:
+                self.put(chat["id"], chat)
+            return
+
+        chat_id = update.get("chat_id")
+        if chat_id is None:
+            return
+
+        if update_type in self.FIELD_UPDATES:
+            fields = {name: update.get(name) for name in self.FIELD_UPDATES[update_type] if name in update}
+            self.update_fields(chat_id, **fields)
+        elif update_type == "updateChatLastMessage":
+            self._update_positions(chat_id, update.get("positions", []), last_message=update.get("last_message"))
+        elif update_type == "updateChatDraftMessage":
+            self._update_positions(chat_id, update.get("positions", []), draft_message=update.get("draft_message"))
+        elif update_type == "updateChatPosition":
+            self._update_positions(chat_id, [update.get("position", {})])
+
+    def _update_positions(self, chat_id: int, positions, **fields):
+        """Substitui as posições do chat nas listas informadas e atualiza os demais campos."""
+        with self._lock:
+            entry = self._entries.get(chat_id)
+            if entry is None:
+                return
+            chat = dict(entry[0])
+            chat.update(fields)
+
+            current = {
+                self._list_key(position): position
+                for position in chat.get("positions", [])
+            }
+            for position in positions:
+                key = self._list_key(position)
+                # Posição com order 0 indica que o chat saiu da lista
+                if int(position.get("order", 0) or 0) == 0:
+                    current.pop(key, None)
+                else:
+                    current[key] = position
+            chat["positions"] = list(current.values())
+
+            self._entries[chat_id] = (chat, time.monotonic())
+
+    @staticmethod
+    def _list_key(position: Dict[str, Any]):
+        chat_list = position.get("list", {})
+        return (chat_list.get("@type"), chat_list.get("chat_folder_id", chat_list.get("chat_filter_id")))
+
+class UserCache(LRUCache):
+    """Cache de objetos user mantido atualizado pelas atualizações da TDLib."""
+
+    UPDATE_TYPES = ("updateUser", "updateUserStatus")
+
+    def __init__(self, max_size: int = USER_CACHE_SIZE, ttl: float = USER_CACHE_TTL):
+        super().__init__(max_size, ttl)
+
+    def handle_update(self, update: Dict[str, Any]):
+        """Aplica uma atualização da TDLib ao usuário correspondente."""
+        update_type = update.get("@type")
+
+        if update_type == "updateUser":
+            user = update.get("user", {})
+            if user.get("id") is not None:
+                self.put(user["id"], user)
+        elif update_type == "updateUserStatus":
+            user_id = update.get("user_id")
+            if user_id is not None:
+                self.update_fields(user_id, status=update.get("status"))
+
+class SingleFlight:
+    """
+    Agrupa chamadas idênticas simultâneas em uma única execução.
+
+    Enquanto uma chamada para uma chave está em andamento, as demais chamadas
+    com a mesma chave aguardam o mesmo resultado em vez de repetir a requisição.
+    Deve ser usado sempre a partir do mesmo loop de eventos.
+    """
+
+    def __init__(self, methods=IDEMPOTENT_METHODS):
+        self.methods = frozenset(methods)
+        self.executed = 0
+        self.shared = 0
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+
+    def __len__(self):
+        return len(self._calls)
+
+    @staticmethod
+    def make_key(method: str, params: Optional[Dict[str, Any]]) -> Hashable:
+        """Gera a chave da chamada a partir do método e dos parâmetros canonicalizados."""
+        return method, json.dumps(params or {}, sort_keys=True, separators=(",", ":"), default=str)
+
+    async def call(self, method: str, params: Optional[Dict[str, Any]], func: Callable[[], Awaitable[Any]]):
+        """
+        Executa func, compartilhando o resultado com chamadas idênticas em andamento.
+        Métodos fora da lista de idempotentes são sempre executados diretamente.
+        """
+        if method not in self.methods:
+            return await func()
+
+        key = self.make_key(method, params)
+        future = self._calls.get(key)
+        if future is None:
+            future = asyncio.ensure_future(func())
+            self._calls[key] = future
+            self.executed += 1
+
+            def on_done(done):
+                if self._calls.get(key) is done:
+                    del self._calls[key]
+                # Marca a exceção como lida caso todos os chamadores tenham sido cancelados
+                if not done.cancelled():
+                    done.exception()
+
+            future.add_done_callback(on_done)
+        else:
+            self.shared += 1
+
+        # shield: o cancelamento de um chamador não cancela a requisição compartilhada
+        result = await asyncio.shield(future)
+        # Cada chamador recebe sua própria cópia do objeto de resposta
+        return dict(result) if isinstance(result, dict) else result
+
+    def stats(self) -> Dict[str, Any]:
+        """Retorna quantas chamadas foram executadas e quantas foram compartilhadas."""
+        return {
+            "in_flight": len(self._calls),
+            "executed": self.executed,
+            "shared": self.shared
+        }
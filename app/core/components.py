@@ -0,0 +1,347 @@
+import asyncio
+import logging
+import threading
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.core.bulk import BulkSender
+from app.core.cache import ChatCache, SingleFlight, UserCache
+from app.core.downloads import DownloadManager, FileWatchers, stream_downloading_file
+from app.core.file_cache import FileCache
+from app.core.message_store import MESSAGE_STORE_ENABLED, MessageStore
+from app.core.outbox import OUTBOX_ENABLED, Outbox
+from app.core.ratelimit import ERROR_FLOOD, FloodControl, backoff_delay, classify_error, retry_after
+from app.core.upload_sessions import UploadSessionStore
+from app.core.uploads import CANCEL_UPLOAD_METHOD, PRELIMINARY_UPLOAD_METHOD, UploadStore
+
+logger = logging.getLogger("tdlib")
+
+Call = Callable[[str, Dict[str, Any]], Awaitable[Any]]
+
+# Atributos criados por _build_components no primeiro acesso
+COMPONENTS = (
+    "chat_cache", "user_cache", "single_flight", "upload_store", "file_watchers", "download_manager",
+    "file_cache", "upload_sessions", "message_store", "flood_control", "bulk_sender", "outbox"
+)
+
+class ClientComponents:
+    """
+    Componentes compartilhados pelos dois clientes da TDLib (TDLibWrapper, da
+    API FastAPI, e TDLibService, do servidor Flask), como os caches e as filas
+    alimentados pelas atualizações do cliente.
+
+    O cliente chama _init_components com as funções call(method, params), que
+    faz uma requisição à TDLib (com as novas tentativas do cliente, se houver),
+    e call_once(method, params), que faz uma única tentativa e é usada pelas
+    filas de envio, que têm as próprias novas tentativas.
+
+    Os componentes só são criados no primeiro acesso a um deles: o processo
+    importa os dois clientes, mas apenas o que é usado abre os índices em
+    disco e os bancos SQLite.
+    """
+
+    def _init_components(
+        self,
+        call: Call,
+        call_once: Call,
+        submit: Callable[[Awaitable], Any],
+        download_call: Optional[Call] = None
+    ):
+        self._call = call
+        self._call_once = call_once
+        self._download_call = download_call or call
+        self._submit_component = submit
+        self._components_lock = threading.Lock()
+        self._components_built = False
+
+    def __getattr__(self, name: str):
+        # Chamado apenas para atributos inexistentes, ou seja, antes de os componentes serem criados
+        if name in COMPONENTS and "_components_lock" in self.__dict__:
+            self._build_components()
+            if name in self.__dict__:
+                return self.__dict__[name]
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+
+    def _build_components(self):
+        with self._components_lock:
+            if self._components_built:
+                return
+            self._create_components(self._submit_component)
+            self._components_built = True
+
+    def _create_components(self, submit: Callable[[Awaitable], Any]):
+        # Cache de chats alimentado pelas atualizações
+        self.chat_cache = ChatCache()
+
+        # Cache de usuários alimentado pelas atualizações
+        self.user_cache = UserCache()
+
+        # Chamadas idênticas simultâneas a métodos somente leitura compartilham a mesma requisição
+        self.single_flight = SingleFlight()
+
+        # Índice de uploads por conteúdo, completado pelas atualizações updateFile
+        self.upload_store = UploadStore()
+
+        # Downloads em andamento acompanhados pelas atualizações updateFile
+        self.file_watchers = FileWatchers()
+
+        # Downloads completos: um por file_id, em fila de prioridade e com limites de concorrência
+        self.download_manager = DownloadManager(self._download_file)
+
+        # Orçamento de disco dos arquivos baixados, com remoção por LRU
+        self.file_cache = FileCache(self._delete_cached_file, submit)
+
+        # Uploads em partes com retomada; o progresso do envio vem das atualizações updateFile
+        self.upload_sessions = UploadSessionStore()
+
+        # Mensagens armazenadas localmente com índice de texto completo, para buscas sem chamar a TDLib
+        self.message_store = MessageStore() if MESSAGE_STORE_ENABLED else None
+
+        # Esperas de FLOOD_WAIT compartilhadas por chat e por método entre todas as requisições
+        self.flood_control = FloodControl()
+
+        # Envio em massa com ordem por chat e limites de taxa por chat e global
+        self.bulk_sender = BulkSender(self._send_message, flood_control=self.flood_control)
+
+        # Fila persistente de envios, que sobrevive a reinícios do processo
+        self.outbox = Outbox(self._send_message, flood_control=self.flood_control) if OUTBOX_ENABLED else None
+
+    def _component_update_handlers(self) -> List[Tuple[str, Callable[[Dict[str, Any]], Any], bool]]:
+        """
+        Handlers de atualização dos componentes, como (tipo, handler, inline);
+        inline indica um handler rápido, que pode ser chamado durante o despacho.
+        """
+        handlers = [(update_type, self.chat_cache.handle_update, True) for update_type in ChatCache.UPDATE_TYPES]
+        handlers += [(update_type, self.user_cache.handle_update, True) for update_type in UserCache.UPDATE_TYPES]
+        handlers += [
+            ('updateFile', self.upload_store.handle_update, True),
+            ('updateFile', self.file_watchers.handle_update, True),
+            ('updateFile', self.file_cache.handle_update, True),
+            ('updateFile', self.upload_sessions.handle_update, True)
+        ]
+        if self.message_store is not None:
+            handlers += [(update_type, self.message_store.handle_update, True) for update_type in MessageStore.UPDATE_TYPES]
+        handlers += [(update_type, self.bulk_sender.handle_update, True) for update_type in BulkSender.UPDATE_TYPES]
+        if self.outbox is not None:
+            handlers += [(update_type, self.outbox.handle_update, False) for update_type in Outbox.UPDATE_TYPES]
+        return handlers
+
+    async def _start_components(self):
+        """Prepara os componentes que dependem do cliente já inicializado."""
+        # Inclui no controle de espaço os arquivos já baixados antes deste processo
+        await asyncio.get_running_loop().run_in_executor(None, self.file_cache.scan)
+
+        # Retoma os envios pendentes da fila persistente
+        if self.outbox is not None:
+            self.outbox.start()
+
+    def _stop_components(self):
+        """Grava os índices com alterações pendentes (chamado ao encerrar o cliente)."""
+        if self._components_built:
+            self.file_cache.flush()
+            self.upload_store.flush()
+
+    async def _send_message(self, params: Dict[str, Any]):
+        """
+        Chama sendMessage uma única vez (usado pelo envio em massa e pela fila
+        persistente). Um FLOOD_WAIT recebido é registrado no controle
+        compartilhado e repassado a quem chamou.
+        """
+        try:
+            return await self._call_once('sendMessage', params)
+        except Exception as e:
+            if classify_error(e) == ERROR_FLOOD:
+                wait = retry_after(e)
+                self.flood_control.penalize('sendMessage', params, wait if wait is not None else backoff_delay(1))
+            raise
+
+    # Caches
+
+    async def get_chat(self, chat_id: int, max_age: Optional[float] = None):
+        """
+        Obtém um chat, servindo do cache quando ele foi atualizado há no máximo
+        max_age segundos (padrão CHAT_CACHE_TTL; 0 força a consulta à TDLib).
+        """
+        chat = self.chat_cache.get(chat_id, max_age)
+        if chat is not None:
+            return chat
+
+        chat = await self._call('getChat', {'chat_id': chat_id})
+        if not chat:
+            return chat
+        self.chat_cache.put(chat_id, chat)
+        return dict(chat)
+
+    async def get_user(self, user_id: int, max_age: Optional[float] = None):
+        """
+        Obtém um usuário, servindo do cache quando possível. Chamadas simultâneas
+        para o mesmo usuário compartilham uma única requisição getUser.
+        """
+        user = self.user_cache.get(user_id, max_age)
+        if user is not None:
+            return user
+
+        user = await self._call('getUser', {'user_id': user_id})
+        if not user:
+            return user
+        self.user_cache.put(user_id, user)
+        return dict(user)
+
+    async def get_users(self, user_ids: List[int], max_age: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Resolve vários usuários em paralelo, na ordem recebida. Usuários que não
+        puderem ser obtidos são representados por um objeto de erro.
+        """
+        unique_ids = list(dict.fromkeys(user_ids))
+        results = await asyncio.gather(
+            *[self.get_user(user_id, max_age) for user_id in unique_ids],
+            return_exceptions=True
+        )
+
+        users = {}
+        for user_id, result in zip(unique_ids, results):
+            if isinstance(result, Exception):
+                users[user_id] = {"@type": "error", "user_id": user_id, "message": str(result)}
+            else:
+                users[user_id] = result
+        return [users[user_id] for user_id in user_ids]
+
+    # Downloads
+
+    async def _download_file(self, file_id: int, priority: int):
+        """Baixa um arquivo por completo (usado pelo DownloadManager)."""
+        return await self._download_call('downloadFile', {
+            'file_id': file_id,
+            'priority': priority,
+            'offset': 0,
+            'limit': 0,
+            'synchronous': True
+        })
+
+    async def download_file(self, file_id: int, priority: int = 1, chat_id: Optional[int] = None):
+        """
+        Baixa um arquivo por completo pelo agendador de downloads. Pedidos
+        simultâneos para o mesmo arquivo compartilham o mesmo download.
+        """
+        file = await self.download_manager.download(file_id, priority, chat_id)
+        if file:
+            self.file_cache.record_access(file)
+        return file
+
+    async def _delete_cached_file(self, file_id: int):
+        """Remove um arquivo baixado do disco (usado pelo FileCache)."""
+        return await self._call('deleteFile', {'file_id': file_id})
+
+    async def stream_file(self, file_id: int, priority: int = 1):
+        """
+        Inicia o download de um arquivo e gera seus bytes à medida que a TDLib
+        os baixa, sem aguardar o fim do download.
+        """
+        watch = self.file_watchers.watch(file_id)
+        completed = False
+        try:
+            file = await self._call('downloadFile', {
+                'file_id': file_id,
+                'priority': priority,
+                'offset': 0,
+                'limit': 0,
+                'synchronous': False
+            })
+            refresh = lambda: self._call('getFile', {'file_id': file_id})
+            async for chunk in stream_downloading_file(file, watch, refresh):
+                yield chunk
+            completed = True
+        finally:
+            self.file_watchers.unwatch(watch)
+            if not completed:
+                # Agendado em vez de aguardado: o gerador pode estar sendo cancelado
+                self._submit_component(self._cancel_abandoned_download(file_id))
+
+    async def _cancel_abandoned_download(self, file_id: int):
+        """
+        Cancela o download de um streaming interrompido (ex.: o cliente desconectou),
+        a menos que outro streaming ou o DownloadManager ainda dependa dele.
+        """
+        if self.file_watchers.watching(file_id) or self.download_manager.is_downloading(file_id):
+            return
+        try:
+            await self._call('cancelDownloadFile', {'file_id': file_id, 'only_if_pending': False})
+        except Exception as e:
+            logger.warning(f"Erro ao cancelar o download do arquivo {file_id}: {e}")
+
+    # Uploads
+
+    async def upload_file(
+        self,
+        path: str,
+        sha256: str,
+        size: int,
+        file_type: str = 'fileTypeDocument',
+        priority: int = 1,
+        cleanup_path: Optional[str] = None
+    ):
+        """
+        Envia um arquivo local, reutilizando o arquivo remoto se o mesmo conteúdo
+        (SHA-256) já tiver sido enviado antes. cleanup_path é removido quando o
+        upload terminar.
+
+        Returns:
+            Tupla (objeto file, deduplicated), em que deduplicated indica que o
+            upload foi evitado
+        """
+        entry = self.upload_store.lookup(sha256)
+        if entry is not None:
+            try:
+                file = await self._call('getRemoteFile', {
+                    'remote_file_id': entry['remote_id'],
+                    'file_type': {'@type': file_type}
+                })
+                if file and file.get('id'):
+                    return file, True
+            except Exception as e:
+                logger.warning(f"Arquivo remoto de {sha256} não está mais disponível: {e}")
+            self.upload_store.forget(sha256)
+
+        file = await self._call(PRELIMINARY_UPLOAD_METHOD, {
+            'file': {
+                '@type': 'inputFileLocal',
+                'path': path
+            },
+            'file_type': {
+                '@type': file_type
+            },
+            'priority': priority
+        })
+        if file and file.get('id'):
+            self.upload_store.track(file['id'], sha256, size, cleanup_path)
+            # O upload pode já estar concluído quando a resposta chega
+            self.upload_store.handle_update({'file': file})
+        return file, False
+
+    async def cancel_upload(self, file_id: int):
+        """Cancela o envio antecipado de um arquivo que não será mais usado."""
+        result = await self._call(CANCEL_UPLOAD_METHOD, {'file_id': file_id})
+        self.upload_store.untrack(file_id)
+        return result
+
+    async def commit_upload_session(self, session_id: str, priority: int = 1):
+        """
+        Conclui uma sessão de upload em partes, enviando o arquivo montado uma única vez.
+
+        Um segundo commit da mesma sessão apenas retorna o estado atual.
+
+        Returns:
+            Tupla (sessão, objeto file ou None se a sessão já havia sido enviada)
+        """
+        session = self.upload_sessions.get(session_id)
+        if not self.upload_sessions.begin_commit(session):
+            return session, None
+
+        try:
+            sha256 = await asyncio.get_running_loop().run_in_executor(None, session.compute_sha256)
+            file, deduplicated = await self.upload_file(session.path, sha256, session.size, session.file_type, priority)
+        except BaseException:
+            self.upload_sessions.abort_commit(session)
+            raise
+
+        self.upload_sessions.start_upload(session, file, deduplicated)
+        return session, file
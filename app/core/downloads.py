@@ -0,0 +1,347 @@
+import asyncio
+import heapq
+import itertools
+import os
+import threading
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+DOWNLOAD_CHUNK_SIZE = int(os.environ.get("DOWNLOAD_CHUNK_SIZE", str(256 * 1024)))
+# Tempo sem atualizações updateFile após o qual o estado do arquivo é consultado novamente
+DOWNLOAD_PROGRESS_TIMEOUT = float(os.environ.get("DOWNLOAD_PROGRESS_TIMEOUT", "5"))
+# Limites de downloads simultâneos (total e por chat) e tempo máximo de um download
+DOWNLOAD_MAX_CONCURRENT = int(os.environ.get("DOWNLOAD_MAX_CONCURRENT", "8"))
+DOWNLOAD_MAX_PER_CHAT = int(os.environ.get("DOWNLOAD_MAX_PER_CHAT", "2"))
+DOWNLOAD_TIMEOUT = float(os.environ.get("DOWNLOAD_TIMEOUT", "3600"))
+
+class DownloadFailed(Exception):
+    """A TDLib interrompeu o download do arquivo antes de concluí-lo."""
+
+class RangeNotSatisfiable(Exception):
+    """O intervalo de bytes solicitado não pode ser atendido."""
+
+    def __init__(self, size: int):
+        super().__init__(f"Intervalo de bytes inválido para arquivo de {size} bytes")
+        self.size = size
+
+def file_etag(file_info: Dict[str, Any]) -> Optional[str]:
+    """
+    Gera um ETag forte (sem aspas) para um objeto file da TDLib.
+
+    O valor é derivado do unique_id remoto e do tamanho, que identificam o
+    conteúdo independentemente do caminho local ou da sessão.
+    """
+    remote = file_info.get("remote", {})
+    unique_id = remote.get("unique_id")
+    size = file_info.get("size") or file_info.get("expected_size") or 0
+    if not unique_id:
+        return None
+    return f"{unique_id}-{size}"
+
+def etag_matches(header: Optional[str], etag: Optional[str]) -> bool:
+    """Verifica se um cabeçalho If-None-Match (ou If-Range) corresponde ao ETag."""
+    if not header or not etag:
+        return False
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate.strip('"') == etag:
+            return True
+    return False
+
+def not_modified_since(header: Optional[str], mtime: float) -> bool:
+    """Verifica se o arquivo não foi modificado desde a data de If-Modified-Since."""
+    if not header:
+        return False
+    try:
+        return int(mtime) <= parsedate_to_datetime(header).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+def http_date(timestamp: float) -> str:
+    """Formata um instante no formato de data HTTP."""
+    return formatdate(timestamp, usegmt=True)
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Interpreta um cabeçalho Range de um único intervalo de bytes.
+
+    Returns:
+        Tupla (início, fim) inclusiva, ou None se o cabeçalho estiver ausente,
+        for de outra unidade ou tiver vários intervalos (o arquivo inteiro é enviado)
+
+    Raises:
+        RangeNotSatisfiable: Se o intervalo estiver fora do arquivo
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+
+    start, _, end = header[len("bytes="):].strip().partition("-")
+    try:
+        if start == "":
+            # Sufixo: os últimos N bytes
+            length = int(end)
+            if length <= 0:
+                raise RangeNotSatisfiable(size)
+            return max(size - length, 0), size - 1
+        first = int(start)
+        last = int(end) if end else size - 1
+    except ValueError:
+        return None
+
+    if first >= size or last < first:
+        raise RangeNotSatisfiable(size)
+    return first, min(last, size - 1)
+
+def read_range(path: str, start: int, end: int, chunk_size: int = DOWNLOAD_CHUNK_SIZE):
+    """Lê o intervalo [start, end] de um arquivo em blocos."""
+    remaining = end - start + 1
+    with open(path, "rb") as file:
+        file.seek(start)
+        while remaining > 0:
+            chunk = file.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+class FileWatch:
+    """Acompanha o estado mais recente de um arquivo informado pelas atualizações updateFile."""
+
+    def __init__(self, file_id: int, loop: asyncio.AbstractEventLoop):
+        self.file_id = file_id
+        self.loop = loop
+        self.state: Optional[Dict[str, Any]] = None
+        self._changed = asyncio.Event()
+
+    def push(self, file: Dict[str, Any]):
+        """Registra um novo estado do arquivo (pode ser chamado de qualquer thread)."""
+        self.loop.call_soon_threadsafe(self._set_state, file)
+
+    def _set_state(self, file: Dict[str, Any]):
+        self.state = file
+        self._changed.set()
+
+    async def wait(self, timeout: float) -> Optional[Dict[str, Any]]:
+        """Aguarda o próximo estado do arquivo; retorna None se o tempo esgotar."""
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        self._changed.clear()
+        return self.state
+
+class FileWatchers:
+    """Registro thread-safe de FileWatch por file_id, alimentado por updateFile."""
+
+    def __init__(self):
+        self._watches: Dict[int, Set[FileWatch]] = {}
+        self._lock = threading.Lock()
+
+    def watch(self, file_id: int) -> FileWatch:
+        """Passa a acompanhar as atualizações de um arquivo no loop em execução."""
+        watch = FileWatch(file_id, asyncio.get_running_loop())
+        with self._lock:
+            self._watches.setdefault(file_id, set()).add(watch)
+        return watch
+
+    def unwatch(self, watch: FileWatch):
+        """Deixa de acompanhar as atualizações de um arquivo."""
+        with self._lock:
+            watches = self._watches.get(watch.file_id)
+            if watches is not None:
+                watches.discard(watch)
+                if not watches:
+                    del self._watches[watch.file_id]
+
+    def watching(self, file_id: int) -> bool:
+        """Indica se algum FileWatch ainda acompanha o arquivo."""
+        with self._lock:
+            return file_id in self._watches
+
+    def handle_update(self, update: Dict[str, Any]):
+        """Repassa uma atualização updateFile aos FileWatch do arquivo."""
+        file = update.get("file", {})
+        with self._lock:
+            watches = list(self._watches.get(file.get("id"), ()))
+        for watch in watches:
+            watch.push(file)
+
+async def stream_downloading_file(
+    file: Dict[str, Any],
+    watch: FileWatch,
+    refresh: Callable[[], Awaitable[Dict[str, Any]]],
+    chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+    timeout: float = DOWNLOAD_PROGRESS_TIMEOUT
+):
+    """
+    Gera os bytes de um arquivo enquanto a TDLib ainda o baixa.
+
+    O prefixo já baixado (downloaded_prefix_size) é enviado assim que fica
+    disponível; a cada updateFile o novo trecho é lido do disco. Se nenhuma
+    atualização chegar em `timeout` segundos, o estado é consultado com refresh().
+
+    Raises:
+        DownloadFailed: Se o download for interrompido antes de terminar
+    """
+    loop = asyncio.get_running_loop()
+    offset = 0
+    handle = None
+    try:
+        while True:
+            local = file.get("local", {})
+            path = local.get("path")
+            completed = local.get("is_downloading_completed", False)
+            available = local.get("downloaded_prefix_size", 0)
+
+            if path and (completed or available > offset):
+                if handle is None:
+                    handle = await loop.run_in_executor(None, open, path, "rb")
+                    handle.seek(offset)
+                # Após a conclusão lê até o fim do arquivo; antes, apenas o prefixo contíguo baixado
+                while completed or offset < available:
+                    size = chunk_size if completed else min(chunk_size, available - offset)
+                    chunk = await loop.run_in_executor(None, handle.read, size)
+                    if not chunk:
+                        break
+                    offset += len(chunk)
+                    yield chunk
+
+            if completed:
+                return
+            if not local.get("is_downloading_active", False):
+                raise DownloadFailed(f"O download do arquivo {file.get('id')} foi interrompido")
+
+            state = await watch.wait(timeout)
+            file = state if state is not None else await refresh()
+    finally:
+        if handle is not None:
+            handle.close()
+
+class DownloadManager:
+    """
+    Agendador de downloads da TDLib.
+
+    Pedidos simultâneos para o mesmo file_id compartilham um único download.
+    Os downloads aguardam em uma fila de prioridade (1-32, maior primeiro) e
+    são iniciados respeitando um limite global e um limite por chat de
+    downloads simultâneos. Deve ser usado sempre a partir do mesmo loop de eventos.
+    """
+
+    def __init__(
+        self,
+        download: Callable[[int, int], Awaitable[Dict[str, Any]]],
+        max_concurrent: int = DOWNLOAD_MAX_CONCURRENT,
+        max_per_chat: int = DOWNLOAD_MAX_PER_CHAT
+    ):
+        self._download = download
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_per_chat = max(1, max_per_chat)
+        self.started = 0
+        self.coalesced = 0
+        self._queue: List[list] = []
+        self._queued: Dict[int, list] = {}
+        self._futures: Dict[int, asyncio.Future] = {}
+        self._running = 0
+        self._running_per_chat: Dict[Any, int] = {}
+        self._sequence = itertools.count()
+
+    async def download(self, file_id: int, priority: int = 1, chat_id: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Agenda o download de um arquivo e aguarda sua conclusão.
+
+        Args:
+            file_id: ID do arquivo na TDLib
+            priority: Prioridade de 1 a 32 (maior é atendido primeiro)
+            chat_id: Chat de origem do arquivo, usado no limite por chat
+
+        Returns:
+            Objeto file da TDLib após o download
+        """
+        priority = min(max(int(priority), 1), 32)
+        future = self._futures.get(file_id)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self._futures[file_id] = future
+            self._enqueue(file_id, priority, chat_id)
+            self._start_next()
+        else:
+            self.coalesced += 1
+            entry = self._queued.get(file_id)
+            if entry is not None and priority > -entry[0]:
+                # Ainda na fila: reposiciona com a prioridade maior
+                entry[-1] = False
+                self._enqueue(file_id, priority, entry[3])
+
+        # shield: o cancelamento de um chamador não cancela o download compartilhado
+        result = await asyncio.shield(future)
+        return dict(result) if isinstance(result, dict) else result
+
+    def is_downloading(self, file_id: int) -> bool:
+        """Indica se o arquivo está na fila ou sendo baixado pelo agendador."""
+        return file_id in self._futures
+
+    def stats(self) -> Dict[str, Any]:
+        """Retorna os contadores do agendador."""
+        return {
+            "running": self._running,
+            "queued": len(self._queued),
+            "max_concurrent": self.max_concurrent,
+            "max_per_chat": self.max_per_chat,
+            "started": self.started,
+            "coalesced": self.coalesced
+        }
+
+    def _enqueue(self, file_id: int, priority: int, chat_id: Optional[int]):
+        # Entradas: [-prioridade, sequência, file_id, chat_id, válida]
+        entry = [-priority, next(self._sequence), file_id, chat_id, True]
+        self._queued[file_id] = entry
+        heapq.heappush(self._queue, entry)
+
+    def _start_next(self):
+        """Inicia os downloads de maior prioridade enquanto houver capacidade."""
+        deferred = []
+        while self._queue and self._running < self.max_concurrent:
+            entry = heapq.heappop(self._queue)
+            if not entry[-1]:
+                continue
+            chat_id = entry[3]
+            if chat_id is not None and self._running_per_chat.get(chat_id, 0) >= self.max_per_chat:
+                # O chat já atingiu o limite: mantém na fila e tenta o próximo
+                deferred.append(entry)
+                continue
+
+            del self._queued[entry[2]]
+            self._running += 1
+            if chat_id is not None:
+                self._running_per_chat[chat_id] = self._running_per_chat.get(chat_id, 0) + 1
+            self.started += 1
+            asyncio.get_running_loop().create_task(self._run(entry[2], -entry[0], chat_id))
+
+        for entry in deferred:
+            heapq.heappush(self._queue, entry)
+
+    async def _run(self, file_id: int, priority: int, chat_id: Optional[int]):
+        future = self._futures[file_id]
+        try:
+            result = await self._download(file_id, priority)
+            if not future.done():
+                future.set_result(result)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+                # Marca a exceção como lida caso todos os chamadores tenham sido cancelados
+                future.exception()
+        finally:
+            self._futures.pop(file_id, None)
+            self._running -= 1
+            if chat_id is not None:
+                remaining = self._running_per_chat.get(chat_id, 1) - 1
+                if remaining > 0:
+                    self._running_per_chat[chat_id] = remaining
+                else:
+                    self._running_per_chat.pop(chat_id, None)
+            self._start_next()
@@ -0,0 +1,312 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Union
+
+from app.core.upload_sessions import UPLOAD_SESSIONS_DIRECTORY
+from app.core.uploads import TD_DATABASE_DIRECTORY, TD_FILES_DIRECTORY
+
+logger = logging.getLogger("tdlib")
+
+# Orçamento em bytes dos arquivos baixados em TD_FILES_DIRECTORY (0 desativa a remoção)
+FILE_CACHE_MAX_BYTES = int(os.environ.get("FILE_CACHE_MAX_BYTES", str(10 * 1024 * 1024 * 1024)))
+# Arquivos acompanhados e arquivos fixados, preservados entre reinícios
+FILE_CACHE_INDEX_PATH = os.environ.get("FILE_CACHE_INDEX_PATH", os.path.join(TD_DATABASE_DIRECTORY, "file_cache.json"))
+# Segundos entre uma alteração no índice e sua gravação, agrupando as alterações próximas
+FILE_CACHE_SAVE_DELAY = float(os.environ.get("FILE_CACHE_SAVE_DELAY", "2"))
+
+class FileCache:
+    """
+    Controle do espaço em disco ocupado pelos arquivos baixados pela TDLib.
+
+    Cada arquivo baixado é registrado com seu tamanho e último acesso. Quando o
+    total excede max_bytes, os arquivos menos usados recentemente e não fixados
+    (pin) são removidos com deleteFile até o total voltar ao orçamento.
+
+    O índice e os arquivos fixados são gravados em index_path por uma thread de
+    fundo, save_delay segundos após a primeira alteração, de modo que registrar
+    um download não reescreve o índice inteiro. Na inicialização,
+    scan() percorre o diretório de arquivos: o que estiver em disco sem
+    registro no índice (ex.: baixado antes de um reinício) entra no orçamento
+    pelo caminho, com a data de modificação como último acesso, e é removido
+    diretamente do disco quando for escolhido para remoção.
+    """
+
+    def __init__(
+        self,
+        delete: Callable[[int], Awaitable[Any]],
+        submit: Callable[[Awaitable[Any]], Any],
+        max_bytes: int = FILE_CACHE_MAX_BYTES,
+        index_path: str = FILE_CACHE_INDEX_PATH,
+        directory: str = TD_FILES_DIRECTORY,
+        save_delay: float = FILE_CACHE_SAVE_DELAY
+    ):
+        self._delete = delete
+        self._submit = submit
+        self.max_bytes = max_bytes
+        self.index_path = index_path
+        self.directory = directory
+        self.save_delay = save_delay
+        # Diretórios de uploads em andamento, que não são arquivos baixados
+        self.excluded_directories = {
+            os.path.abspath(os.path.join(directory, "temp")),
+            os.path.abspath(UPLOAD_SESSIONS_DIRECTORY)
+        }
+        self.evictions = 0
+        self.evicted_bytes = 0
+        # file_id (ou caminho, para arquivos sem file_id conhecido) -> {"path", "size", "last_access"},
+        # do menos para o mais usado recentemente
+        self._files: "OrderedDict[Union[int, str], Dict[str, Any]]" = OrderedDict()
+        self._by_path: Dict[str, Union[int, str]] = {}
+        self._pinned = set()
+        self._evicting = set()
+        self._total = 0
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._save_timer: Optional[threading.Timer] = None
+        self._load()
+
+    def __len__(self):
+        return len(self._files)
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total
+
+    def record_access(self, file: Dict[str, Any]):
+        """Registra o acesso a um arquivo baixado, agendando remoções se o orçamento for excedido."""
+        local = file.get("local", {})
+        file_id = file.get("id")
+        if file_id is None or not local.get("is_downloading_completed") or not local.get("path"):
+            return
+
+        size = local.get("downloaded_size") or file.get("size") or 0
+        self._record(file_id, local["path"], size)
+
+    def record_path(self, path: str, size: Optional[int] = None):
+        """Registra o acesso a um arquivo sem file_id (ex.: gerado pela API), removido diretamente do disco."""
+        if size is None:
+            size = os.path.getsize(path)
+        self._record(path, path, size)
+
+    def _excluded(self, path: str) -> bool:
+        absolute = os.path.abspath(path)
+        return any(absolute == directory or absolute.startswith(directory + os.sep) for directory in self.excluded_directories)
+
+    def _record(self, key: Union[int, str], path: str, size: int):
+        # Arquivos locais sendo enviados também chegam como updateFile completos, mas não são downloads
+        if self._excluded(path):
+            return
+        with self._lock:
+            entry = self._files.pop(key, None)
+            if entry is not None:
+                self._total -= entry["size"]
+            # Um arquivo encontrado no disco passa a ser acompanhado pelo file_id
+            previous_key = self._by_path.get(path)
+            if previous_key is not None and previous_key != key:
+                previous = self._files.pop(previous_key, None)
+                if previous is not None:
+                    self._total -= previous["size"]
+            changed = entry is None or entry["size"] != size or entry["path"] != path
+            if entry is not None and entry["path"] != path:
+                self._by_path.pop(entry["path"], None)
+            self._files[key] = {"path": path, "size": size, "last_access": time.time()}
+            self._by_path[path] = key
+            self._total += size
+            over_budget = self.max_bytes > 0 and self._total > self.max_bytes
+            # Acessos a arquivos já registrados só mudam a ordem e são gravados na próxima alteração
+            if changed:
+                self._schedule_save()
+
+        if over_budget:
+            self._submit(self.evict())
+
+    def scan(self) -> Dict[str, int]:
+        """
+        Inclui no orçamento os arquivos em disco que não estão no índice e
+        descarta do índice os que não existem mais. Deve ser chamado na
+        inicialização, fora do loop de eventos (percorre todo o diretório).
+        """
+        found = {}
+        for root, directories, files in os.walk(self.directory):
+            directories[:] = [
+                name for name in directories
+                if os.path.abspath(os.path.join(root, name)) not in self.excluded_directories
+            ]
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat_result = os.stat(path)
+                except OSError:
+                    continue
+                found[os.path.abspath(path)] = (path, stat_result.st_size, stat_result.st_mtime)
+
+        with self._lock:
+            known = {os.path.abspath(path) for path in self._by_path}
+            missing = [key for key, entry in self._files.items() if os.path.abspath(entry["path"]) not in found]
+            for key in missing:
+                self._by_path.pop(self._files.pop(key)["path"], None)
+            added = 0
+            for absolute_path, (path, size, mtime) in found.items():
+                if absolute_path not in known:
+                    self._files[path] = {"path": path, "size": size, "last_access": mtime}
+                    self._by_path[path] = path
+                    added += 1
+            # Reordena do menos para o mais usado recentemente
+            self._files = OrderedDict(sorted(self._files.items(), key=lambda item: item[1]["last_access"]))
+            self._total = sum(entry["size"] for entry in self._files.values())
+            over_budget = self.max_bytes > 0 and self._total > self.max_bytes
+            self._schedule_save()
+
+        logger.info(f"Cache de arquivos: {len(self._files)} arquivos ({self._total} bytes), {added} encontrados no disco")
+        if over_budget:
+            self._submit(self.evict())
+        return {"added": added, "removed": len(missing)}
+
+    def handle_update(self, update: Dict[str, Any]):
+        """Acompanha as atualizações updateFile: registra downloads concluídos e arquivos removidos."""
+        file = update.get("file", {})
+        local = file.get("local", {})
+        if local.get("is_downloading_completed") and local.get("path"):
+            self.record_access(file)
+        elif not local.get("path"):
+            self.forget(file.get("id"))
+
+    def forget(self, file_id: Union[int, str]):
+        """Deixa de acompanhar um arquivo (ex.: removido com deleteFile)."""
+        with self._lock:
+            entry = self._files.pop(file_id, None)
+            if entry is not None:
+                self._total -= entry["size"]
+                self._by_path.pop(entry["path"], None)
+                self._schedule_save()
+
+    def pin(self, file_id: int):
+        """Fixa um arquivo, impedindo que ele seja removido pelo controle de espaço."""
+        with self._lock:
+            if file_id not in self._pinned:
+                self._pinned.add(file_id)
+                self._schedule_save()
+
+    def unpin(self, file_id: int):
+        """Libera um arquivo fixado para a remoção por LRU."""
+        with self._lock:
+            if file_id in self._pinned:
+                self._pinned.discard(file_id)
+                self._schedule_save()
+
+    def is_pinned(self, file_id: int) -> bool:
+        return file_id in self._pinned
+
+    async def evict(self) -> List[int]:
+        """Remove os arquivos menos usados recentemente até o total voltar ao orçamento."""
+        victims = self._select_victims()
+        removed = []
+        for file_id, size in victims:
+            try:
+                if isinstance(file_id, str):
+                    await asyncio.get_running_loop().run_in_executor(None, _remove_file, file_id)
+                else:
+                    await self._delete(file_id)
+                removed.append(file_id)
+                self.evictions += 1
+                self.evicted_bytes += size
+            except Exception as e:
+                logger.warning(f"Não foi possível remover o arquivo {file_id} do cache: {e}")
+            finally:
+                with self._lock:
+                    self._evicting.discard(file_id)
+                    if file_id in removed:
+                        entry = self._files.pop(file_id, None)
+                        if entry is not None:
+                            self._total -= entry["size"]
+                            self._by_path.pop(entry["path"], None)
+        if removed:
+            with self._lock:
+                self._schedule_save()
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        """Retorna a ocupação e os contadores do cache de arquivos."""
+        return {
+            "files": len(self._files),
+            "total_bytes": self._total,
+            "max_bytes": self.max_bytes,
+            "pinned": len(self._pinned),
+            "evictions": self.evictions,
+            "evicted_bytes": self.evicted_bytes
+        }
+
+    def _select_victims(self) -> List[tuple]:
+        with self._lock:
+            excess = self._total - self.max_bytes
+            # Descontar o que já está sendo removido por outra chamada a evict()
+            excess -= sum(self._files[file_id]["size"] for file_id in self._evicting if file_id in self._files)
+            victims = []
+            for file_id, entry in self._files.items():
+                if excess <= 0:
+                    break
+                if file_id in self._pinned or file_id in self._evicting:
+                    continue
+                victims.append((file_id, entry["size"]))
+                self._evicting.add(file_id)
+                excess -= entry["size"]
+            return victims
+
+    def _load(self):
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as index_file:
+                index = json.load(index_file)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f"Não foi possível ler o índice do cache de arquivos {self.index_path}: {e}")
+            return
+        for key, path, size, last_access in index.get("files", []):
+            self._files[key] = {"path": path, "size": size, "last_access": last_access}
+            self._by_path[path] = key
+            self._total += size
+        self._pinned = set(index.get("pinned", []))
+
+    def _schedule_save(self):
+        # Chamado com self._lock adquirido; a gravação fica para a thread do timer
+        if self._save_timer is None:
+            self._save_timer = threading.Timer(self.save_delay, self.flush)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def flush(self):
+        """Grava agora o índice, se houver alterações pendentes."""
+        # _save_lock mantém as gravações na ordem das cópias; a escrita fica fora do lock dos registros
+        with self._save_lock:
+            with self._lock:
+                if self._save_timer is None:
+                    return
+                self._save_timer.cancel()
+                self._save_timer = None
+                index = {
+                    "files": [[key, entry["path"], entry["size"], entry["last_access"]] for key, entry in self._files.items()],
+                    "pinned": sorted(self._pinned)
+                }
+            self._save(index)
+
+    def _save(self, index: Dict[str, Any]):
+        # Grava em um arquivo temporário e substitui o índice de forma atômica
+        try:
+            os.makedirs(os.path.dirname(self.index_path) or ".", exist_ok=True)
+            temp_path = f"{self.index_path}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as index_file:
+                json.dump(index, index_file)
+            os.replace(temp_path, self.index_path)
+        except OSError as e:
+            logger.warning(f"Não foi possível gravar o índice do cache de arquivos {self.index_path}: {e}")
+
+def _remove_file(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
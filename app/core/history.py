@@ -0,0 +1,115 @@
+import asyncio
+import json
+import logging
+import os
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List
+
+logger = logging.getLogger("tdlib")
+
+# Mensagens por chamada a getChatHistory (a TDLib retorna no máximo 100)
+HISTORY_PAGE_SIZE = int(os.environ.get("HISTORY_PAGE_SIZE", "100"))
+# Páginas buscadas à frente do cliente; limita a memória usada por exportação
+HISTORY_PREFETCH_PAGES = int(os.environ.get("HISTORY_PREFETCH_PAGES", "4"))
+# Novas tentativas após uma página vazia antes de considerar o início do chat alcançado
+HISTORY_EMPTY_PAGE_RETRIES = int(os.environ.get("HISTORY_EMPTY_PAGE_RETRIES", "2"))
+# Espera (segundos) antes de repetir uma página vazia; cresce a cada nova tentativa
+HISTORY_EMPTY_PAGE_DELAY = float(os.environ.get("HISTORY_EMPTY_PAGE_DELAY", "0.5"))
+
+async def iter_chat_history(
+    fetch: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]],
+    chat_id: int,
+    from_message_id: int = 0,
+    limit: int = 0,
+    page_size: int = HISTORY_PAGE_SIZE,
+    prefetch: int = HISTORY_PREFETCH_PAGES,
+    only_local: bool = False
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """
+    Percorre o histórico de um chat, do mais recente para o mais antigo, em páginas.
+
+    As páginas são buscadas com getChatHistory usando o id da última mensagem
+    recebida como cursor (from_message_id). Uma tarefa produtora mantém até
+    `prefetch` páginas à frente do consumidor: a próxima página já está sendo
+    buscada enquanto a atual é enviada, mas um cliente lento não faz a memória
+    crescer.
+
+    Args:
+        fetch: Função que executa getChatHistory com os parâmetros informados
+        chat_id: ID do chat
+        from_message_id: Mensagem a partir da qual começar (0 para a mais recente)
+        limit: Número máximo de mensagens (0 para todo o histórico)
+        page_size: Mensagens por chamada (1-100)
+        prefetch: Número máximo de páginas buscadas à frente do consumidor
+        only_local: Se True, usa apenas as mensagens já armazenadas localmente
+
+    Yields:
+        Listas de mensagens, na ordem do histórico
+    """
+    page_size = min(max(page_size, 1), 100)
+    pages: asyncio.Queue = asyncio.Queue(maxsize=max(prefetch, 1))
+    done = object()
+
+    async def produce():
+        cursor = from_message_id
+        remaining = limit
+        empty_pages = 0
+        try:
+            while not limit or remaining > 0:
+                result = await fetch({
+                    'chat_id': chat_id,
+                    'from_message_id': cursor,
+                    'offset': 0,
+                    'limit': min(page_size, remaining) if limit else page_size,
+                    'only_local': only_local
+                })
+                messages = (result or {}).get('messages') or []
+                if cursor != from_message_id:
+                    # A mensagem usada como cursor volta no início da página seguinte
+                    messages = [message for message in messages if message.get('id', 0) < cursor]
+                if not messages:
+                    # A TDLib pode retornar páginas vazias enquanto busca mensagens no servidor
+                    empty_pages += 1
+                    if empty_pages > HISTORY_EMPTY_PAGE_RETRIES:
+                        break
+                    # Dá tempo para a TDLib receber as mensagens em vez de repetir a chamada na hora
+                    await asyncio.sleep(HISTORY_EMPTY_PAGE_DELAY * empty_pages)
+                    continue
+                empty_pages = 0
+                if limit:
+                    messages = messages[:remaining]
+                    remaining -= len(messages)
+                cursor = messages[-1]['id']
+                await pages.put(messages)
+            await pages.put(done)
+        except Exception as e:
+            await pages.put(e)
+
+    producer = asyncio.ensure_future(produce())
+    try:
+        while True:
+            page = await pages.get()
+            if page is done:
+                return
+            if isinstance(page, Exception):
+                raise page
+            yield page
+    finally:
+        producer.cancel()
+
+async def ndjson_chat_history(
+    fetch: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]],
+    chat_id: int,
+    **kwargs
+) -> AsyncIterator[bytes]:
+    """
+    Exporta o histórico de um chat em NDJSON (uma mensagem JSON por linha), uma página por bloco.
+
+    Como a resposta já começou a ser enviada, um erro no meio da exportação é
+    informado em uma última linha {"@type": "error", "message": ...}.
+    """
+    try:
+        async for messages in iter_chat_history(fetch, chat_id, **kwargs):
+            yield "".join(json.dumps(message, ensure_ascii=False) + "\n" for message in messages).encode("utf-8")
+    except Exception as e:
+        logger.error(f"Erro ao exportar o histórico do chat {chat_id}: {e}")
+        yield (json.dumps({"@type": "error", "message": str(e)}, ensure_ascii=False) + "\n").encode("utf-8")
@@ -0,0 +1,359 @@
+import asyncio
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from app.core.history import iter_chat_history
+from app.core.uploads import TD_DATABASE_DIRECTORY
+
+logger = logging.getLogger("tdlib")
+
+MESSAGE_STORE_ENABLED = os.environ.get("MESSAGE_STORE_ENABLED", "true").lower() in ("1", "true", "yes")
+MESSAGE_STORE_PATH = os.environ.get("MESSAGE_STORE_PATH", os.path.join(TD_DATABASE_DIRECTORY, "messages.sqlite"))
+# Operações pendentes de gravação; atualizações que chegam com a fila cheia são descartadas
+MESSAGE_STORE_QUEUE_SIZE = int(os.environ.get("MESSAGE_STORE_QUEUE_SIZE", "10000"))
+# Operações gravadas por transação
+MESSAGE_STORE_BATCH_SIZE = int(os.environ.get("MESSAGE_STORE_BATCH_SIZE", "500"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    chat_id INTEGER NOT NULL,
+    message_id INTEGER NOT NULL,
+    sender_id INTEGER,
+    date INTEGER,
+    text TEXT NOT NULL DEFAULT '',
+    data TEXT,
+    PRIMARY KEY (chat_id, message_id)
+);
+CREATE INDEX IF NOT EXISTS messages_chat_date ON messages (chat_id, date);
+"""
+
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+    text, content='messages', content_rowid='rowid', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS messages_ai AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts (rowid, text) VALUES (new.rowid, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_ad AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, text) VALUES ('delete', old.rowid, old.text);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_au AFTER UPDATE OF text ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, text) VALUES ('delete', old.rowid, old.text);
+    INSERT INTO messages_fts (rowid, text) VALUES (new.rowid, new.text);
+END;
+"""
+
+UPSERT = """
+INSERT INTO messages (chat_id, message_id, sender_id, date, text, data) VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (chat_id, message_id) DO UPDATE SET
+    sender_id = excluded.sender_id, date = excluded.date, text = excluded.text, data = excluded.data
+"""
+
+def content_text(content: Optional[Dict[str, Any]]) -> str:
+    """Extrai o texto pesquisável do conteúdo de uma mensagem (texto, legenda, enquete ou nome de arquivo)."""
+    if not content:
+        return ""
+    parts = []
+    for key in ("text", "caption"):
+        value = content.get(key)
+        if isinstance(value, dict) and value.get("text"):
+            parts.append(value["text"])
+    question = (content.get("poll") or {}).get("question")
+    if isinstance(question, dict):
+        question = question.get("text")
+    if question:
+        parts.append(question)
+    file_name = (content.get("document") or content.get("audio") or {}).get("file_name")
+    if file_name:
+        parts.append(file_name)
+    return "\n".join(parts)
+
+def message_row(message: Dict[str, Any]) -> tuple:
+    sender = message.get("sender_id") or {}
+    sender_id = sender.get("user_id") or sender.get("chat_id")
+    return (
+        message.get("chat_id"),
+        message.get("id"),
+        sender_id,
+        message.get("date"),
+        content_text(message.get("content")),
+        json.dumps(message, ensure_ascii=False)
+    )
+
+def fts_query(text: str) -> str:
+    """
+    Converte o texto digitado em uma consulta FTS5 segura: cada termo vira uma
+    frase entre aspas (todas obrigatórias) e o último termo também casa prefixos.
+    """
+    terms = ['"' + term.replace('"', '""') + '"' for term in text.split()]
+    if terms:
+        terms[-1] += "*"
+    return " ".join(terms)
+
+class MessageStore:
+    """
+    Armazenamento local de mensagens em SQLite com índice de texto completo (FTS5).
+
+    É alimentado pelas atualizações de mensagens e pela importação do histórico
+    dos chats (backfill). As gravações são enfileiradas e feitas em lotes por
+    uma thread própria, sem bloquear quem recebe as atualizações. As buscas
+    rodam sobre o índice local, ordenadas por relevância (bm25), sem chamadas
+    à TDLib. Sem suporte a FTS5 no SQLite, a busca usa LIKE, sem ordenação
+    por relevância.
+    """
+
+    UPDATE_TYPES = (
+        'updateNewMessage',
+        'updateMessageContent',
+        'updateMessageSendSucceeded',
+        'updateDeleteMessages'
+    )
+
+    def __init__(
+        self,
+        path: str = MESSAGE_STORE_PATH,
+        queue_size: int = MESSAGE_STORE_QUEUE_SIZE,
+        batch_size: int = MESSAGE_STORE_BATCH_SIZE
+    ):
+        self.path = path
+        self.batch_size = batch_size
+        self.fts = None
+        self.written = 0
+        self.dropped = 0
+        self._queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self._local = threading.local()
+        self._writer = None
+        self._writer_lock = threading.Lock()
+        self._backfills: Dict[int, Dict[str, Any]] = {}
+
+    # Gravação
+
+    def handle_update(self, update: Dict[str, Any]):
+        """Enfileira a gravação correspondente a uma atualização de mensagem."""
+        update_type = update.get("@type")
+        if update_type == "updateNewMessage":
+            operation = ("upsert", [message_row(update.get("message", {}))])
+        elif update_type == "updateMessageContent":
+            operation = ("content", update.get("chat_id"), update.get("message_id"), update.get("new_content"))
+        elif update_type == "updateMessageSendSucceeded":
+            message = update.get("message", {})
+            operation = ("replace", message.get("chat_id"), update.get("old_message_id"), message_row(message))
+        elif update_type == "updateDeleteMessages":
+            if not update.get("is_permanent"):
+                return
+            operation = ("delete", update.get("chat_id"), update.get("message_ids") or [])
+        else:
+            return
+
+        try:
+            self._ensure_writer()
+            self._queue.put_nowait(operation)
+        except queue.Full:
+            self.dropped += 1
+
+    def add_messages(self, messages: List[Dict[str, Any]]):
+        """Enfileira mensagens obtidas da TDLib (ex.: histórico), aguardando espaço na fila."""
+        if messages:
+            self._ensure_writer()
+            self._queue.put(("upsert", [message_row(message) for message in messages]))
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Aguarda a gravação de todas as operações enfileiradas até o momento."""
+        self._ensure_writer()
+        event = threading.Event()
+        self._queue.put(("flush", event))
+        return event.wait(timeout)
+
+    def _ensure_writer(self):
+        if self._writer is not None:
+            return
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="message-store", daemon=True)
+                self._writer.start()
+
+    def _write_loop(self):
+        connection = self._connect()
+        while True:
+            operations = [self._queue.get()]
+            while len(operations) < self.batch_size:
+                try:
+                    operations.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            events = []
+            try:
+                with connection:
+                    for operation in operations:
+                        if operation[0] == "flush":
+                            events.append(operation[1])
+                        else:
+                            self._apply(connection, operation)
+                            self.written += 1
+            except sqlite3.Error as e:
+                logger.error(f"Erro ao gravar mensagens no armazenamento local: {e}")
+            for event in events:
+                event.set()
+
+    def _apply(self, connection: sqlite3.Connection, operation: tuple):
+        kind = operation[0]
+        if kind == "upsert":
+            connection.executemany(UPSERT, operation[1])
+        elif kind == "content":
+            _, chat_id, message_id, content = operation
+            row = connection.execute(
+                "SELECT data FROM messages WHERE chat_id = ? AND message_id = ?", (chat_id, message_id)
+            ).fetchone()
+            if row is None:
+                return
+            message = json.loads(row[0]) if row[0] else {}
+            message["content"] = content
+            connection.execute(
+                "UPDATE messages SET text = ?, data = ? WHERE chat_id = ? AND message_id = ?",
+                (content_text(content), json.dumps(message, ensure_ascii=False), chat_id, message_id)
+            )
+        elif kind == "replace":
+            _, chat_id, old_message_id, row = operation
+            connection.execute("DELETE FROM messages WHERE chat_id = ? AND message_id = ?", (chat_id, old_message_id))
+            connection.execute(UPSERT, row)
+        elif kind == "delete":
+            _, chat_id, message_ids = operation
+            connection.executemany(
+                "DELETE FROM messages WHERE chat_id = ? AND message_id = ?",
+                [(chat_id, message_id) for message_id in message_ids]
+            )
+
+    # Leitura
+
+    def search(self, text: str, chat_id: Optional[int] = None, limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
+        """
+        Busca mensagens pelo texto em todos os chats (ou em um chat), das mais
+        relevantes para as menos relevantes.
+        """
+        connection = self._reader()
+        filters = ""
+        parameters: List[Any] = []
+        if self.fts:
+            query = fts_query(text)
+            if not query:
+                return []
+            sql = (
+                "SELECT m.chat_id, m.message_id, m.sender_id, m.date, "
+                "snippet(messages_fts, 0, '[', ']', '…', 16), bm25(messages_fts), m.data "
+                "FROM messages_fts JOIN messages m ON m.rowid = messages_fts.rowid "
+                "WHERE messages_fts MATCH ?{filters} ORDER BY bm25(messages_fts) LIMIT ? OFFSET ?"
+            )
+            parameters.append(query)
+        else:
+            sql = (
+                "SELECT m.chat_id, m.message_id, m.sender_id, m.date, m.text, NULL, m.data "
+                "FROM messages m WHERE m.text LIKE ? ESCAPE '\\'{filters} ORDER BY m.date DESC LIMIT ? OFFSET ?"
+            )
+            escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            parameters.append(f"%{escaped}%")
+        if chat_id is not None:
+            filters = " AND m.chat_id = ?"
+            parameters.append(chat_id)
+        parameters.extend([limit, offset])
+
+        rows = connection.execute(sql.format(filters=filters), parameters).fetchall()
+        return [
+            {
+                "chat_id": row[0],
+                "message_id": row[1],
+                "sender_id": row[2],
+                "date": row[3],
+                "snippet": row[4],
+                "rank": row[5],
+                "message": json.loads(row[6]) if row[6] else None
+            }
+            for row in rows
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        """Retorna o tamanho do armazenamento e os contadores de gravação."""
+        count = self._reader().execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+        return {
+            "messages": count,
+            "fts": self.fts,
+            "pending": self._queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped
+        }
+
+    # Importação do histórico
+
+    def start_backfill(
+        self,
+        fetch: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]],
+        chat_id: int,
+        limit: int = 0
+    ) -> Dict[str, Any]:
+        """
+        Inicia, no loop em execução, a importação do histórico de um chat.
+        Uma importação já em andamento para o chat não é duplicada.
+        """
+        status = self._backfills.get(chat_id)
+        if status is not None and status["state"] == "running":
+            return dict(status)
+
+        status = {"chat_id": chat_id, "state": "running", "messages": 0, "started_at": time.time(), "error": None}
+        self._backfills[chat_id] = status
+        status["task"] = asyncio.ensure_future(self._backfill(fetch, chat_id, limit, status))
+        return self.backfill_status(chat_id)
+
+    def backfill_status(self, chat_id: int) -> Optional[Dict[str, Any]]:
+        """Estado da importação do histórico de um chat, ou None se nunca foi iniciada."""
+        status = self._backfills.get(chat_id)
+        if status is None:
+            return None
+        return {key: value for key, value in status.items() if key != "task"}
+
+    async def _backfill(self, fetch, chat_id: int, limit: int, status: Dict[str, Any]):
+        loop = asyncio.get_running_loop()
+        try:
+            async for messages in iter_chat_history(fetch, chat_id, limit=limit):
+                # put bloqueante fora do loop: a importação espera a gravação quando a fila está cheia
+                await loop.run_in_executor(None, self.add_messages, messages)
+                status["messages"] += len(messages)
+            status["state"] = "completed"
+        except Exception as e:
+            logger.error(f"Erro ao importar o histórico do chat {chat_id}: {e}")
+            status["state"] = "failed"
+            status["error"] = str(e)
+        finally:
+            status["finished_at"] = time.time()
+
+    # Conexões
+
+    def _connect(self) -> sqlite3.Connection:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.executescript(SCHEMA)
+        if self.fts is None:
+            try:
+                connection.executescript(FTS_SCHEMA)
+                self.fts = True
+            except sqlite3.OperationalError as e:
+                logger.warning(f"SQLite sem suporte a FTS5 ({e}); a busca de mensagens usará LIKE")
+                self.fts = False
+        return connection
+
+    def _reader(self) -> sqlite3.Connection:
+        # Uma conexão de leitura por thread; com WAL, as leituras não bloqueiam a gravação
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._connect()
+            self._local.connection = connection
+        return connection
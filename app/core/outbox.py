@@ -0,0 +1,363 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from app.core.ratelimit import ERROR_PERMANENT, FloodControl, backoff_delay, classify_error, retry_after
+from app.core.uploads import TD_DATABASE_DIRECTORY
+
+logger = logging.getLogger("tdlib")
+
+OUTBOX_ENABLED = os.environ.get("OUTBOX_ENABLED", "false").lower() in ("1", "true", "yes")
+OUTBOX_PATH = os.environ.get("OUTBOX_PATH", os.path.join(TD_DATABASE_DIRECTORY, "outbox.sqlite"))
+# Envios simultâneos (em chats diferentes)
+OUTBOX_WORKERS = int(os.environ.get("OUTBOX_WORKERS", "4"))
+# Tentativas por mensagem e atraso base (segundos) do backoff entre elas
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get("OUTBOX_MAX_ATTEMPTS", "5"))
+OUTBOX_RETRY_DELAY = float(os.environ.get("OUTBOX_RETRY_DELAY", "2"))
+OUTBOX_MAX_RETRY_DELAY = float(os.environ.get("OUTBOX_MAX_RETRY_DELAY", "300"))
+# Segundos em que os envios concluídos ou com falha ficam disponíveis para consulta
+OUTBOX_JOB_TTL = int(os.environ.get("OUTBOX_JOB_TTL", "86400"))
+OUTBOX_MAX_KEY_LENGTH = 255
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL UNIQUE,
+    idempotency_key TEXT UNIQUE,
+    chat_id INTEGER NOT NULL,
+    params TEXT NOT NULL,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    message_id INTEGER,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    next_attempt_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS outbox_pending ON outbox (state, chat_id, seq);
+CREATE INDEX IF NOT EXISTS outbox_message ON outbox (chat_id, message_id);
+"""
+
+# Próximo envio devido cujo chat não tem mensagem anterior pendente, preservando a ordem por chat
+CLAIM = """
+SELECT * FROM outbox AS job
+WHERE state = 'queued' AND next_attempt_at <= ?
+AND NOT EXISTS (
+    SELECT 1 FROM outbox AS previous
+    WHERE previous.chat_id = job.chat_id AND previous.state IN ('queued', 'sending') AND previous.seq < job.seq
+)
+ORDER BY seq LIMIT 1
+"""
+
+# Estados que não mudam mais
+FINAL_STATES = ("delivered", "failed")
+
+class OutboxError(Exception):
+    """O pedido de envio pela fila persistente é inválido."""
+
+class OutboxConflict(OutboxError):
+    """A chave de idempotência já foi usada por um envio com outros parâmetros."""
+
+class Outbox:
+    """
+    Fila persistente de mensagens a enviar, em SQLite.
+
+    O envio é gravado (com fsync) antes de a requisição ser respondida com o
+    id do envio; uma pool de workers entrega as mensagens com sendMessage,
+    então a latência da resposta HTTP não depende da do Telegram, e nada se
+    perde se o processo reiniciar. As mensagens de um mesmo chat saem na ordem
+    em que foram recebidas.
+
+    Estados de um envio:
+
+    - queued: aguardando envio (ou nova tentativa, após next_attempt_at)
+    - sending: entregue a sendMessage, aguardando a resposta
+    - sent: aceito pela TDLib, que guarda a mensagem no próprio banco e a envia mesmo após reinícios
+    - delivered: confirmado pelo servidor (updateMessageSendSucceeded), com o message_id definitivo
+    - failed: erro permanente, tentativas esgotadas ou envio recusado (updateMessageSendFailed)
+
+    Uma chave de idempotência repetida com os mesmos parâmetros retorna o envio
+    já existente em vez de criar outro; com parâmetros diferentes, é recusada. Um envio em sending quando o processo parou volta para queued
+    ao reiniciar; nesse caso, se a TDLib já o tinha aceitado, a mensagem pode
+    ser enviada duas vezes (entrega pelo menos uma vez).
+    """
+
+    UPDATE_TYPES = (
+        'updateMessageSendSucceeded',
+        'updateMessageSendFailed'
+    )
+
+    def __init__(
+        self,
+        send: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]],
+        path: str = OUTBOX_PATH,
+        workers: int = OUTBOX_WORKERS,
+        max_attempts: int = OUTBOX_MAX_ATTEMPTS,
+        retry_delay: float = OUTBOX_RETRY_DELAY,
+        job_ttl: int = OUTBOX_JOB_TTL,
+        flood_control: Optional[FloodControl] = None
+    ):
+        self._send = send
+        self._flood_control = flood_control
+        self.path = path
+        self.workers = max(workers, 1)
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.job_ttl = job_ttl
+        self._db = None
+        self._lock = threading.Lock()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks = []
+        # Grava as confirmações fora da thread que as despacha, na ordem em que chegam
+        self._updates_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="outbox-updates")
+        # Confirmações que chegaram antes de o envio ser gravado como sent, por (chat_id, id temporário)
+        self._early_updates: "OrderedDict[Tuple[int, int], Tuple[str, Optional[int], Optional[str]]]" = OrderedDict()
+
+    # Banco de dados
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._db is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            db.row_factory = sqlite3.Row
+            db.execute("PRAGMA journal_mode=WAL")
+            # Cada envio aceito precisa estar em disco antes da resposta
+            db.execute("PRAGMA synchronous=FULL")
+            db.executescript(SCHEMA)
+            self._db = db
+        return self._db
+
+    def _execute(self, query: str, parameters: tuple = ()) -> sqlite3.Cursor:
+        with self._lock:
+            return self._connection().execute(query, parameters)
+
+    @staticmethod
+    def _job(row: sqlite3.Row) -> Dict[str, Any]:
+        return {
+            "job_id": row["id"],
+            "chat_id": row["chat_id"],
+            "state": row["state"],
+            "attempts": row["attempts"],
+            "message_id": row["message_id"],
+            "error": row["error"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+            "next_attempt_at": row["next_attempt_at"] if row["state"] == "queued" else None
+        }
+
+    def enqueue(self, params: Dict[str, Any], idempotency_key: Optional[str] = None) -> Tuple[Dict[str, Any], bool]:
+        """
+        Grava um envio de sendMessage na fila.
+
+        Returns:
+            O envio e se ele foi criado agora (False quando a chave de idempotência já existia)
+
+        Raises:
+            OutboxError: Se os parâmetros ou a chave de idempotência forem inválidos
+            OutboxConflict: Se a chave de idempotência já pertence a um envio com outros parâmetros
+        """
+        if not isinstance(params.get("chat_id"), int) or not params.get("input_message_content"):
+            raise OutboxError("O envio precisa de chat_id e input_message_content")
+        if idempotency_key is not None and not 0 < len(idempotency_key) <= OUTBOX_MAX_KEY_LENGTH:
+            raise OutboxError(f"A chave de idempotência deve ter entre 1 e {OUTBOX_MAX_KEY_LENGTH} caracteres")
+
+        now = time.time()
+        with self._lock:
+            db = self._connection()
+            try:
+                db.execute(
+                    "INSERT INTO outbox (id, idempotency_key, chat_id, params, state, created_at, updated_at, next_attempt_at)"
+                    " VALUES (?, ?, ?, ?, 'queued', ?, ?, ?)",
+                    (uuid.uuid4().hex, idempotency_key, params["chat_id"], json.dumps(params, ensure_ascii=False), now, now, now)
+                )
+                created = True
+            except sqlite3.IntegrityError:
+                created = False
+            if created:
+                row = db.execute("SELECT * FROM outbox WHERE seq = last_insert_rowid()").fetchone()
+            else:
+                row = db.execute("SELECT * FROM outbox WHERE idempotency_key = ?", (idempotency_key,)).fetchone()
+        if not created and (row["chat_id"] != params["chat_id"] or json.loads(row["params"]) != params):
+            raise OutboxConflict(f"A chave de idempotência já foi usada pelo envio {row['id']} com outros parâmetros")
+        return self._job(row), created
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._execute("SELECT * FROM outbox WHERE id = ?", (job_id,)).fetchone()
+        return self._job(row) if row else None
+
+    def stats(self) -> Dict[str, Any]:
+        """Número de envios em cada estado."""
+        rows = self._execute("SELECT state, COUNT(*) FROM outbox GROUP BY state").fetchall()
+        return {state: count for state, count in rows}
+
+    def _claim(self) -> Optional[sqlite3.Row]:
+        now = time.time()
+        with self._lock:
+            db = self._connection()
+            row = db.execute(CLAIM, (now,)).fetchone()
+            if row is None:
+                return None
+            db.execute(
+                "UPDATE outbox SET state = 'sending', attempts = attempts + 1, updated_at = ? WHERE seq = ?",
+                (now, row["seq"])
+            )
+            return row
+
+    def _next_due(self) -> Optional[float]:
+        row = self._execute("SELECT MIN(next_attempt_at) FROM outbox WHERE state = 'queued'").fetchone()
+        return row[0]
+
+    def _finish(self, seq: int, state: str, message_id: Optional[int] = None, error: Optional[str] = None, next_attempt_at: float = 0):
+        self._execute(
+            "UPDATE outbox SET state = ?, message_id = ?, error = ?, updated_at = ?, next_attempt_at = ? WHERE seq = ?",
+            (state, message_id, error, time.time(), next_attempt_at, seq)
+        )
+
+    def _defer(self, seq: int, next_attempt_at: float):
+        self._execute(
+            "UPDATE outbox SET state = 'queued', attempts = attempts - 1, updated_at = ?, next_attempt_at = ? WHERE seq = ?",
+            (time.time(), next_attempt_at, seq)
+        )
+
+    def _recover(self):
+        # Envios interrompidos por um reinício voltam para a fila
+        recovered = self._execute(
+            "UPDATE outbox SET state = 'queued', updated_at = ? WHERE state = 'sending'", (time.time(),)
+        ).rowcount
+        if recovered:
+            logger.warning(f"{recovered} envio(s) interrompido(s) da fila persistente serão reenviados")
+
+    def _expire(self):
+        placeholders = ", ".join("?" for _ in FINAL_STATES + ("sent",))
+        self._execute(
+            f"DELETE FROM outbox WHERE state IN ({placeholders}) AND updated_at < ?",
+            FINAL_STATES + ("sent", time.time() - self.job_ttl)
+        )
+
+    # Atualizações
+
+    def handle_update(self, update: Dict[str, Any]):
+        """
+        Registra a confirmação (ou a recusa) pelo servidor de uma mensagem enviada
+        pela fila. A gravação é feita em segundo plano, sem bloquear quem despacha
+        as atualizações.
+        """
+        if update.get("old_message_id"):
+            self._updates_executor.submit(self._apply_update, update)
+
+    def _apply_update(self, update: Dict[str, Any]):
+        message = update.get("message") or {}
+        old_message_id = update.get("old_message_id")
+        if not message or not old_message_id:
+            return
+        if update.get("@type") == "updateMessageSendSucceeded":
+            state, message_id, error = "delivered", message.get("id"), None
+        else:
+            state, message_id = "failed", old_message_id
+            error = (update.get("error") or {}).get("message") or update.get("error_message")
+
+        key = (message.get("chat_id"), old_message_id)
+        try:
+            with self._lock:
+                updated = self._connection().execute(
+                    "UPDATE outbox SET state = ?, message_id = ?, error = ?, updated_at = ? WHERE chat_id = ? AND message_id = ? AND state = 'sent'",
+                    (state, message_id, error, time.time()) + key
+                ).rowcount
+                if not updated:
+                    # A resposta de sendMessage pode ainda não ter sido gravada
+                    self._early_updates[key] = (state, message_id, error)
+                    while len(self._early_updates) > 1000:
+                        self._early_updates.popitem(last=False)
+        except sqlite3.Error as e:
+            logger.error(f"Erro ao gravar a confirmação de envio na fila persistente: {e}")
+
+    def _sent(self, seq: int, chat_id: int, message_id: Optional[int]):
+        # Sob o mesmo lock de _apply_update, para que uma confirmação não se perca entre a consulta e a gravação
+        with self._lock:
+            state, message_id, error = self._early_updates.pop((chat_id, message_id), None) or ("sent", message_id, None)
+            self._connection().execute(
+                "UPDATE outbox SET state = ?, message_id = ?, error = ?, updated_at = ?, next_attempt_at = 0 WHERE seq = ?",
+                (state, message_id, error, time.time(), seq)
+            )
+
+    # Envio
+
+    def start(self):
+        """Inicia (uma única vez) os workers no loop de eventos atual e retoma os envios pendentes."""
+        if self._tasks:
+            return
+        self._wakeup = asyncio.Event()
+        self._recover()
+        self._expire()
+        self._tasks = [asyncio.ensure_future(self._run()) for _ in range(self.workers)]
+
+    async def submit(self, params: Dict[str, Any], idempotency_key: Optional[str] = None) -> Tuple[Dict[str, Any], bool]:
+        """
+        Grava o envio (fora do loop de eventos, pois aguarda o fsync) e acorda os
+        workers. Deve ser chamado no loop de eventos do envio.
+        """
+        self.start()
+        job, created = await asyncio.get_running_loop().run_in_executor(None, self.enqueue, params, idempotency_key)
+        if created:
+            self._wakeup.set()
+        return job, created
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                self._wakeup.clear()
+                row = await loop.run_in_executor(None, self._claim)
+                if row is None:
+                    await self._idle(loop)
+                    continue
+                await self._deliver(loop, row)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Erro no worker da fila persistente de envios: {e}")
+                await asyncio.sleep(1)
+
+    async def _idle(self, loop):
+        # Dorme até o próximo envio agendado ou até um novo envio ser gravado
+        due = await loop.run_in_executor(None, self._next_due)
+        timeout = 60.0 if due is None else max(due - time.time(), 0.05)
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _deliver(self, loop, row: sqlite3.Row):
+        params = json.loads(row["params"])
+        if self._flood_control is not None:
+            delay = self._flood_control.remaining('sendMessage', params)
+            if delay > 0:
+                # Chat em FLOOD_WAIT: reagenda sem contar a tentativa e sem ocupar o worker
+                await loop.run_in_executor(None, self._defer, row["seq"], time.time() + delay)
+                return
+        attempts = row["attempts"] + 1
+        try:
+            message = await self._send(params)
+        except Exception as e:
+            if classify_error(e) == ERROR_PERMANENT or attempts >= self.max_attempts:
+                logger.error(f"Envio {row['id']} da fila persistente falhou após {attempts} tentativa(s): {e}")
+                await loop.run_in_executor(None, self._finish, row["seq"], "failed", None, str(e))
+                return
+            wait = retry_after(e)
+            delay = wait if wait is not None else backoff_delay(attempts, self.retry_delay, OUTBOX_MAX_RETRY_DELAY)
+            logger.warning(f"Envio {row['id']} da fila persistente será repetido em {delay:.1f}s: {e}")
+            await loop.run_in_executor(None, self._finish, row["seq"], "queued", None, str(e), time.time() + delay)
+        else:
+            await loop.run_in_executor(None, self._sent, row["seq"], row["chat_id"], (message or {}).get("id"))
+        # Libera o próximo envio do mesmo chat para os demais workers
+        self._wakeup.set()
@@ -0,0 +1,171 @@
+import asyncio
+import math
+import os
+import random
+import re
+import time
+from typing import Any, Dict, Hashable, Optional
+
+# Tentativas por chamada e atrasos (segundos) do backoff exponencial para erros transitórios
+RETRY_MAX_ATTEMPTS = int(os.environ.get("RETRY_MAX_ATTEMPTS", "3"))
+RETRY_BASE_DELAY = float(os.environ.get("RETRY_BASE_DELAY", "0.5"))
+RETRY_MAX_DELAY = float(os.environ.get("RETRY_MAX_DELAY", "10"))
+# Esperas de FLOOD_WAIT mais longas que isto falham imediatamente em vez de bloquear a requisição
+RETRY_MAX_FLOOD_WAIT = int(os.environ.get("RETRY_MAX_FLOOD_WAIT", "60"))
+
+ERROR_FLOOD = "flood"
+ERROR_PERMANENT = "permanent"
+ERROR_TRANSIENT = "transient"
+
+# "Too Many Requests: retry after 17" (TDLib, código 429) ou "FLOOD_WAIT_17" (MTProto)
+_RETRY_AFTER_PATTERN = re.compile(r"(?:retry after|FLOOD_WAIT_)\s*(\d+)", re.IGNORECASE)
+# "400: Chat not found" (TDLibError) ou {'code': 400, ...} no texto do erro
+_ERROR_CODE_PATTERN = re.compile(r"^\s*(\d{3})\s*:|['\"]code['\"]\s*:\s*(\d{3})")
+
+def retry_after(error) -> Optional[int]:
+    """
+    Retorna quantos segundos o Telegram pediu para aguardar (FLOOD_WAIT), ou
+    None se o erro não for de limite de requisições.
+
+    Aceita exceções, objetos de erro da TDLib ({"@type": "error", ...}) ou textos.
+    """
+    if isinstance(error, dict):
+        error = error.get("message", "")
+    match = _RETRY_AFTER_PATTERN.search(str(error))
+    return int(match.group(1)) if match else None
+
+def error_code(error) -> Optional[int]:
+    """Código do erro da TDLib (400, 429, 500...), se puder ser determinado."""
+    code = error.get("code") if isinstance(error, dict) else getattr(error, "code", None)
+    if isinstance(code, int):
+        return code
+    match = _ERROR_CODE_PATTERN.search(str(error))
+    if match:
+        return int(match.group(1) or match.group(2))
+    return None
+
+def classify_error(error) -> str:
+    """
+    Classifica um erro para a política de novas tentativas:
+
+    - ERROR_FLOOD: limite de requisições (429 / FLOOD_WAIT), repetir após a espera pedida
+    - ERROR_PERMANENT: erro da requisição (4xx), repetir não adianta
+    - ERROR_TRANSIENT: demais erros (5xx, tempo esgotado, conexão), repetir com backoff
+    """
+    code = error_code(error)
+    if code == 429 or retry_after(error) is not None:
+        return ERROR_FLOOD
+    if code is not None and 400 <= code < 500:
+        return ERROR_PERMANENT
+    return ERROR_TRANSIENT
+
+def backoff_delay(attempt: int, base: float = RETRY_BASE_DELAY, cap: float = RETRY_MAX_DELAY) -> float:
+    """Atraso exponencial com jitter para a tentativa `attempt` (1, 2, ...): entre metade e o total de base * 2^(attempt-1)."""
+    delay = min(cap, base * 2 ** (attempt - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+class FloodWait(Exception):
+    """A chamada exigiria aguardar um FLOOD_WAIT mais longo que o permitido."""
+
+    def __init__(self, seconds: int):
+        # Mesmo formato da TDLib, para que retry_after() reconheça o erro
+        super().__init__(f"429: Too Many Requests: retry after {seconds}")
+        self.code = 429
+        self.seconds = seconds
+
+class FloodControl:
+    """
+    Esperas de FLOOD_WAIT compartilhadas entre as requisições.
+
+    Quando o Telegram pede uma espera, ela é registrada para o chat da
+    requisição (ou, sem chat_id, para o método). As demais requisições para o
+    mesmo chat ou método aguardam o fim da espera antes de serem enviadas, em
+    vez de se somarem ao limite. Esperas maiores que max_wait falham com FloodWait.
+    """
+
+    def __init__(self, max_wait: float = RETRY_MAX_FLOOD_WAIT):
+        self.max_wait = max_wait
+        self.flood_waits = 0
+        self._until: Dict[Hashable, float] = {}
+
+    @staticmethod
+    def _keys(method: str, params: Optional[Dict[str, Any]]):
+        chat_id = (params or {}).get("chat_id")
+        if chat_id:
+            return (("chat", chat_id), ("method", method))
+        return (("method", method),)
+
+    def remaining(self, method: str, params: Optional[Dict[str, Any]] = None) -> float:
+        """Segundos de espera ainda pendentes para a chamada."""
+        now = time.monotonic()
+        return max([self._until.get(key, 0) - now for key in self._keys(method, params)] + [0])
+
+    async def wait(self, method: str, params: Optional[Dict[str, Any]] = None):
+        """
+        Aguarda as esperas pendentes do chat e do método.
+
+        Raises:
+            FloodWait: Se a espera for maior que max_wait
+        """
+        remaining = self.remaining(method, params)
+        if remaining > self.max_wait:
+            raise FloodWait(math.ceil(remaining))
+        if remaining > 0:
+            await asyncio.sleep(remaining)
+
+    def penalize(self, method: str, params: Optional[Dict[str, Any]], seconds: float):
+        """Registra uma espera de FLOOD_WAIT para o chat da requisição (ou para o método)."""
+        now = time.monotonic()
+        key = self._keys(method, params)[0]
+        until = self._until.get(key, 0)
+        if until <= now:
+            # O mesmo FLOOD_WAIT pode ser informado por mais de um caminho; conta-se uma vez
+            self.flood_waits += 1
+        self._until[key] = max(until, now + seconds)
+        # Descartar as esperas já vencidas
+        for expired in [key for key, until in self._until.items() if until <= now]:
+            del self._until[expired]
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "active": sum(1 for until in self._until.values() if until > now),
+            "flood_waits": self.flood_waits
+        }
+
+class TokenBucket:
+    """
+    Limitador de taxa por balde de fichas: até `burst` operações imediatas e,
+    em seguida, `rate` operações por segundo. Quem chama acquire() aguarda,
+    em ordem de chegada, a próxima ficha disponível. rate <= 0 desativa o limite.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.capacity = max(burst, 1)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        """Aguarda e consome uma ficha."""
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    @property
+    def idle(self) -> bool:
+        """Indica se o balde está cheio, ou seja, se pode ser descartado sem perder estado."""
+        self._refill()
+        return self.tokens >= self.capacity
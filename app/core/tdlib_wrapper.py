@@ -1,12 +1,25 @@
 import asyncio
+import itertools
 import json
 import os
 import logging
+import queue
+import threading
 import ctypes
+import ctypes.util
 import platform
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Callable, Hashable, Union
 from pathlib import Path
 
+from app.core.components import ClientComponents
+from app.core.downloads import DOWNLOAD_TIMEOUT
+from app.core.updates import (
+    UpdateCoalescer,
+    UpdateSubscription,
+    UPDATE_HANDLER_QUEUE_SIZE,
+    POLICY_DROP_OLDEST,
+)
+
 # Configuração de logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger("tdlib")
@@ -17,48 +30,175 @@ TELEGRAM_API_HASH = os.environ.get("TELEGRAM_API_HASH")
 TELEGRAM_PHONE = os.environ.get("TELEGRAM_PHONE")
 TD_DATABASE_DIRECTORY = os.environ.get("TD_DATABASE_DIRECTORY", "./td_db")
 TD_FILES_DIRECTORY = os.environ.get("TD_FILES_DIRECTORY", "./td_files")
+TDLIB_LIBRARY_PATH = os.environ.get("TDLIB_LIBRARY_PATH")
+TDLIB_REQUEST_TIMEOUT = float(os.environ.get("TDLIB_REQUEST_TIMEOUT", "60"))
+TDLIB_RECEIVE_TIMEOUT = float(os.environ.get("TDLIB_RECEIVE_TIMEOUT", "1.0"))
+TDLIB_RECEIVE_BATCH_SIZE = int(os.environ.get("TDLIB_RECEIVE_BATCH_SIZE", "100"))
+
+class TDLibError(Exception):
+    """Erro retornado pela TDLib em resposta a uma requisição."""
+
+    def __init__(self, code: int, message: str, method_name: Optional[str] = None):
+        super().__init__(f"{code}: {message}")
+        self.code = code
+        self.message = message
+        self.method_name = method_name
+
+class TDJsonClient:
+    """Interface ctypes para a biblioteca tdjson (td_create_client_id/td_send/td_receive)."""
+
+    def __init__(self, library_path: str):
+        self._lib = ctypes.CDLL(library_path)
+        
+        self._lib.td_create_client_id.restype = ctypes.c_int
+        self._lib.td_create_client_id.argtypes = []
+        self._lib.td_send.restype = None
+        self._lib.td_send.argtypes = [ctypes.c_int, ctypes.c_char_p]
+        self._lib.td_receive.restype = ctypes.c_char_p
+        self._lib.td_receive.argtypes = [ctypes.c_double]
+        self._lib.td_execute.restype = ctypes.c_char_p
+        self._lib.td_execute.argtypes = [ctypes.c_char_p]
+        
+        self.client_id = self._lib.td_create_client_id()
+
+    def send(self, request: Dict[str, Any]):
+        """Envia uma requisição de forma assíncrona para a TDLib."""
+        self._lib.td_send(self.client_id, json.dumps(request).encode('utf-8'))
+
+    def receive(self, timeout: float) -> Optional[Dict[str, Any]]:
+        """Bloqueia até receber uma resposta/atualização ou até o timeout expirar."""
+        result = self._lib.td_receive(timeout)
+        if not result:
+            return None
+        return json.loads(result.decode('utf-8'))
+
+    def execute(self, request: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Executa de forma síncrona um método que não exige rede."""
+        result = self._lib.td_execute(json.dumps(request).encode('utf-8'))
+        if not result:
+            return None
+        return json.loads(result.decode('utf-8'))
+
+class SimulatedTDJsonClient:
+    """Transporte em memória com a mesma interface do TDJsonClient, usado quando a tdjson não está disponível."""
+
+    def __init__(self, responder: Callable[[str, Dict[str, Any]], Dict[str, Any]]):
+        self._responder = responder
+        self._inbox = queue.Queue()
+        self.client_id = 0
+
+    def send(self, request: Dict[str, Any]):
+        request = dict(request)
+        extra = request.pop("@extra", None)
+        method_name = request.pop("@type")
+        try:
+            response = dict(self._responder(method_name, request))
+        except Exception as e:
+            response = {"@type": "error", "code": 500, "message": str(e)}
+        if extra is not None:
+            response["@extra"] = extra
+        self._inbox.put(response)
+
+    def receive(self, timeout: float) -> Optional[Dict[str, Any]]:
+        try:
+            if timeout <= 0:
+                return self._inbox.get_nowait()
+            return self._inbox.get(timeout=timeout)
+        except queue.Empty:
+            return None
 
-# Cliente TDLib global
-tg = None
+    def execute(self, request: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        request = dict(request)
+        return self._responder(request.pop("@type"), request)
 
-# Implementação simplificada que usa arquivos JSON e subprocess para chamar a TDLib CLI
-class TDLibWrapper:
+def load_tdjson_client() -> Optional[TDJsonClient]:
+    """Carrega a biblioteca tdjson a partir de TDLIB_LIBRARY_PATH ou dos caminhos do sistema."""
+    library_path = TDLIB_LIBRARY_PATH or ctypes.util.find_library("tdjson")
+    if not library_path:
+        return None
+    try:
+        return TDJsonClient(library_path)
+    except (OSError, AttributeError) as e:
+        logger.warning(f"Não foi possível carregar a biblioteca tdjson em {library_path} ({platform.system()}): {e}")
+        return None
+
+class TDLibWrapper(ClientComponents):
     def __init__(self):
-        self.ready = asyncio.Event()
+        # Os objetos asyncio são criados em initialize(), já dentro do loop em execução
+        self.loop = None
+        self.ready = None
+        self.initialized = False
         self.is_authorized = False
         self.auth_state = None
-        self.updates_queue = asyncio.Queue()
         self.logger = logger
         self.database_directory = TD_DATABASE_DIRECTORY
         self.files_directory = TD_FILES_DIRECTORY
-        self.pending_requests = {}
-        self.update_handlers = {}
+        self.pending_requests: Dict[str, asyncio.Future] = {}
+        self.update_handlers: Dict[str, List[UpdateSubscription]] = {}
+        self.coalescer = UpdateCoalescer(self._dispatch_update)
         self.api_id = TELEGRAM_API_ID
         self.api_hash = TELEGRAM_API_HASH
         self.phone_number = TELEGRAM_PHONE
+        self.td_client = None
+        self.simulated = False
+        self._request_ids = itertools.count(1)
+        self._receive_thread = None
+        self._stop_receiving = threading.Event()
+        
+        self.subscribe('updateAuthorizationState', self._on_authorization_state, queue_size=0)
+        
+        # Componentes compartilhados com o TDLibService, criados no primeiro acesso
+        self._init_components(
+            lambda method_name, params: self.call_method(method_name, params),
+            lambda method_name, params: self.call_method(method_name, params),
+            self._submit,
+            download_call=lambda method_name, params: self.call_method(method_name, params, timeout=DOWNLOAD_TIMEOUT)
+        )
 
     async def initialize(self):
         """Inicializa o cliente TDLib."""
         self.logger.info("Inicializando cliente TDLib...")
         
+        self.loop = asyncio.get_running_loop()
+        self.ready = asyncio.Event()
+        
         # Cria direórios necessários
         Path(self.database_directory).mkdir(parents=True, exist_ok=True)
         Path(self.files_directory).mkdir(parents=True, exist_ok=True)
         
         try:
+            # Usa a tdjson real quando disponível; caso contrário, respostas simuladas
+            self.td_client = load_tdjson_client()
+            if self.td_client is None:
+                self.logger.warning("Biblioteca tdjson não encontrada. Usando respostas simuladas.")
+                self.td_client = SimulatedTDJsonClient(self._simulate_response)
+                self.simulated = True
+            
+            # Os componentes compartilhados passam a receber as atualizações
+            for update_type, handler, inline in self._component_update_handlers():
+                if inline:
+                    self.subscribe(update_type, handler, queue_size=0)
+                else:
+                    self.subscribe(update_type, handler)
+            
+            # Inicializa o recebimento antes da primeira requisição, pois é
+            # ele quem entrega as respostas
+            self._start_receiving()
+            
             # Configura o TDLib com os parâmetros básicos
             if self.api_id and self.api_hash:
                 await self.set_tdlib_parameters()
             
-            # Inicializa o processamento de atualizações
-            asyncio.create_task(self._process_updates())
-            
-            # Na inicialização, se já houver credenciais, tenta restaurar a sessão
-            self.auth_state = "authorizationStateWaitPhoneNumber"
+            # Na inicialização simulada, considera que a sessão aguarda o número de telefone
+            if self.simulated:
+                self.auth_state = "authorizationStateWaitPhoneNumber"
             
             # Marca como pronto após a inicialização básica
+            self.initialized = True
             self.ready.set()
             
+            await self._start_components()
+            
             self.logger.info("Cliente TDLib inicializado com sucesso!")
         except Exception as e:
             self.logger.error(f"Erro ao inicializar TDLib: {e}")
@@ -66,6 +206,20 @@ class TDLibWrapper:
             
         return self
 
+    async def close(self):
+        """Encerra o recebimento de atualizações e cancela as requisições pendentes."""
+        self._stop_receiving.set()
+        self.coalescer.flush()
+        if self._receive_thread is not None:
+            await self.loop.run_in_executor(None, self._receive_thread.join)
+            self._receive_thread = None
+        for future in self.pending_requests.values():
+            if not future.done():
+                future.cancel()
+        self.pending_requests.clear()
+        self._stop_components()
+        self.initialized = False
+
     async def set_tdlib_parameters(self):
         """Configura os parâmetros básicos do TDLib."""
         return await self.call_method(
@@ -84,20 +238,166 @@ class TDLibWrapper:
             }
         )
 
-    async def _process_updates(self):
-        """Processa as atualizações recebidas do TDLib."""
-        while True:
+    def _start_receiving(self):
+        """Inicia a thread que bloqueia em td_receive e entrega lotes ao loop."""
+        self._stop_receiving.clear()
+        self._receive_thread = threading.Thread(
+            target=self._process_updates,
+            name="tdlib-receive",
+            daemon=True
+        )
+        self._receive_thread.start()
+
+    def _process_updates(self):
+        """Recebe as mensagens da TDLib na thread de recebimento."""
+        while not self._stop_receiving.is_set():
             try:
-                # Em uma implementação real, este método receberia atualizações
-                # do TDLib e processaria de acordo com o tipo de atualização
-                await asyncio.sleep(1)
+                # Bloqueia até chegar algo (sem polling com sleep)
+                event = self.td_client.receive(TDLIB_RECEIVE_TIMEOUT)
+                if event is None:
+                    continue
+                
+                # Agrupa o que já estiver disponível para reduzir trocas de thread
+                batch = [event]
+                while len(batch) < TDLIB_RECEIVE_BATCH_SIZE:
+                    event = self.td_client.receive(0)
+                    if event is None:
+                        break
+                    batch.append(event)
+                
+                self.loop.call_soon_threadsafe(self._dispatch_batch, batch)
+            except RuntimeError:
+                # Loop de eventos encerrado
+                break
             except Exception as e:
                 self.logger.error(f"Erro ao processar atualizações: {e}")
 
-    async def call_method(self, method_name: str, params: Dict[str, Any]):
-        """Implementação simulada de chamada de método TDLib."""
+    def _dispatch_batch(self, batch: List[Dict[str, Any]]):
+        """Processa, no loop de eventos, um lote recebido da TDLib."""
+        for event in batch:
+            try:
+                self._handle_event(event)
+            except Exception as e:
+                self.logger.error(f"Erro ao processar atualização {event.get('@type')}: {e}")
+
+    def _handle_event(self, event: Dict[str, Any]):
+        """Resolve a requisição pendente correspondente ao @extra ou despacha a atualização."""
+        extra = event.pop("@extra", None)
+        if extra is not None:
+            future = self.pending_requests.pop(extra, None)
+            if future is None:
+                self.logger.warning(f"Resposta recebida para requisição desconhecida: {extra}")
+                return
+            if future.done():
+                return
+            if event.get("@type") == "error":
+                future.set_exception(TDLibError(event.get("code", 0), event.get("message", "")))
+            else:
+                future.set_result(event)
+            return
+        
+        # Atualizações de alta frequência passam antes pelo estágio de coalescência
+        if not self.coalescer.offer(event):
+            self._dispatch_update(event)
+
+    def _dispatch_update(self, update: Dict[str, Any]):
+        """Entrega a atualização aos inscritos no seu @type e aos inscritos em '*'."""
+        for subscription in self.update_handlers.get(update.get("@type"), ()):
+            subscription.put(update)
+        for subscription in self.update_handlers.get("*", ()):
+            subscription.put(update)
+
+    def subscribe(
+        self,
+        update_type: str,
+        handler: Callable[[Dict[str, Any]], Any],
+        queue_size: int = UPDATE_HANDLER_QUEUE_SIZE,
+        policy: str = POLICY_DROP_OLDEST,
+        coalesce_key: Optional[Callable[[Dict[str, Any]], Hashable]] = None
+    ) -> UpdateSubscription:
+        """
+        Inscreve um handler (síncrono ou assíncrono) em um tipo de atualização.
+        
+        Use '*' para receber todas as atualizações. Cada handler tem sua própria
+        fila limitada a queue_size; quando cheia, a política define se descarta a
+        mais antiga (drop_oldest), a mais nova (drop_newest) ou se mantém apenas o
+        último valor por chave (coalesce, com coalesce_key).
+        """
+        subscription = UpdateSubscription(update_type, handler, queue_size, policy, coalesce_key)
+        self.update_handlers.setdefault(update_type, []).append(subscription)
+        return subscription
+
+    def unsubscribe(self, update_type: str, handler: Union[Callable, UpdateSubscription]) -> bool:
+        """Remove a inscrição de um handler (ou a própria inscrição) de um tipo de atualização."""
+        subscriptions = self.update_handlers.get(update_type, [])
+        for subscription in list(subscriptions):
+            if subscription is handler or subscription.handler == handler:
+                subscriptions.remove(subscription)
+                subscription.close()
+                if not subscriptions:
+                    self.update_handlers.pop(update_type, None)
+                return True
+        return False
+
+    def update_stats(self) -> Dict[str, Any]:
+        """Retorna os contadores de coalescência e de todas as inscrições."""
+        return {
+            "coalescing": self.coalescer.stats(),
+            "subscriptions": [
+                subscription.stats()
+                for subscriptions in self.update_handlers.values()
+                for subscription in subscriptions
+            ]
+        }
+
+    def _on_authorization_state(self, update: Dict[str, Any]):
+        """Acompanha o estado de autorização informado pela TDLib."""
+        state = update.get("authorization_state", {}).get("@type")
+        self.auth_state = state
+        self.is_authorized = state == "authorizationStateReady"
+
+    def _send(self, request: Dict[str, Any]):
+        """Envia uma requisição para a TDLib."""
+        self.td_client.send(request)
+
+    async def call_method(self, method_name: str, params: Dict[str, Any], timeout: Optional[float] = None):
+        """
+        Envia uma requisição à TDLib e aguarda a resposta correspondente.
+        
+        Cada requisição recebe um @extra único e uma Future em pending_requests,
+        resolvida pelo loop de recebimento. Assim várias chamadas podem ficar
+        pendentes ao mesmo tempo sobre o mesmo cliente. Chamadas idênticas
+        simultâneas a métodos em IDEMPOTENT_METHODS compartilham uma única requisição.
+        """
+        return await self.single_flight.call(
+            method_name,
+            params,
+            lambda: self._request(method_name, params, timeout)
+        )
+
+    async def _request(self, method_name: str, params: Dict[str, Any], timeout: Optional[float] = None):
+        """Envia uma única requisição à TDLib e aguarda sua resposta."""
         self.logger.info(f"Chamando método: {method_name} com parâmetros: {params}")
         
+        extra = f"req-{next(self._request_ids)}"
+        future = asyncio.get_running_loop().create_future()
+        self.pending_requests[extra] = future
+        
+        request = dict(params or {})
+        request["@type"] = method_name
+        request["@extra"] = extra
+        
+        try:
+            self._send(request)
+            return await asyncio.wait_for(future, timeout or TDLIB_REQUEST_TIMEOUT)
+        except TDLibError as e:
+            e.method_name = method_name
+            raise
+        finally:
+            self.pending_requests.pop(extra, None)
+
+    def _simulate_response(self, method_name: str, params: Dict[str, Any]):
+        """Gera respostas simuladas para os métodos TDLib."""
         # Para métodos de autenticação, retorna respostas simuladas
         if method_name == 'setTdlibParameters':
             self.api_id = params.get('api_id', self.api_id)
@@ -307,7 +607,7 @@ class TDLibWrapper:
                 "chat_ids": [9876543210]
             }
             
-        elif method_name == 'uploadFile':
+        elif method_name in ('uploadFile', 'preliminaryUploadFile'):
             return {
                 "@type": "file",
                 "id": 54321,
@@ -362,6 +662,22 @@ class TDLibWrapper:
                 }
             }
             
+        elif method_name == 'getRemoteFile':
+            remote_file_id = params.get("remote_file_id", "")
+            return {
+                "@type": "file",
+                "id": 54322,
+                "size": 1024,
+                "expected_size": 1024,
+                "remote": {
+                    "@type": "remoteFile",
+                    "id": remote_file_id,
+                    "is_uploading_active": False,
+                    "is_uploading_completed": True,
+                    "uploaded_size": 1024
+                }
+            }
+
         elif method_name == 'downloadFile':
             # Simula o download concluído imediatamente
             return {
@@ -390,6 +706,13 @@ class TDLibWrapper:
             "params": params
         }
 
+    def _submit(self, coro):
+        """Agenda uma corrotina no loop do cliente a partir de qualquer thread."""
+        if self.loop is None or self.loop.is_closed():
+            coro.close()
+            return None
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
     async def check_authentication_code(self, code: str):
         """Verifica o código de autenticação."""
         return await self.call_method(
@@ -413,13 +736,13 @@ class TDLibWrapper:
 
 async def initialize_client():
     """Inicializa o cliente TDLib global."""
-    global tg
-    tg = await TDLibWrapper().initialize()
+    if not tg.initialized:
+        await tg.initialize()
     return tg
 
 async def get_chats(limit=100, offset_order=2**63-1, offset_chat_id=0):
     """Obtém a lista de chats."""
-    if not tg:
+    if not tg.initialized:
         await initialize_client()
         
     return await tg.call_method(
@@ -434,7 +757,7 @@ async def get_chats(limit=100, offset_order=2**63-1, offset_chat_id=0):
 
 async def search_contacts(query: str, limit: int = 50):
     """Pesquisa contatos pelo nome."""
-    if not tg:
+    if not tg.initialized:
         await initialize_client()
         
     return await tg.call_method(
@@ -443,4 +766,7 @@ async def search_contacts(query: str, limit: int = 50):
             'query': query,
             'limit': limit
         }
-    ) 
\ No newline at end of file
+    ) 
+
+# Cliente TDLib global, importado diretamente pelos roteadores
+tg = TDLibWrapper()
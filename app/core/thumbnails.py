@@ -0,0 +1,132 @@
+import asyncio
+import logging
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# Pillow é opcional: sem ele, apenas as miniaturas no tamanho original são servidas
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+logger = logging.getLogger("tdlib")
+
+TD_FILES_DIRECTORY = os.environ.get("TD_FILES_DIRECTORY", "./td_files")
+THUMBNAIL_VARIANTS_DIRECTORY = os.environ.get(
+    "THUMBNAIL_VARIANTS_DIRECTORY", os.path.join(TD_FILES_DIRECTORY, "thumbnail_variants")
+)
+# Larguras permitidas, para que o cache de variantes não cresça com valores arbitrários
+THUMBNAIL_VARIANT_WIDTHS = tuple(
+    int(width) for width in os.environ.get("THUMBNAIL_VARIANT_WIDTHS", "64,128,320").split(",") if width.strip()
+)
+THUMBNAIL_WORKERS = int(os.environ.get("THUMBNAIL_WORKERS", "2"))
+THUMBNAIL_QUALITY = int(os.environ.get("THUMBNAIL_QUALITY", "85"))
+
+class ThumbnailUnavailable(Exception):
+    """Não é possível gerar variantes de miniaturas (Pillow não instalado)."""
+
+class ThumbnailVariants:
+    """
+    Cache em disco de miniaturas redimensionadas.
+
+    Cada variante é gerada uma única vez em um pool de threads e gravada em
+    THUMBNAIL_VARIANTS_DIRECTORY com um nome derivado do unique_id e do tamanho
+    do arquivo original e da largura pedida. Pedidos seguintes são apenas
+    envio de arquivo. Gerações simultâneas da mesma variante são agrupadas.
+
+    Cada acesso a uma variante é informado a `record` (FileCache.record_path),
+    de modo que as variantes entram no orçamento de disco dos arquivos
+    baixados e são removidas por LRU como eles.
+    """
+
+    def __init__(
+        self,
+        directory: str = THUMBNAIL_VARIANTS_DIRECTORY,
+        widths: Tuple[int, ...] = THUMBNAIL_VARIANT_WIDTHS,
+        workers: int = THUMBNAIL_WORKERS,
+        record: Optional[Callable[[str], Any]] = None
+    ):
+        self.directory = directory
+        self._record = record
+        self.widths = tuple(sorted(widths))
+        self.generated = 0
+        self._workers = workers
+        self._executor = None
+        self._pending: Dict[str, asyncio.Future] = {}
+
+    @property
+    def available(self) -> bool:
+        return Image is not None
+
+    def variant_path(self, unique_id: str, size: int, width: int) -> str:
+        """Caminho da variante de largura `width` do arquivo identificado por unique_id e size."""
+        safe_id = "".join(char for char in unique_id if char.isalnum() or char in "-_")
+        return os.path.join(self.directory, f"{safe_id}_{size}_w{width}.jpg")
+
+    async def get(self, source_path: str, unique_id: str, size: int, width: int) -> str:
+        """
+        Retorna o caminho da variante, gerando-a se ainda não existir.
+
+        Raises:
+            ValueError: Se a largura não estiver em THUMBNAIL_VARIANT_WIDTHS
+            ThumbnailUnavailable: Se o Pillow não estiver instalado
+        """
+        if width not in self.widths:
+            raise ValueError(f"Largura inválida: {width}. Use uma de {', '.join(map(str, self.widths))}")
+        if not self.available:
+            raise ThumbnailUnavailable("Instale o Pillow para gerar miniaturas redimensionadas")
+
+        path = self.variant_path(unique_id, size, width)
+        if os.path.isfile(path):
+            self._accessed(path)
+            return path
+
+        future = self._pending.get(path)
+        if future is None:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="thumbnail")
+            future = asyncio.get_running_loop().run_in_executor(
+                self._executor, self._resize, source_path, path, width
+            )
+            self._pending[path] = future
+            future.add_done_callback(lambda _: self._pending.pop(path, None))
+
+        path = await asyncio.shield(future)
+        self._accessed(path)
+        return path
+
+    def _accessed(self, path: str):
+        if self._record is None:
+            return
+        try:
+            self._record(path)
+        except OSError:
+            # Removida entre a verificação e o registro; será gerada de novo no próximo pedido
+            pass
+
+    def _resize(self, source_path: str, path: str, width: int) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with Image.open(source_path) as image:
+                image = image.convert("RGB")
+                if image.width > width:
+                    height = max(1, round(image.height * width / image.width))
+                    image = image.resize((width, height), Image.LANCZOS)
+                image.save(temp_path, "JPEG", quality=THUMBNAIL_QUALITY, optimize=True)
+            # Substituição atômica: leitores nunca veem uma variante incompleta
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        self.generated += 1
+        return path
+
+    def shutdown(self):
+        """Encerra o pool de threads."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
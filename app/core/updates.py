@@ -0,0 +1,228 @@
+import asyncio
+import logging
+import os
+from collections import OrderedDict, deque
+from typing import Any, Callable, Dict, Hashable, Optional
+
+logger = logging.getLogger("tdlib")
+
+UPDATE_HANDLER_QUEUE_SIZE = int(os.environ.get("UPDATE_HANDLER_QUEUE_SIZE", "1000"))
+UPDATE_COALESCE_WINDOW = float(os.environ.get("UPDATE_COALESCE_WINDOW", "0.1"))
+
+# Políticas aplicadas quando a fila de um handler está cheia
+POLICY_DROP_OLDEST = "drop_oldest"
+POLICY_DROP_NEWEST = "drop_newest"
+POLICY_COALESCE = "coalesce"
+POLICIES = (POLICY_DROP_OLDEST, POLICY_DROP_NEWEST, POLICY_COALESCE)
+
+class UpdateSubscription:
+    """
+    Inscrição de um handler em um tipo de atualização da TDLib.
+
+    Cada inscrição possui sua própria fila limitada e uma tarefa consumidora,
+    de modo que um handler lento não bloqueia os demais nem cresce sem limite.
+    Com queue_size=0 o handler é chamado diretamente durante o despacho
+    (apenas para handlers síncronos e rápidos, como caches).
+    """
+
+    def __init__(
+        self,
+        update_type: str,
+        handler: Callable[[Dict[str, Any]], Any],
+        queue_size: int = UPDATE_HANDLER_QUEUE_SIZE,
+        policy: str = POLICY_DROP_OLDEST,
+        coalesce_key: Optional[Callable[[Dict[str, Any]], Hashable]] = None
+    ):
+        if policy not in POLICIES:
+            raise ValueError(f"Política inválida: {policy}. Use uma de {', '.join(POLICIES)}")
+        if policy == POLICY_COALESCE and coalesce_key is None:
+            raise ValueError("A política 'coalesce' exige coalesce_key")
+
+        self.update_type = update_type
+        self.handler = handler
+        self.queue_size = queue_size
+        self.policy = policy
+        self.coalesce_key = coalesce_key
+        self.delivered = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.errors = 0
+        self._queue = deque()
+        self._pending_keys: "OrderedDict[Hashable, Dict[str, Any]]" = OrderedDict()
+        self._wakeup = None
+        self._task = None
+        self._closed = False
+
+    def __len__(self):
+        return len(self._queue) + len(self._pending_keys)
+
+    def put(self, update: Dict[str, Any]):
+        """Entrega uma atualização à inscrição, aplicando a política de contrapressão."""
+        if self._closed:
+            return
+
+        if self.queue_size <= 0:
+            self._call_inline(update)
+            return
+
+        if self.policy == POLICY_COALESCE:
+            key = self.coalesce_key(update)
+            if key in self._pending_keys:
+                # Mantém a posição original e substitui pelo valor mais recente
+                self._pending_keys[key] = update
+                self.coalesced += 1
+                self._ensure_consumer()
+                return
+            if len(self) >= self.queue_size:
+                self._pending_keys.popitem(last=False)
+                self.dropped += 1
+            self._pending_keys[key] = update
+        else:
+            if len(self._queue) >= self.queue_size:
+                if self.policy == POLICY_DROP_NEWEST:
+                    self.dropped += 1
+                    return
+                self._queue.popleft()
+                self.dropped += 1
+            self._queue.append(update)
+
+        self._ensure_consumer()
+
+    def close(self):
+        """Cancela a tarefa consumidora e descarta as atualizações pendentes."""
+        self._closed = True
+        self._queue.clear()
+        self._pending_keys.clear()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Retorna os contadores da inscrição."""
+        return {
+            "update_type": self.update_type,
+            "policy": self.policy,
+            "queue_size": self.queue_size,
+            "pending": len(self),
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "errors": self.errors
+        }
+
+    def _call_inline(self, update: Dict[str, Any]):
+        try:
+            result = self.handler(update)
+            if asyncio.iscoroutine(result):
+                asyncio.get_running_loop().create_task(result)
+            self.delivered += 1
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Erro no handler de {self.update_type}: {e}")
+
+    def _ensure_consumer(self):
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        self._wakeup.set()
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._consume())
+
+    def _next_update(self) -> Optional[Dict[str, Any]]:
+        if self._queue:
+            return self._queue.popleft()
+        if self._pending_keys:
+            return self._pending_keys.popitem(last=False)[1]
+        return None
+
+    async def _consume(self):
+        while not self._closed:
+            update = self._next_update()
+            if update is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            try:
+                result = self.handler(update)
+                if asyncio.iscoroutine(result):
+                    await result
+                self.delivered += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Erro no handler de {self.update_type}: {e}")
+
+# Atualizações de alta frequência em que apenas o valor mais recente por entidade importa
+COALESCED_UPDATE_KEYS: Dict[str, Callable[[Dict[str, Any]], Hashable]] = {
+    "updateUserStatus": lambda update: update.get("user_id"),
+    "updateChatReadInbox": lambda update: update.get("chat_id"),
+    "updateFile": lambda update: update.get("file", {}).get("id"),
+}
+
+class UpdateCoalescer:
+    """
+    Estágio de coalescência aplicado antes do despacho das atualizações.
+
+    Atualizações dos tipos em COALESCED_UPDATE_KEYS ficam retidas por até
+    `window` segundos e apenas a mais recente por (tipo, entidade) é entregue.
+    Com window=0 a coalescência fica desativada.
+    """
+
+    def __init__(
+        self,
+        dispatch: Callable[[Dict[str, Any]], None],
+        window: float = UPDATE_COALESCE_WINDOW,
+        keys: Optional[Dict[str, Callable[[Dict[str, Any]], Hashable]]] = None
+    ):
+        self.dispatch = dispatch
+        self.window = window
+        self.keys = dict(COALESCED_UPDATE_KEYS if keys is None else keys)
+        self.received: Dict[str, int] = {}
+        self.collapsed: Dict[str, int] = {}
+        self._pending: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+        self._flush_handle = None
+
+    def offer(self, update: Dict[str, Any]) -> bool:
+        """
+        Oferece uma atualização ao estágio de coalescência.
+
+        Returns:
+            True se a atualização foi retida (será entregue no próximo flush),
+            False se deve ser despachada imediatamente
+        """
+        update_type = update.get("@type")
+        key_func = self.keys.get(update_type)
+        if key_func is None or self.window <= 0:
+            return False
+
+        key = (update_type, key_func(update))
+        self.received[update_type] = self.received.get(update_type, 0) + 1
+        if key in self._pending:
+            self.collapsed[update_type] = self.collapsed.get(update_type, 0) + 1
+        self._pending[key] = update
+
+        if self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.window, self.flush)
+        return True
+
+    def flush(self):
+        """Entrega imediatamente todas as atualizações retidas."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        pending, self._pending = self._pending, OrderedDict()
+        for update in pending.values():
+            try:
+                self.dispatch(update)
+            except Exception as e:
+                logger.error(f"Erro ao despachar atualização {update.get('@type')}: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Retorna quantas atualizações foram recebidas e quantas foram colapsadas por tipo."""
+        return {
+            "window": self.window,
+            "pending": len(self._pending),
+            "received": dict(self.received),
+            "collapsed": dict(self.collapsed),
+            "total_collapsed": sum(self.collapsed.values())
+        }
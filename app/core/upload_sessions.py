@@ -0,0 +1,429 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from app.core.uploads import TD_FILES_DIRECTORY, UPLOAD_CHUNK_SIZE, UploadTooLarge
+
+logger = logging.getLogger("tdlib")
+
+# Tamanho máximo de um upload em partes (padrão: limite de 2000 MiB do Telegram)
+MAX_SESSION_UPLOAD_SIZE = int(os.environ.get("MAX_SESSION_UPLOAD_SIZE", str(2000 * 1024 * 1024)))
+# Sessões sem atividade por mais tempo que isto são removidas
+UPLOAD_SESSION_TTL = int(os.environ.get("UPLOAD_SESSION_TTL", "86400"))
+UPLOAD_SESSIONS_DIRECTORY = os.environ.get(
+    "UPLOAD_SESSIONS_DIRECTORY", os.path.join(TD_FILES_DIRECTORY, "upload_sessions")
+)
+
+class UploadSessionNotFound(Exception):
+    """A sessão de upload não existe ou expirou."""
+
+class InvalidChunk(Exception):
+    """A parte enviada não cabe no arquivo declarado ou a sessão não aceita mais partes."""
+
+class UploadIncomplete(Exception):
+    """A sessão ainda não recebeu todos os bytes do arquivo."""
+
+    def __init__(self, missing: List[Tuple[int, int]]):
+        super().__init__(f"O upload ainda não recebeu todos os bytes ({len(missing)} intervalos pendentes)")
+        self.missing = missing
+
+def _merge_range(ranges: List[List[int]], start: int, end: int) -> List[List[int]]:
+    """Insere o intervalo [start, end) em uma lista ordenada de intervalos disjuntos."""
+    merged = []
+    for current_start, current_end in ranges:
+        if current_end < start or current_start > end:
+            merged.append([current_start, current_end])
+        else:
+            start = min(start, current_start)
+            end = max(end, current_end)
+    merged.append([start, end])
+    merged.sort()
+    return merged
+
+class UploadSession:
+    """
+    Upload de um arquivo grande em partes, possivelmente enviadas em paralelo.
+
+    O arquivo de destino é pré-alocado no tamanho declarado e cada parte é
+    gravada diretamente no seu deslocamento com os.pwrite, sem arquivos
+    intermediários. Os intervalos recebidos são mantidos em um arquivo .json
+    ao lado dos dados, de modo que o cliente pode retomar o envio depois de
+    uma queda de conexão (ou de um reinício do servidor).
+    """
+
+    def __init__(
+        self,
+        session_id: str,
+        directory: str,
+        filename: str,
+        size: int,
+        file_type: str = 'fileTypeDocument',
+        received: Optional[List[List[int]]] = None,
+        state: str = 'receiving',
+        file_id: Optional[int] = None,
+        uploaded_size: int = 0,
+        sha256: Optional[str] = None,
+        updated_at: Optional[float] = None
+    ):
+        self.id = session_id
+        self.directory = directory
+        self.filename = filename
+        self.size = size
+        self.file_type = file_type
+        self.received = received or []
+        # receiving -> committing -> uploading -> completed
+        self.state = state
+        self.file_id = file_id
+        self.uploaded_size = uploaded_size
+        self.sha256 = sha256
+        self.updated_at = updated_at or time.time()
+        self._lock = threading.Lock()
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.directory, f"{self.id}.part")
+
+    @property
+    def metadata_path(self) -> str:
+        return os.path.join(self.directory, f"{self.id}.json")
+
+    @property
+    def received_bytes(self) -> int:
+        return sum(end - start for start, end in self.received)
+
+    def missing(self) -> List[Tuple[int, int]]:
+        """Intervalos [início, fim) ainda não recebidos."""
+        missing = []
+        position = 0
+        for start, end in self.received:
+            if start > position:
+                missing.append((position, start))
+            position = max(position, end)
+        if position < self.size:
+            missing.append((position, self.size))
+        return missing
+
+    def is_complete(self) -> bool:
+        return not self.missing()
+
+    def allocate(self):
+        """Cria o arquivo de destino já com o tamanho declarado."""
+        os.makedirs(self.directory, exist_ok=True)
+        fd = os.open(self.path, os.O_WRONLY | os.O_CREAT, 0o600)
+        try:
+            if hasattr(os, "posix_fallocate") and self.size:
+                try:
+                    os.posix_fallocate(fd, 0, self.size)
+                except OSError:
+                    # Sistemas de arquivos sem suporte a fallocate: arquivo esparso
+                    os.ftruncate(fd, self.size)
+            else:
+                os.ftruncate(fd, self.size)
+        finally:
+            os.close(fd)
+        self.save()
+
+    def write_chunk(self, offset: int, data: bytes):
+        """Grava uma parte no seu deslocamento e registra o intervalo recebido."""
+        if not data:
+            return
+        if self.state != 'receiving':
+            raise InvalidChunk("A sessão já foi enviada e não aceita novas partes")
+        if offset < 0 or offset + len(data) > self.size:
+            raise InvalidChunk(f"A parte [{offset}, {offset + len(data)}) excede o tamanho declarado de {self.size} bytes")
+
+        fd = os.open(self.path, os.O_WRONLY)
+        try:
+            written = 0
+            while written < len(data):
+                written += os.pwrite(fd, data[written:], offset + written)
+        finally:
+            os.close(fd)
+
+        with self._lock:
+            self.received = _merge_range(self.received, offset, offset + len(data))
+            self.updated_at = time.time()
+            self.save()
+
+    def write_stream(self, stream, offset: int, chunk_size: int = UPLOAD_CHUNK_SIZE) -> int:
+        """Grava uma parte lida de um objeto de arquivo (ex.: request.stream do Flask)."""
+        position = offset
+        while True:
+            data = stream.read(chunk_size)
+            if not data:
+                break
+            self.write_chunk(position, data)
+            position += len(data)
+        return position - offset
+
+    def compute_sha256(self, chunk_size: int = UPLOAD_CHUNK_SIZE) -> str:
+        """Calcula o hash SHA-256 do arquivo montado, usado na deduplicação de uploads."""
+        digest = hashlib.sha256()
+        with open(self.path, "rb") as data_file:
+            while True:
+                chunk = data_file.read(chunk_size)
+                if not chunk:
+                    break
+                digest.update(chunk)
+        self.sha256 = digest.hexdigest()
+        return self.sha256
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Estado da sessão, retornado pelos endpoints."""
+        return {
+            "session_id": self.id,
+            "filename": self.filename,
+            "size": self.size,
+            "file_type": self.file_type,
+            "state": self.state,
+            "received_bytes": self.received_bytes,
+            "missing": [list(interval) for interval in self.missing()],
+            "file_id": self.file_id,
+            "uploaded_size": self.uploaded_size,
+            "sha256": self.sha256
+        }
+
+    def save(self):
+        # Grava em um arquivo temporário e substitui os metadados de forma atômica
+        metadata = {
+            "filename": self.filename,
+            "size": self.size,
+            "file_type": self.file_type,
+            "received": self.received,
+            "state": self.state,
+            "file_id": self.file_id,
+            "uploaded_size": self.uploaded_size,
+            "sha256": self.sha256,
+            "updated_at": self.updated_at
+        }
+        temp_path = f"{self.metadata_path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as metadata_file:
+            json.dump(metadata, metadata_file)
+        os.replace(temp_path, self.metadata_path)
+
+    def remove(self):
+        """Remove os dados e os metadados da sessão."""
+        for path in (self.metadata_path, self.path):
+            if os.path.exists(path):
+                os.remove(path)
+
+class UploadSessionStore:
+    """
+    Sessões de upload em partes, com retomada e progresso do envio ao Telegram.
+
+    Depois do commit, o arquivo montado é enviado uma única vez com PRELIMINARY_UPLOAD_METHOD
+    e o progresso (remote.uploaded_size) é acompanhado pelas atualizações updateFile.
+    """
+
+    def __init__(
+        self,
+        directory: str = UPLOAD_SESSIONS_DIRECTORY,
+        max_size: int = MAX_SESSION_UPLOAD_SIZE,
+        ttl: int = UPLOAD_SESSION_TTL
+    ):
+        self.directory = directory
+        self.max_size = max_size
+        self.ttl = ttl
+        self._sessions: Dict[str, UploadSession] = {}
+        self._by_file_id: Dict[int, UploadSession] = {}
+        # Uploads concluídos ainda sem sessão associada: a atualização pode chegar antes da resposta do commit
+        self._early_completions: "OrderedDict[int, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._load()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def create(self, filename: str, size: int, file_type: str = 'fileTypeDocument') -> UploadSession:
+        """
+        Cria uma sessão e pré-aloca o arquivo de destino.
+
+        Raises:
+            UploadTooLarge: Se o tamanho declarado exceder max_size
+            InvalidChunk: Se o tamanho declarado for inválido
+        """
+        if size <= 0:
+            raise InvalidChunk("O tamanho do arquivo deve ser maior que zero")
+        if self.max_size and size > self.max_size:
+            raise UploadTooLarge(self.max_size)
+
+        self.expire()
+        session = UploadSession(
+            uuid.uuid4().hex,
+            self.directory,
+            os.path.basename(filename or "") or "file",
+            size,
+            file_type
+        )
+        session.allocate()
+        with self._lock:
+            self._sessions[session.id] = session
+        return session
+
+    def get(self, session_id: str) -> UploadSession:
+        """
+        Raises:
+            UploadSessionNotFound: Se a sessão não existir
+        """
+        with self._lock:
+            session = self._sessions.get(session_id)
+        if session is None:
+            raise UploadSessionNotFound(f"Sessão de upload {session_id} não encontrada")
+        return session
+
+    def remove(self, session_id: str):
+        """Cancela uma sessão, removendo os dados recebidos."""
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+            if session is not None and session.file_id is not None:
+                self._by_file_id.pop(session.file_id, None)
+        if session is None:
+            raise UploadSessionNotFound(f"Sessão de upload {session_id} não encontrada")
+        session.remove()
+
+    def begin_commit(self, session: UploadSession) -> bool:
+        """
+        Marca a sessão como em commit, impedindo novas partes e commits simultâneos.
+        Retorna False se a sessão já foi (ou está sendo) enviada.
+
+        Raises:
+            UploadIncomplete: Se ainda faltarem bytes
+        """
+        with session._lock:
+            if session.state != 'receiving':
+                return False
+            missing = session.missing()
+            if missing:
+                raise UploadIncomplete(missing)
+            session.state = 'committing'
+            return True
+
+    def abort_commit(self, session: UploadSession):
+        """Devolve a sessão ao estado de recebimento após uma falha no commit."""
+        with session._lock:
+            if session.state == 'committing':
+                session.state = 'receiving'
+
+    def start_upload(self, session: UploadSession, file: Dict[str, Any], deduplicated: bool = False):
+        """Associa a sessão ao arquivo criado na TDLib depois do commit."""
+        with self._lock:
+            session.file_id = file.get("id")
+            session.state = 'uploading'
+            if session.file_id is not None:
+                self._by_file_id[session.file_id] = session
+            early_size = self._early_completions.pop(session.file_id, None)
+        session.updated_at = time.time()
+        if deduplicated:
+            self._complete(session, session.size)
+        elif early_size is not None:
+            self._complete(session, early_size or session.size)
+        else:
+            # O upload pode já estar concluído quando a resposta chega
+            self.handle_update({"file": file})
+            if session.state == 'uploading':
+                session.save()
+
+    def handle_update(self, update: Dict[str, Any]):
+        """Atualiza o progresso do envio com as atualizações updateFile."""
+        file = update.get("file", {})
+        remote = file.get("remote", {})
+        with self._lock:
+            session = self._by_file_id.get(file.get("id"))
+            if session is None:
+                if remote.get("is_uploading_completed") and file.get("id") is not None:
+                    self._early_completions[file["id"]] = file.get("size") or 0
+                    while len(self._early_completions) > 1000:
+                        self._early_completions.popitem(last=False)
+                return
+
+        if remote.get("is_uploading_completed"):
+            self._complete(session, file.get("size") or session.size)
+        else:
+            session.uploaded_size = remote.get("uploaded_size", session.uploaded_size)
+            session.updated_at = time.time()
+
+    def expire(self) -> int:
+        """Remove as sessões sem atividade há mais de ttl segundos."""
+        if not self.ttl:
+            return 0
+        deadline = time.time() - self.ttl
+        with self._lock:
+            expired = [session for session in self._sessions.values() if session.updated_at < deadline]
+            for session in expired:
+                del self._sessions[session.id]
+                if session.file_id is not None:
+                    self._by_file_id.pop(session.file_id, None)
+        for session in expired:
+            session.remove()
+        return len(expired)
+
+    def stats(self) -> Dict[str, Any]:
+        """Retorna os contadores das sessões."""
+        with self._lock:
+            sessions = list(self._sessions.values())
+        return {
+            "sessions": len(sessions),
+            "receiving": sum(1 for session in sessions if session.state == 'receiving'),
+            "uploading": sum(1 for session in sessions if session.state == 'uploading'),
+            "received_bytes": sum(session.received_bytes for session in sessions)
+        }
+
+    def _complete(self, session: UploadSession, uploaded_size: int):
+        session.state = 'completed'
+        session.uploaded_size = uploaded_size
+        session.updated_at = time.time()
+        session.save()
+        # O arquivo montado não é mais necessário depois que a TDLib concluiu o envio
+        if os.path.exists(session.path):
+            os.remove(session.path)
+
+    def _load(self):
+        if not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            session_id = name[:-len(".json")]
+            try:
+                with open(os.path.join(self.directory, name), "r", encoding="utf-8") as metadata_file:
+                    metadata = json.load(metadata_file)
+                session = UploadSession(session_id, self.directory, **metadata)
+            except (OSError, ValueError, TypeError) as e:
+                logger.warning(f"Não foi possível ler a sessão de upload {session_id}: {e}")
+                continue
+            # Um envio interrompido pelo reinício é refeito com um novo commit
+            if session.state in ('committing', 'uploading'):
+                session.state = 'receiving'
+                session.file_id = None
+            self._sessions[session_id] = session
+
+async def write_chunks(
+    session: UploadSession,
+    offset: int,
+    chunks: AsyncIterator[bytes],
+    chunk_size: int = UPLOAD_CHUNK_SIZE
+) -> int:
+    """
+    Grava uma parte recebida como fluxo assíncrono (ex.: request.stream() do
+    Starlette), acumulando blocos de chunk_size gravados fora do loop de eventos.
+    """
+    loop = asyncio.get_running_loop()
+    position = offset
+    buffer = bytearray()
+    async for data in chunks:
+        buffer += data
+        if len(buffer) >= chunk_size:
+            await loop.run_in_executor(None, session.write_chunk, position, bytes(buffer))
+            position += len(buffer)
+            buffer.clear()
+    if buffer:
+        await loop.run_in_executor(None, session.write_chunk, position, bytes(buffer))
+        position += len(buffer)
+    return position - offset
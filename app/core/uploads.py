@@ -0,0 +1,272 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger("tdlib")
+
+MAX_UPLOAD_SIZE = int(os.environ.get("MAX_UPLOAD_SIZE", str(100 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = int(os.environ.get("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+TD_FILES_DIRECTORY = os.environ.get("TD_FILES_DIRECTORY", "./td_files")
+TD_DATABASE_DIRECTORY = os.environ.get("TD_DATABASE_DIRECTORY", "./td_db")
+UPLOAD_INDEX_PATH = os.environ.get("UPLOAD_INDEX_PATH", os.path.join(TD_DATABASE_DIRECTORY, "uploads.json"))
+# Método da TDLib que inicia o envio antecipado de um arquivo (uploadFile em versões anteriores à 1.8)
+PRELIMINARY_UPLOAD_METHOD = os.environ.get("PRELIMINARY_UPLOAD_METHOD", "preliminaryUploadFile")
+CANCEL_UPLOAD_METHOD = (
+    "cancelPreliminaryUploadFile" if PRELIMINARY_UPLOAD_METHOD == "preliminaryUploadFile" else "cancelUploadFile"
+)
+UPLOAD_FILE_TYPES = frozenset({
+    "fileTypeAnimation",
+    "fileTypeAudio",
+    "fileTypeDocument",
+    "fileTypePhoto",
+    "fileTypeSticker",
+    "fileTypeVideo",
+    "fileTypeVideoNote",
+    "fileTypeVoiceNote",
+})
+
+class UploadTooLarge(Exception):
+    """O arquivo enviado excede o tamanho máximo permitido."""
+
+    def __init__(self, max_size: int):
+        super().__init__(f"O arquivo excede o tamanho máximo permitido de {max_size} bytes")
+        self.max_size = max_size
+
+class SavedUpload(NamedTuple):
+    path: str
+    size: int
+    sha256: str
+
+def temp_directory() -> str:
+    """Retorna (criando se necessário) o diretório de arquivos temporários de upload."""
+    directory = os.path.join(TD_FILES_DIRECTORY, "temp")
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+def unique_filename(filename: Optional[str]) -> str:
+    """Gera um nome único para o arquivo, preservando o nome original sem diretórios."""
+    name = os.path.basename(filename or "")
+    return f"{uuid.uuid4()}_{name}" if name else str(uuid.uuid4())
+
+def input_file(file_id: Optional[int] = None, path: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Monta o InputFile de uma mensagem: um arquivo já registrado na TDLib
+    (ex.: com envio antecipado em andamento) ou um caminho local.
+    """
+    if file_id:
+        return {"@type": "inputFileId", "id": int(file_id)}
+    return {"@type": "inputFileLocal", "path": path}
+
+async def save_upload(
+    upload,
+    path: str,
+    max_size: int = MAX_UPLOAD_SIZE,
+    chunk_size: int = UPLOAD_CHUNK_SIZE
+) -> SavedUpload:
+    """
+    Grava um UploadFile em disco em blocos de tamanho fixo.
+
+    O tamanho é verificado a cada bloco e o hash SHA-256 é calculado durante a
+    gravação, de modo que o uso de memória não depende do tamanho do arquivo.
+    Se o limite for excedido, o arquivo parcial é removido e UploadTooLarge é lançada.
+    """
+    # Usado apenas pela API FastAPI; o servidor Flask não depende de aiofiles
+    import aiofiles
+
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(path, 'wb') as out_file:
+            while True:
+                chunk = await upload.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if max_size and size > max_size:
+                    raise UploadTooLarge(max_size)
+                digest.update(chunk)
+                await out_file.write(chunk)
+    except BaseException:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+
+    return SavedUpload(path, size, digest.hexdigest())
+
+def save_stream(
+    stream,
+    path: str,
+    max_size: int = MAX_UPLOAD_SIZE,
+    chunk_size: int = UPLOAD_CHUNK_SIZE
+) -> SavedUpload:
+    """
+    Equivalente síncrono de save_upload para objetos de arquivo (ex.: FileStorage.stream do Flask).
+    """
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(path, 'wb') as out_file:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if max_size and size > max_size:
+                    raise UploadTooLarge(max_size)
+                digest.update(chunk)
+                out_file.write(chunk)
+    except BaseException:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+
+    return SavedUpload(path, size, digest.hexdigest())
+
+class UploadStore:
+    """
+    Índice de uploads endereçado pelo conteúdo (SHA-256).
+
+    Quando o upload de um arquivo termina, o id remoto informado pela TDLib é
+    associado ao hash do conteúdo e gravado em disco. Um novo envio com o mesmo
+    conteúdo pode então reutilizar o arquivo remoto (getRemoteFile /
+    inputFileRemote) em vez de ser enviado novamente.
+
+    O índice é gravado (e os arquivos temporários removidos) por uma thread
+    própria, fora de quem despacha as atualizações.
+    """
+
+    def __init__(self, index_path: str = UPLOAD_INDEX_PATH):
+        self.index_path = index_path
+        self.hits = 0
+        self.misses = 0
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        # Uploads em andamento: file_id -> (sha256, tamanho, arquivo temporário a remover)
+        self._pending: Dict[int, Tuple[str, int, Optional[str]]] = {}
+        # Uploads concluídos antes de serem acompanhados (a atualização pode chegar antes da resposta)
+        self._early_completions: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Uma única thread mantém as gravações em ordem; _save_pending agrupa as alterações seguidas
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="upload-index")
+        self._save_pending = False
+        self._load()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def lookup(self, sha256: str) -> Optional[Dict[str, Any]]:
+        """Retorna o registro do conteúdo já enviado, se existir."""
+        with self._lock:
+            entry = self._entries.get(sha256)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return dict(entry)
+
+    def track(self, file_id: int, sha256: str, size: int, cleanup_path: Optional[str] = None):
+        """
+        Acompanha um upload iniciado com PRELIMINARY_UPLOAD_METHOD até que a TDLib informe o id remoto.
+        O arquivo em cleanup_path é removido quando o upload terminar.
+        """
+        with self._lock:
+            self._pending[file_id] = (sha256, size, cleanup_path)
+            remote = self._early_completions.pop(file_id, None)
+        if remote is not None:
+            self.handle_update({"file": {"id": file_id, "remote": remote}})
+
+    def untrack(self, file_id: int):
+        """Deixa de acompanhar um upload cancelado, removendo o arquivo temporário associado."""
+        with self._lock:
+            pending = self._pending.pop(file_id, None)
+        if pending is not None and pending[2] and os.path.exists(pending[2]):
+            os.remove(pending[2])
+
+    def forget(self, sha256: str):
+        """Remove um conteúdo do índice (ex.: arquivo remoto que deixou de ser válido)."""
+        with self._lock:
+            if self._entries.pop(sha256, None) is not None:
+                self._schedule_save()
+
+    def handle_update(self, update: Dict[str, Any]):
+        """Registra o id remoto quando uma atualização updateFile indica upload concluído."""
+        file = update.get("file", {})
+        remote = file.get("remote", {})
+        if not remote.get("is_uploading_completed") or not remote.get("id"):
+            return
+
+        with self._lock:
+            pending = self._pending.pop(file.get("id"), None)
+            if pending is None:
+                if file.get("id") is not None:
+                    self._early_completions[file["id"]] = remote
+                    while len(self._early_completions) > 1000:
+                        self._early_completions.popitem(last=False)
+                return
+            sha256, size, cleanup_path = pending
+            self._entries[sha256] = {
+                "remote_id": remote["id"],
+                "unique_id": remote.get("unique_id"),
+                "size": size
+            }
+            self._schedule_save()
+
+        if cleanup_path:
+            self._writer.submit(_remove_file, cleanup_path)
+
+    def stats(self) -> Dict[str, Any]:
+        """Retorna os contadores do índice."""
+        return {
+            "size": len(self._entries),
+            "pending": len(self._pending),
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+    def _load(self):
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as index_file:
+                self._entries = json.load(index_file)
+        except FileNotFoundError:
+            self._entries = {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Não foi possível ler o índice de uploads {self.index_path}: {e}")
+            self._entries = {}
+
+    def flush(self, timeout: Optional[float] = None):
+        """Aguarda a gravação do índice e as remoções já agendadas."""
+        self._writer.submit(lambda: None).result(timeout)
+
+    def _schedule_save(self):
+        # Chamado com self._lock adquirido
+        if not self._save_pending:
+            self._save_pending = True
+            self._writer.submit(self._save)
+
+    def _save(self):
+        with self._lock:
+            self._save_pending = False
+            entries = dict(self._entries)
+        # Grava em um arquivo temporário e substitui o índice de forma atômica
+        try:
+            directory = os.path.dirname(self.index_path) or "."
+            os.makedirs(directory, exist_ok=True)
+            temp_path = f"{self.index_path}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as index_file:
+                json.dump(entries, index_file)
+            os.replace(temp_path, self.index_path)
+        except OSError as e:
+            logger.warning(f"Não foi possível gravar o índice de uploads {self.index_path}: {e}")
+
+def _remove_file(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.warning(f"Não foi possível remover o arquivo temporário {path}: {e}")
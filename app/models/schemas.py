@@ -103,4 +103,27 @@ class CodeVerificationRequest(BaseModel):
     code: str = Field(..., description="Código de verificação recebido por SMS ou Telegram")
     
 class PasswordVerificationRequest(BaseModel):
-    password: str = Field(..., description="Senha da conta Telegram") 
\ No newline at end of file
+    password: str = Field(..., description="Senha da conta Telegram")
+
+
+class BatchCall(BaseModel):
+    method: str = Field(..., description="Nome do método da TDLib (ex: getChat, getUser, getMessage)")
+    params: Dict[str, Any] = Field(default_factory=dict, description="Parâmetros do método")
+
+class BatchRequest(BaseModel):
+    calls: List[BatchCall] = Field(..., description="Chamadas a executar, na ordem em que os resultados serão retornados")
+
+class UploadSessionCreate(BaseModel):
+    filename: str = Field(..., description="Nome original do arquivo")
+    size: int = Field(..., gt=0, description="Tamanho total do arquivo em bytes")
+    file_type: str = Field("fileTypeDocument", description="Tipo do arquivo na TDLib (ex: fileTypeDocument, fileTypeVideo)")
+
+class BulkMessage(BaseModel):
+    chat_id: int = Field(..., description="ID do chat de destino")
+    text: Optional[str] = Field(None, description="Texto da mensagem")
+    input_message_content: Optional[Dict[str, Any]] = Field(None, description="Conteúdo completo da TDLib, usado no lugar de text")
+    reply_to_message_id: int = Field(0, description="ID da mensagem a responder")
+    disable_notification: bool = Field(False, description="Envia a mensagem silenciosamente")
+
+class BulkSendRequest(BaseModel):
+    messages: List[BulkMessage] = Field(..., description="Mensagens a enviar; a ordem é preservada dentro de cada chat")
@@ -5,8 +5,14 @@ import asyncio
 import json
 import os
 import logging
+import threading
 import time
 
+from app.core.components import ClientComponents
+from app.core.ratelimit import (
+    ERROR_FLOOD, ERROR_PERMANENT, RETRY_MAX_ATTEMPTS, backoff_delay, classify_error, retry_after
+)
+
 # Tentativa de importar a biblioteca telegram-client
 try:
     from telegram.client import Telegram
@@ -26,18 +32,21 @@ except ImportError:
 else:
     USING_PYTDLIB = False
 
-# Configurar o logger
+# Configurar o logger (o diretório de logs não faz parte do repositório)
+log_file = os.environ.get("LOG_FILE", "./logs/telegram_api.log")
+if os.path.dirname(log_file):
+    os.makedirs(os.path.dirname(log_file), exist_ok=True)
 logging.basicConfig(
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", 
     level=logging.INFO,
     handlers=[
         logging.StreamHandler(),
-        logging.FileHandler(os.environ.get("LOG_FILE", "./logs/telegram_api.log"), mode='a')
+        logging.FileHandler(log_file, mode='a')
     ]
 )
 logger = logging.getLogger(__name__)
 
-class TDLibService:
+class TDLibService(ClientComponents):
     """
     Serviço para interação com a TDLib
     """
@@ -68,6 +77,104 @@ class TDLibService:
         # Verificar se temos as credenciais necessárias
         if not self.api_id or not self.api_hash:
             logger.warning("API_ID e/ou API_HASH não configurados. O cliente TDLib não poderá ser inicializado.")
+        
+        # Loop de eventos compartilhado, executado em uma thread dedicada
+        self.loop = None
+        self._loop_thread = None
+        self._owns_loop = False
+        self._loop_lock = threading.Lock()
+        self._init_lock = None
+        
+        # Componentes compartilhados com o TDLibWrapper, criados no primeiro acesso
+        self._init_components(
+            lambda method, parameters: self.execute(method, parameters),
+            lambda method, parameters: self.execute_once(method, parameters),
+            self.submit
+        )
+    
+    def start_loop(self):
+        """
+        Inicia (uma única vez) o loop de eventos compartilhado em uma thread de fundo
+        
+        Returns:
+            asyncio.AbstractEventLoop: Loop de eventos em execução
+        """
+        with self._loop_lock:
+            if self.loop is not None and self._loop_thread.is_alive():
+                return self.loop
+            
+            loop = asyncio.new_event_loop()
+            started = threading.Event()
+            
+            def run_loop():
+                asyncio.set_event_loop(loop)
+                loop.call_soon(started.set)
+                loop.run_forever()
+            
+            self._loop_thread = threading.Thread(target=run_loop, name="tdlib-loop", daemon=True)
+            self._loop_thread.start()
+            started.wait()
+            self.loop = loop
+            self._owns_loop = True
+            logger.info("Loop de eventos da TDLib iniciado")
+            return self.loop
+    
+    def attach_loop(self, loop=None):
+        """
+        Adota um loop de eventos já em execução (por exemplo, o loop do servidor ASGI)
+        como loop compartilhado do serviço
+        
+        Args:
+            loop (asyncio.AbstractEventLoop, opcional): Loop a ser adotado. Se omitido,
+                usa o loop em execução na thread atual
+                
+        Returns:
+            asyncio.AbstractEventLoop: Loop efetivamente usado pelo serviço
+        """
+        if loop is None:
+            loop = asyncio.get_running_loop()
+        
+        with self._loop_lock:
+            if self.loop is not None and self.loop is not loop and self._loop_thread.is_alive():
+                logger.warning("O serviço TDLib já possui um loop de eventos; o loop informado será ignorado")
+                return self.loop
+            
+            self.loop = loop
+            self._loop_thread = threading.current_thread()
+            self._owns_loop = False
+            return self.loop
+    
+    def submit(self, coro):
+        """
+        Agenda uma corrotina no loop compartilhado de forma thread-safe
+        
+        Args:
+            coro (coroutine): Corrotina a ser executada
+            
+        Returns:
+            concurrent.futures.Future: Future com o resultado da corrotina
+        """
+        loop = self.start_loop()
+        return asyncio.run_coroutine_threadsafe(coro, loop)
+    
+    def run(self, coro, timeout=None):
+        """
+        Executa uma corrotina no loop compartilhado e aguarda o resultado
+        
+        Deve ser chamado a partir de threads que não sejam a do loop
+        (por exemplo, as threads de trabalho do servidor WSGI).
+        
+        Args:
+            coro (coroutine): Corrotina a ser executada
+            timeout (float, opcional): Tempo máximo de espera em segundos
+            
+        Returns:
+            Resultado da corrotina
+        """
+        if self._loop_thread is not None and threading.current_thread() is self._loop_thread:
+            coro.close()
+            raise RuntimeError("TDLibService.run não pode ser chamado a partir da thread do loop")
+        return self.submit(coro).result(timeout)
     
     async def initialize(self):
         """
@@ -112,6 +219,7 @@ class TDLibService:
         try:
             # Criar o cliente
             self.client = Telegram(**client_parameters)
+            self._register_update_handlers()
             
             # Iniciar o cliente
             await self.client.start()
@@ -132,14 +240,55 @@ class TDLibService:
             
             self.initialized = True
             logger.info("Cliente TDLib inicializado com sucesso")
+            
+            await self._start_components()
         except Exception as e:
             logger.error(f"Erro ao inicializar cliente TDLib: {e}")
             raise
     
+    def _register_update_handlers(self):
+        """
+        Registra os caches e o índice de uploads como handlers de atualização do cliente, quando suportado
+        """
+        add_update_handler = getattr(self.client, 'add_update_handler', None)
+        if add_update_handler is None:
+            logger.warning("Cliente TDLib não suporta handlers de atualização. Os caches dependerão apenas do TTL.")
+            return
+        
+        for update_type, handler, inline in self._component_update_handlers():
+            add_update_handler(update_type, handler)
+    
+    def iterate(self, async_iterator, timeout=None):
+        """
+        Consome um iterador assíncrono no loop compartilhado a partir de uma thread comum
+        
+        Permite usar geradores assíncronos (como stream_file) em respostas de
+        streaming do Flask, que esperam um iterador síncrono.
+        
+        Args:
+            async_iterator: Iterador assíncrono a ser consumido
+            timeout (float, opcional): Tempo máximo de espera por item
+            
+        Yields:
+            Itens produzidos pelo iterador
+        """
+        try:
+            while True:
+                try:
+                    yield self.run(async_iterator.__anext__(), timeout)
+                except StopAsyncIteration:
+                    return
+        finally:
+            if hasattr(async_iterator, 'aclose'):
+                self.run(async_iterator.aclose(), timeout)
+    
     async def execute(self, method, parameters=None):
         """
         Executa um método da TDLib
         
+        Chamadas idênticas simultâneas a métodos somente leitura (IDEMPOTENT_METHODS)
+        compartilham uma única execução.
+        
         Args:
             method (str): Nome do método a ser executado
             parameters (dict, opcional): Parâmetros do método
@@ -147,37 +296,107 @@ class TDLibService:
         Returns:
             dict: Resultado da execução do método
         """
-        if not self.initialized:
-            try:
-                await self.initialize()
-            except Exception as e:
-                logger.error(f"Não foi possível inicializar o cliente TDLib: {e}")
-                raise Exception(f"Cliente TDLib não inicializado: {e}")
+        await self._ensure_initialized()
+        
+        if not parameters:
+            parameters = {}
+        
+        return await self.single_flight.call(
+            method,
+            parameters,
+            lambda: self._execute_with_retries(method, parameters)
+        )
+    
+    async def execute_once(self, method, parameters=None):
+        """
+        Executa um método da TDLib uma única vez, sem novas tentativas
+        
+        Usado pelas filas com política própria de novas tentativas (envio em
+        massa e fila persistente), que aguardam as esperas do controle de
+        FLOOD_WAIT compartilhado antes de chamar, sem ocupar vagas de envio.
+        
+        Args:
+            method (str): Nome do método a ser executado
+            parameters (dict, opcional): Parâmetros do método
+            
+        Returns:
+            dict: Resultado da execução do método
+        """
+        await self._ensure_initialized()
         
         if not parameters:
             parameters = {}
         
-        max_retries = 3
-        retry_count = 0
+        return await self.client.call_method(method, parameters)
+    
+    async def _ensure_initialized(self):
+        """
+        Inicializa o cliente na primeira chamada
+        """
+        if self.initialized:
+            return
+        # Evita inicializações concorrentes quando várias requisições chegam juntas
+        if self._init_lock is None:
+            self._init_lock = asyncio.Lock()
+        async with self._init_lock:
+            if not self.initialized:
+                try:
+                    await self.initialize()
+                except Exception as e:
+                    logger.error(f"Não foi possível inicializar o cliente TDLib: {e}")
+                    raise Exception(f"Cliente TDLib não inicializado: {e}")
+    
+    async def _execute_with_retries(self, method, parameters):
+        """
+        Executa um método da TDLib, tentando novamente conforme o tipo de erro
+        
+        Erros de requisição (4xx) falham imediatamente. Um FLOOD_WAIT (429) é
+        registrado no controle compartilhado, de modo que as demais requisições
+        para o mesmo chat (ou método) também aguardem a espera pedida, e a
+        chamada é repetida depois dela. Os demais erros são repetidos com
+        backoff exponencial com jitter.
+        
+        Args:
+            method (str): Nome do método a ser executado
+            parameters (dict): Parâmetros do método
+            
+        Returns:
+            dict: Resultado da execução do método
+        """
+        attempt = 0
         
-        while retry_count < max_retries:
+        while True:
+            await self.flood_control.wait(method, parameters)
+            attempt += 1
             try:
-                result = await self.client.call_method(method, parameters)
-                return result
+                return await self.client.call_method(method, parameters)
             except Exception as e:
-                retry_count += 1
-                if retry_count >= max_retries:
-                    logger.error(f"Erro ao executar método {method} após {max_retries} tentativas: {e}")
+                kind = classify_error(e)
+                if kind == ERROR_PERMANENT:
+                    logger.error(f"Erro ao executar método {method}: {e}")
                     raise
                 
-                logger.warning(f"Erro ao executar método {method} (tentativa {retry_count}/{max_retries}): {e}")
-                # Esperar um pouco antes de tentar novamente
-                await asyncio.sleep(1)
+                if kind == ERROR_FLOOD:
+                    wait = retry_after(e)
+                    self.flood_control.penalize(method, parameters, wait if wait is not None else backoff_delay(attempt))
+                
+                if attempt >= RETRY_MAX_ATTEMPTS or self.flood_control.remaining(method, parameters) > self.flood_control.max_wait:
+                    logger.error(f"Erro ao executar método {method} após {attempt} tentativas: {e}")
+                    raise
+                
+                if kind == ERROR_FLOOD:
+                    # A próxima tentativa aguarda em flood_control.wait(), junto com as demais requisições do chat
+                    logger.warning(f"FLOOD_WAIT em {method} (tentativa {attempt}/{RETRY_MAX_ATTEMPTS}): {e}")
+                else:
+                    delay = backoff_delay(attempt)
+                    logger.warning(f"Erro ao executar método {method} (tentativa {attempt}/{RETRY_MAX_ATTEMPTS}), nova tentativa em {delay:.1f}s: {e}")
+                    await asyncio.sleep(delay)
 
     async def close(self):
         """
         Fecha a conexão com a TDLib
         """
+        self._stop_components()
         if self.client:
             try:
                 await self.client.stop()
@@ -186,6 +405,25 @@ class TDLibService:
             except Exception as e:
                 logger.error(f"Erro ao encerrar cliente TDLib: {e}")
                 raise
+    
+    def stop_loop(self):
+        """
+        Encerra o loop de eventos compartilhado
+        """
+        with self._loop_lock:
+            if self.loop is None:
+                return
+            if not self._owns_loop:
+                # O loop pertence ao servidor ASGI, que é responsável por encerrá-lo
+                self.loop = None
+                self._loop_thread = None
+                return
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._loop_thread.join(timeout=5)
+            self.loop.close()
+            self.loop = None
+            self._loop_thread = None
+            logger.info("Loop de eventos da TDLib encerrado")
 
 # Criar a instância global do serviço
 tdlib_service = TDLibService() 
\ No newline at end of file
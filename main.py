@@ -3,7 +3,6 @@
 
 import os
 import sys
-import asyncio
 import time
 import threading
 from app import app
@@ -11,18 +10,14 @@ from waitress import serve
 from app.services.tdlib_service import tdlib_service
 
 def initialize_tdlib():
-    """Inicializa o cliente TDLib em uma thread separada"""
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
+    """Inicializa o cliente TDLib no loop compartilhado do serviço"""
     try:
         print("Inicializando cliente TDLib...")
-        loop.run_until_complete(tdlib_service.initialize())
+        tdlib_service.run(tdlib_service.initialize())
         print("Cliente TDLib inicializado com sucesso!")
     except Exception as e:
         print(f"Erro ao inicializar cliente TDLib: {e}")
         print("A aplicação continuará funcionando, mas as funcionalidades do Telegram não estarão disponíveis.")
-    finally:
-        loop.close()
 
 def create_directories():
     """Cria os diretórios necessários para a aplicação"""
@@ -50,22 +45,31 @@ if __name__ == "__main__":
     # Criar diretórios necessários
     create_directories()
 
-    # Inicializar TDLib em uma thread separada
-    td_thread = threading.Thread(target=initialize_tdlib)
-    td_thread.daemon = True
-    td_thread.start()
-    print("Thread do cliente TDLib iniciada")
-
-    # Aguardar um pouco para que a inicialização da TDLib comece
-    time.sleep(1)
-
     # Configurar o ambiente
     debug = os.environ.get("DEBUG", "false").lower() == "true"
     host = os.environ.get("HOST", "0.0.0.0")
     port = int(os.environ.get("PORT", 8000))
+    server_mode = os.environ.get("SERVER_MODE", "wsgi").lower()
+
+    # No modo ASGI a TDLib é inicializada no loop do próprio servidor
+    if server_mode != "asgi":
+        # Inicializar TDLib em uma thread separada
+        td_thread = threading.Thread(target=initialize_tdlib)
+        td_thread.daemon = True
+        td_thread.start()
+        print("Thread do cliente TDLib iniciada")
+
+        # Aguardar um pouco para que a inicialização da TDLib comece
+        time.sleep(1)
 
     try:
-        if debug:
+        if server_mode == "asgi":
+            # Modo assíncrono: as views rodam como corrotinas em um único loop
+            import uvicorn
+            from app.asgi import asgi_app
+            print(f"Iniciando servidor em modo ASGI em http://{host}:{port}")
+            uvicorn.run(asgi_app, host=host, port=port, log_level="debug" if debug else "info")
+        elif debug:
             # Modo de desenvolvimento
             print(f"Iniciando servidor em modo de desenvolvimento em http://{host}:{port}")
             app.run(debug=True, host=host, port=port)
@@ -80,4 +84,5 @@ if __name__ == "__main__":
         print(f"Erro ao iniciar servidor: {e}")
         sys.exit(1)
     finally:
+        tdlib_service.stop_loop()
         print("Servidor encerrado") 
\ No newline at end of file
@@ -0,0 +1,10 @@
+import os
+import tempfile
+
+# Importar qualquer módulo de app.* importa app/__init__.py, que configura o log
+# e o serviço TDLib: os diretórios de dados e de log apontam para uma pasta temporária
+_data_directory = tempfile.mkdtemp(prefix="telegram-api-tests-")
+os.environ.setdefault("LOG_FILE", os.path.join(_data_directory, "logs", "telegram_api.log"))
+os.environ.setdefault("TD_DATABASE_DIRECTORY", os.path.join(_data_directory, "td_db"))
+os.environ.setdefault("TD_FILES_DIRECTORY", os.path.join(_data_directory, "td_files"))
+os.environ.setdefault("UPLOAD_FOLDER", os.path.join(_data_directory, "uploads"))
@@ -0,0 +1,46 @@
+import pytest
+
+from app.core.downloads import RangeNotSatisfiable, etag_matches, parse_range
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", (0, 99)),
+    ("bytes=100-", (100, 999)),
+    ("bytes=-100", (900, 999)),
+    ("bytes=-5000", (0, 999)),
+    ("bytes=900-5000", (900, 999)),
+    ("bytes=5-5", (5, 5)),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, 1000) == expected
+
+@pytest.mark.parametrize("header", [
+    None,
+    "",
+    "items=0-10",
+    "bytes=0-10,20-30",
+    "bytes=abc-",
+])
+def test_parse_range_ignored(header):
+    # O arquivo inteiro é enviado
+    assert parse_range(header, 1000) is None
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=50-10", "bytes=-0"])
+def test_parse_range_not_satisfiable(header):
+    with pytest.raises(RangeNotSatisfiable) as info:
+        parse_range(header, 1000)
+    assert info.value.size == 1000
+
+@pytest.mark.parametrize("header, expected", [
+    ('"abc-10"', True),
+    ('W/"abc-10"', True),
+    ('"other", "abc-10"', True),
+    ("*", True),
+    ('"other"', False),
+    (None, False),
+    ("", False),
+])
+def test_etag_matches(header, expected):
+    assert etag_matches(header, "abc-10") is expected
+
+def test_etag_matches_without_etag():
+    assert not etag_matches("*", None)
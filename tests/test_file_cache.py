@@ -0,0 +1,83 @@
+import asyncio
+import os
+
+from app.core.file_cache import FileCache
+
+def _file(file_id, path, size=100):
+    return {
+        "id": file_id,
+        "size": size,
+        "local": {"path": path, "downloaded_size": size, "is_downloading_completed": True}
+    }
+
+def _cache(tmp_path, max_bytes, submitted):
+    def submit(coro):
+        submitted.append(coro)
+        coro.close()
+
+    async def delete(file_id):
+        pass
+
+    return FileCache(
+        delete,
+        submit,
+        max_bytes=max_bytes,
+        index_path=str(tmp_path / "file_cache.json"),
+        directory=str(tmp_path / "files"),
+        save_delay=60
+    )
+
+def test_select_victims_skips_pinned_files_in_lru_order(tmp_path):
+    submitted = []
+    cache = _cache(tmp_path, 250, submitted)
+    cache.pin(1)
+    for file_id in (1, 2, 3, 4):
+        cache.record_access(_file(file_id, str(tmp_path / "files" / f"{file_id}.jpg")))
+
+    assert cache.total_bytes == 400
+    assert submitted, "a remoção deve ser agendada ao exceder o orçamento"
+    # 150 bytes acima do orçamento: o arquivo 1 está fixado, então saem 2 e 3
+    assert cache._select_victims() == [(2, 100), (3, 100)]
+    # Uma segunda chamada não escolhe os arquivos que já estão sendo removidos
+    assert cache._select_victims() == []
+    cache.flush()
+
+def test_select_victims_follows_recent_access(tmp_path):
+    cache = _cache(tmp_path, 250, [])
+    for file_id in (1, 2, 3):
+        cache.record_access(_file(file_id, str(tmp_path / "files" / f"{file_id}.jpg")))
+    # O acesso ao arquivo 1 o torna o mais usado recentemente
+    cache.record_access(_file(1, str(tmp_path / "files" / "1.jpg")))
+
+    assert cache._select_victims() == [(2, 100)]
+    cache.flush()
+
+def test_evict_removes_victims_and_keeps_pins(tmp_path):
+    deleted = []
+    cache = _cache(tmp_path, 100, [])
+
+    async def delete(file_id):
+        deleted.append(file_id)
+
+    cache._delete = delete
+    cache.pin(2)
+    for file_id in (1, 2, 3):
+        cache.record_access(_file(file_id, str(tmp_path / "files" / f"{file_id}.jpg")))
+
+    assert asyncio.run(cache.evict()) == [1, 3]
+    assert deleted == [1, 3]
+    assert cache.total_bytes == 100
+    assert cache.is_pinned(2)
+
+    # Os arquivos fixados são preservados no índice
+    cache.flush()
+    reloaded = _cache(tmp_path, 100, [])
+    assert reloaded.is_pinned(2)
+    assert reloaded.total_bytes == 100
+
+def test_uploads_in_progress_are_not_recorded(tmp_path):
+    cache = _cache(tmp_path, 100, [])
+    cache.record_access(_file(1, os.path.join(str(tmp_path / "files"), "temp", "upload.bin")))
+
+    assert len(cache) == 0
+    assert cache.total_bytes == 0
@@ -0,0 +1,54 @@
+import sqlite3
+
+import pytest
+
+from app.core.message_store import content_text, fts_query
+
+@pytest.mark.parametrize("text, expected", [
+    ("ola", '"ola"*'),
+    ("ola mundo", '"ola" "mundo"*'),
+    ("  muitos   espaços ", '"muitos" "espaços"*'),
+    ('diz "oi"', '"diz" """oi"""*'),
+    ("", ""),
+    ("   ", ""),
+])
+def test_fts_query(text, expected):
+    assert fts_query(text) == expected
+
+def _fts_connection():
+    connection = sqlite3.connect(":memory:")
+    try:
+        connection.execute("CREATE VIRTUAL TABLE docs USING fts5(text, tokenize='unicode61 remove_diacritics 2')")
+    except sqlite3.OperationalError:
+        connection.close()
+        pytest.skip("SQLite sem suporte a FTS5")
+    connection.executemany("INSERT INTO docs (text) VALUES (?)", [
+        ("reunião amanhã às 10h",),
+        ("relatório AND orçamento (final)",),
+        ("nada a ver",),
+    ])
+    return connection
+
+@pytest.mark.parametrize("text, expected", [
+    ("reuniao", ["reunião amanhã às 10h"]),
+    ("reun", ["reunião amanhã às 10h"]),
+    ("amanhã reuni", ["reunião amanhã às 10h"]),
+    # Operadores e pontuação do FTS5 são tratados como texto
+    ("AND (final", ["relatório AND orçamento (final)"]),
+    ('"orçamento', ["relatório AND orçamento (final)"]),
+    ("inexistente", []),
+])
+def test_fts_query_matches_in_sqlite(text, expected):
+    connection = _fts_connection()
+    rows = connection.execute("SELECT text FROM docs WHERE docs MATCH ?", (fts_query(text),)).fetchall()
+    connection.close()
+    assert [row[0] for row in rows] == expected
+
+def test_content_text():
+    assert content_text({"@type": "messageText", "text": {"text": "oi"}}) == "oi"
+    assert content_text({
+        "@type": "messageDocument",
+        "caption": {"text": "segue"},
+        "document": {"file_name": "relatorio.pdf"}
+    }) == "segue\nrelatorio.pdf"
+    assert content_text(None) == ""
@@ -0,0 +1,99 @@
+import json
+import time
+
+import pytest
+
+from app.core.outbox import Outbox, OutboxConflict, OutboxError
+
+def _params(chat_id, text):
+    return {
+        "chat_id": chat_id,
+        "input_message_content": {
+            "@type": "inputMessageText",
+            "text": {"@type": "formattedText", "text": text}
+        }
+    }
+
+@pytest.fixture
+def outbox(tmp_path):
+    async def send(params):
+        raise AssertionError("os testes não iniciam os workers")
+
+    outbox = Outbox(send, path=str(tmp_path / "outbox.sqlite"))
+    yield outbox
+    outbox._updates_executor.shutdown(wait=True)
+    if outbox._db is not None:
+        outbox._db.close()
+
+def outbox_text(row):
+    return json.loads(row["params"])["input_message_content"]["text"]["text"]
+
+def test_claim_preserves_order_per_chat(outbox):
+    outbox.enqueue(_params(1, "a1"))
+    outbox.enqueue(_params(1, "a2"))
+    outbox.enqueue(_params(2, "b1"))
+
+    first = outbox._claim()
+    assert outbox_text(first) == "a1"
+    # a2 aguarda a1, que está em sending; o outro chat não é bloqueado
+    assert outbox_text(outbox._claim()) == "b1"
+    assert outbox._claim() is None
+
+    outbox._sent(first["seq"], 1, 100)
+    assert outbox_text(outbox._claim()) == "a2"
+    assert outbox.stats() == {"sending": 2, "sent": 1}
+
+def test_deferred_job_keeps_blocking_its_chat(outbox):
+    outbox.enqueue(_params(1, "a1"))
+    outbox.enqueue(_params(1, "a2"))
+
+    first = outbox._claim()
+    # FLOOD_WAIT: volta para a fila com uma nova tentativa no futuro
+    outbox._defer(first["seq"], time.time() + 60)
+
+    assert outbox._claim() is None
+    assert outbox.get(first["id"])["state"] == "queued"
+
+def test_idempotency_key_returns_existing_job(outbox):
+    job, created = outbox.enqueue(_params(1, "oi"), idempotency_key="pedido-1")
+    again, created_again = outbox.enqueue(_params(1, "oi"), idempotency_key="pedido-1")
+
+    assert created and not created_again
+    assert again["job_id"] == job["job_id"]
+    assert outbox.stats() == {"queued": 1}
+
+def test_idempotency_key_reused_with_other_params_conflicts(outbox):
+    job, _ = outbox.enqueue(_params(1, "oi"), idempotency_key="pedido-1")
+
+    with pytest.raises(OutboxConflict) as info:
+        outbox.enqueue(_params(1, "outro texto"), idempotency_key="pedido-1")
+    assert job["job_id"] in str(info.value)
+    with pytest.raises(OutboxConflict):
+        outbox.enqueue(_params(2, "oi"), idempotency_key="pedido-1")
+    assert outbox.stats() == {"queued": 1}
+
+@pytest.mark.parametrize("params, key", [
+    ({"chat_id": "1", "input_message_content": {"@type": "inputMessageText"}}, None),
+    ({"chat_id": 1}, None),
+    (_params(1, "oi"), ""),
+    (_params(1, "oi"), "x" * 256),
+])
+def test_enqueue_rejects_invalid_requests(outbox, params, key):
+    with pytest.raises(OutboxError):
+        outbox.enqueue(params, idempotency_key=key)
+
+def test_confirmation_before_sent_is_applied(outbox):
+    job, _ = outbox.enqueue(_params(1, "oi"))
+    row = outbox._claim()
+
+    # updateMessageSendSucceeded chega antes de a resposta de sendMessage ser gravada
+    outbox._apply_update({
+        "@type": "updateMessageSendSucceeded",
+        "old_message_id": 100,
+        "message": {"id": 200, "chat_id": 1}
+    })
+    outbox._sent(row["seq"], 1, 100)
+
+    delivered = outbox.get(job["job_id"])
+    assert delivered["state"] == "delivered"
+    assert delivered["message_id"] == 200
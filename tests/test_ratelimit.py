@@ -0,0 +1,139 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.core import ratelimit
+from app.core.ratelimit import (
+    ERROR_FLOOD,
+    ERROR_PERMANENT,
+    ERROR_TRANSIENT,
+    FloodControl,
+    FloodWait,
+    TokenBucket,
+    classify_error,
+    retry_after
+)
+
+class FakeClock:
+    """Relógio controlado pelo teste: asyncio.sleep do módulo apenas avança o tempo."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+        self._sleep = asyncio.sleep
+
+    def monotonic(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+        await self._sleep(0)
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    # Substitui apenas as referências do módulo, sem afetar o relógio do loop de eventos
+    monkeypatch.setattr(ratelimit, "time", SimpleNamespace(monotonic=clock.monotonic))
+    monkeypatch.setattr(ratelimit, "asyncio", SimpleNamespace(Lock=asyncio.Lock, sleep=clock.sleep))
+    return clock
+
+@pytest.mark.parametrize("error, expected", [
+    ("429: Too Many Requests: retry after 17", 17),
+    (RuntimeError("FLOOD_WAIT_30"), 30),
+    ({"@type": "error", "code": 429, "message": "Too Many Requests: retry after 5"}, 5),
+    ("400: Chat not found", None),
+    ({"@type": "error", "code": 500, "message": "Internal"}, None),
+])
+def test_retry_after(error, expected):
+    assert retry_after(error) == expected
+
+class CodedError(Exception):
+    """Erro com o atributo code, como o TDLibError do cliente FastAPI."""
+
+    def __init__(self, code, message):
+        super().__init__(f"{code}: {message}")
+        self.code = code
+
+@pytest.mark.parametrize("error, expected", [
+    (CodedError(429, "Too Many Requests: retry after 3"), ERROR_FLOOD),
+    ("FLOOD_WAIT_10", ERROR_FLOOD),
+    ({"@type": "error", "code": 429, "message": "Too Many Requests"}, ERROR_FLOOD),
+    (CodedError(400, "Chat not found"), ERROR_PERMANENT),
+    ("403: Have no rights to send a message", ERROR_PERMANENT),
+    (Exception("{'@type': 'error', 'code': 400, 'message': 'Bad Request'}"), ERROR_PERMANENT),
+    (CodedError(500, "Internal Server Error"), ERROR_TRANSIENT),
+    (TimeoutError(), ERROR_TRANSIENT),
+    (ConnectionError("Connection reset"), ERROR_TRANSIENT),
+])
+def test_classify_error(error, expected):
+    assert classify_error(error) == expected
+
+def test_flood_control_shares_wait_per_chat(clock):
+    control = FloodControl(max_wait=60)
+    control.penalize("sendMessage", {"chat_id": 1}, 10)
+    # Mesmo FLOOD_WAIT informado duas vezes conta uma vez
+    control.penalize("sendMessage", {"chat_id": 1}, 10)
+
+    assert control.remaining("sendMessage", {"chat_id": 1}) == pytest.approx(10)
+    assert control.remaining("forwardMessages", {"chat_id": 1}) == pytest.approx(10)
+    assert control.remaining("sendMessage", {"chat_id": 2}) == 0
+    assert control.stats() == {"active": 1, "flood_waits": 1}
+
+    asyncio.run(control.wait("sendMessage", {"chat_id": 1}))
+    assert clock.sleeps == [pytest.approx(10)]
+    assert control.remaining("sendMessage", {"chat_id": 1}) == 0
+
+def test_flood_control_fails_fast_on_long_waits(clock):
+    control = FloodControl(max_wait=5)
+    control.penalize("getChats", None, 30)
+
+    with pytest.raises(FloodWait) as info:
+        asyncio.run(control.wait("getChats"))
+    assert info.value.seconds == 30
+    # O erro mantém o formato da TDLib
+    assert classify_error(info.value) == ERROR_FLOOD
+    assert retry_after(info.value) == 30
+    assert clock.sleeps == []
+
+def test_token_bucket_allows_burst_then_rate(clock):
+    bucket = TokenBucket(rate=2, burst=3)
+
+    async def scenario():
+        for _ in range(5):
+            await bucket.acquire()
+
+    start = clock.now
+    asyncio.run(scenario())
+    # 3 fichas imediatas e mais 2 a 2 por segundo
+    assert clock.now - start == pytest.approx(1.0)
+    assert clock.sleeps == [pytest.approx(0.5), pytest.approx(0.5)]
+    assert not bucket.idle
+
+    clock.now += 10
+    assert bucket.idle
+
+def test_token_bucket_serves_waiters_in_arrival_order(clock):
+    bucket = TokenBucket(rate=1, burst=1)
+    order = []
+
+    async def worker(name):
+        await bucket.acquire()
+        order.append(name)
+
+    async def scenario():
+        await asyncio.gather(*(worker(name) for name in "abcd"))
+
+    asyncio.run(scenario())
+    assert order == list("abcd")
+
+def test_token_bucket_disabled(clock):
+    bucket = TokenBucket(rate=0)
+
+    async def scenario():
+        for _ in range(100):
+            await bucket.acquire()
+
+    asyncio.run(scenario())
+    assert clock.sleeps == []
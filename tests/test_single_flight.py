@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+
+from app.core.cache import SingleFlight
+
+def test_identical_calls_share_one_execution():
+    executions = []
+
+    async def scenario():
+        flight = SingleFlight(methods={"getChat"})
+        release = asyncio.Event()
+
+        async def fetch():
+            executions.append(1)
+            await release.wait()
+            return {"id": 1}
+
+        calls = [
+            asyncio.ensure_future(flight.call("getChat", {"chat_id": 1, "x": 2}, fetch)),
+            # Mesmos parâmetros em outra ordem: mesma chave
+            asyncio.ensure_future(flight.call("getChat", {"x": 2, "chat_id": 1}, fetch)),
+        ]
+        await asyncio.sleep(0)
+        assert len(flight) == 1
+        release.set()
+        results = await asyncio.gather(*calls)
+        return flight, results
+
+    flight, results = asyncio.run(scenario())
+    assert len(executions) == 1
+    assert results == [{"id": 1}, {"id": 1}]
+    # Cada chamador recebe sua própria cópia
+    assert results[0] is not results[1]
+    assert flight.stats() == {"in_flight": 0, "executed": 1, "shared": 1}
+
+def test_non_idempotent_methods_are_not_shared():
+    executions = []
+
+    async def fetch():
+        executions.append(1)
+        return {"@type": "message"}
+
+    async def scenario():
+        flight = SingleFlight(methods={"getChat"})
+        await asyncio.gather(
+            flight.call("sendMessage", {"chat_id": 1}, fetch),
+            flight.call("sendMessage", {"chat_id": 1}, fetch),
+        )
+        return flight
+
+    flight = asyncio.run(scenario())
+    assert len(executions) == 2
+    assert flight.stats()["executed"] == 0
+
+def test_cancelled_caller_does_not_cancel_shared_call():
+    async def scenario():
+        flight = SingleFlight(methods={"getChat"})
+        release = asyncio.Event()
+
+        async def fetch():
+            await release.wait()
+            return {"id": 1}
+
+        first = asyncio.ensure_future(flight.call("getChat", {"chat_id": 1}, fetch))
+        second = asyncio.ensure_future(flight.call("getChat", {"chat_id": 1}, fetch))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(scenario()) == {"id": 1}
+
+def test_errors_are_shared_and_key_is_released():
+    async def scenario():
+        flight = SingleFlight(methods={"getChat"})
+
+        async def fail():
+            await asyncio.sleep(0)
+            raise RuntimeError("Chat not found")
+
+        results = await asyncio.gather(
+            flight.call("getChat", {"chat_id": 1}, fail),
+            flight.call("getChat", {"chat_id": 1}, fail),
+            return_exceptions=True,
+        )
+        return flight, results
+
+    flight, results = asyncio.run(scenario())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert len(flight) == 0
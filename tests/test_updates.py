@@ -0,0 +1,55 @@
+import asyncio
+
+from app.core.updates import UpdateCoalescer
+
+def _status(user_id, status):
+    return {"@type": "updateUserStatus", "user_id": user_id, "status": {"@type": status}}
+
+def test_coalescer_delivers_latest_update_per_entity():
+    dispatched = []
+
+    async def scenario():
+        coalescer = UpdateCoalescer(dispatched.append, window=0.01)
+        assert coalescer.offer(_status(1, "userStatusOnline"))
+        assert coalescer.offer(_status(2, "userStatusOnline"))
+        assert coalescer.offer(_status(1, "userStatusOffline"))
+        assert dispatched == []
+        await asyncio.sleep(0.05)
+        return coalescer
+
+    coalescer = asyncio.run(scenario())
+    assert [(u["user_id"], u["status"]["@type"]) for u in dispatched] == [
+        (1, "userStatusOffline"),
+        (2, "userStatusOnline"),
+    ]
+    stats = coalescer.stats()
+    assert stats["received"] == {"updateUserStatus": 3}
+    assert stats["total_collapsed"] == 1
+    assert stats["pending"] == 0
+
+def test_coalescer_passes_through_other_types_and_zero_window():
+    async def scenario():
+        coalescer = UpdateCoalescer(lambda update: None, window=0.01)
+        assert not coalescer.offer({"@type": "updateNewMessage", "message": {}})
+        disabled = UpdateCoalescer(lambda update: None, window=0)
+        assert not disabled.offer(_status(1, "userStatusOnline"))
+
+    asyncio.run(scenario())
+
+def test_flush_delivers_immediately_and_survives_dispatch_errors():
+    dispatched = []
+
+    def dispatch(update):
+        if update["user_id"] == 1:
+            raise RuntimeError("falha no handler")
+        dispatched.append(update["user_id"])
+
+    async def scenario():
+        coalescer = UpdateCoalescer(dispatch, window=60)
+        coalescer.offer(_status(1, "userStatusOnline"))
+        coalescer.offer(_status(2, "userStatusOnline"))
+        coalescer.flush()
+        assert coalescer.stats()["pending"] == 0
+
+    asyncio.run(scenario())
+    assert dispatched == [2]